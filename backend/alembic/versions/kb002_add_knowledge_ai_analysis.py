@@ -0,0 +1,36 @@
+"""add_knowledge_ai_analysis
+
+Revision ID: kb002
+Revises: kb001
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'kb002'
+down_revision = 'kb001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('knowledge_base',
+        sa.Column('ai_analysis', sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'),
+                  nullable=True, comment='AI分析结果(结构化JSON)')
+    )
+
+    # PostgreSQL下为公司名称建立表达式索引，支持按公司名称筛选
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            "CREATE INDEX idx_knowledge_company_name "
+            "ON knowledge_base ((ai_analysis->>'company_name'))"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS idx_knowledge_company_name")
+    op.drop_column('knowledge_base', 'ai_analysis')
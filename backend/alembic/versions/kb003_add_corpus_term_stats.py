@@ -0,0 +1,38 @@
+"""add_corpus_term_stats
+
+Revision ID: kb003
+Revises: kb002
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'kb003'
+down_revision = 'kb002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('knowledge_base',
+        sa.Column('ai_keywords', sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'),
+                  nullable=True, comment='语料TF-IDF关键词[{term, weight}]')
+    )
+
+    op.create_table('knowledge_term_stats',
+        sa.Column('term', sa.String(length=100), nullable=False, comment='词项'),
+        sa.Column('document_frequency', sa.Integer(), nullable=False, server_default='0',
+                  comment='包含该词项的有效文档数'),
+        sa.Column('keyword_weight', sa.Float(), nullable=False, server_default='0',
+                  comment='作为文档关键词时的TF-IDF权重累计'),
+        sa.PrimaryKeyConstraint('term')
+    )
+    # 已有条目的统计通过 POST /api/knowledge/corpus/rebuild 生成
+
+
+def downgrade():
+    op.drop_table('knowledge_term_stats')
+    op.drop_column('knowledge_base', 'ai_keywords')
@@ -0,0 +1,74 @@
+"""add_knowledge_base_tags
+
+Revision ID: kb004
+Revises: kb003
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'kb004'
+down_revision = 'kb003'
+branch_labels = None
+depends_on = None
+
+
+def _parse_tags(tags):
+    names = []
+    for name in (tags or "").replace("，", ",").split(","):
+        name = name.strip()[:50]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def upgrade():
+    op.create_table('knowledge_base_tags',
+        sa.Column('knowledge_id', sa.Integer(), nullable=False, comment='知识ID'),
+        sa.Column('tag_id', sa.Integer(), nullable=False, comment='标签ID'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True, comment='创建时间'),
+        sa.ForeignKeyConstraint(['knowledge_id'], ['knowledge_base.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['tag_id'], ['knowledge_tags.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('knowledge_id', 'tag_id')
+    )
+    op.create_index('idx_knowledge_base_tags_tag', 'knowledge_base_tags', ['tag_id', 'knowledge_id'], unique=False)
+    op.create_index('idx_knowledge_tags_usage', 'knowledge_tags', ['usage_count'], unique=False)
+
+    # 回填：把逗号分隔的标签拆分为标签表和关联表，并按有效条目重算使用次数
+    bind = op.get_bind()
+    tag_ids = {name: tag_id for tag_id, name in bind.execute(sa.text("SELECT id, name FROM knowledge_tags"))}
+    links = set()
+    for knowledge_id, tags in bind.execute(sa.text(
+        "SELECT id, tags FROM knowledge_base WHERE tags IS NOT NULL AND tags <> ''"
+    )):
+        for name in _parse_tags(tags):
+            if name not in tag_ids:
+                bind.execute(
+                    sa.text("INSERT INTO knowledge_tags (name, usage_count) VALUES (:name, 0)"),
+                    {"name": name}
+                )
+                tag_ids[name] = bind.execute(
+                    sa.text("SELECT id FROM knowledge_tags WHERE name = :name"), {"name": name}
+                ).scalar()
+            links.add((knowledge_id, tag_ids[name]))
+
+    if links:
+        bind.execute(
+            sa.text("INSERT INTO knowledge_base_tags (knowledge_id, tag_id) VALUES (:knowledge_id, :tag_id)"),
+            [{"knowledge_id": knowledge_id, "tag_id": tag_id} for knowledge_id, tag_id in links]
+        )
+
+    op.execute(
+        "UPDATE knowledge_tags SET usage_count = ("
+        "SELECT COUNT(*) FROM knowledge_base_tags "
+        "JOIN knowledge_base ON knowledge_base.id = knowledge_base_tags.knowledge_id "
+        "WHERE knowledge_base_tags.tag_id = knowledge_tags.id AND knowledge_base.is_active = true)"
+    )
+
+
+def downgrade():
+    op.drop_index('idx_knowledge_tags_usage', table_name='knowledge_tags')
+    op.drop_index('idx_knowledge_base_tags_tag', table_name='knowledge_base_tags')
+    op.drop_table('knowledge_base_tags')
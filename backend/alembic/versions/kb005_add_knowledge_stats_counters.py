@@ -0,0 +1,42 @@
+"""add_knowledge_stats_counters
+
+Revision ID: kb005
+Revises: kb004
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'kb005'
+down_revision = 'kb004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('knowledge_stats_counters',
+        sa.Column('name', sa.String(length=50), nullable=False, comment='计数器名称'),
+        sa.Column('value', sa.BigInteger(), nullable=False, server_default='0', comment='计数值'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True, comment='更新时间'),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+    # 以当前数据初始化计数器
+    op.execute(
+        "INSERT INTO knowledge_stats_counters (name, value) "
+        "SELECT 'total_knowledge', COUNT(*) FROM knowledge_base WHERE is_active = true"
+    )
+    op.execute(
+        "INSERT INTO knowledge_stats_counters (name, value) "
+        "SELECT 'total_qa', COUNT(*) FROM knowledge_qa"
+    )
+    op.execute(
+        "INSERT INTO knowledge_stats_counters (name, value) "
+        "SELECT 'active_knowledge', COUNT(*) FROM knowledge_base WHERE is_active = true AND view_count > 0"
+    )
+
+
+def downgrade():
+    op.drop_table('knowledge_stats_counters')
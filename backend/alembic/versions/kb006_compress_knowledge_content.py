@@ -0,0 +1,103 @@
+"""compress_knowledge_content
+
+Revision ID: kb006
+Revises: kb005
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.compression import compress_text, decompress_text
+
+# revision identifiers, used by Alembic.
+revision = 'kb006'
+down_revision = 'kb005'
+branch_labels = None
+depends_on = None
+
+# 与 app.models.knowledge_base.CONTENT_PREFIX_LENGTH 保持一致
+CONTENT_PREFIX_LENGTH = 2000
+BATCH_SIZE = 200
+
+
+def upgrade():
+    op.create_table('knowledge_contents',
+        sa.Column('knowledge_id', sa.Integer(), nullable=False, comment='知识ID'),
+        sa.Column('codec', sa.String(length=10), nullable=False, comment='压缩编码: zstd, zlib'),
+        sa.Column('data', sa.LargeBinary(), nullable=False, comment='压缩后的正文'),
+        sa.Column('compressed_size', sa.Integer(), nullable=False, server_default='0', comment='压缩后字节数'),
+        sa.Column('original_size', sa.Integer(), nullable=False, server_default='0', comment='原始UTF-8字节数'),
+        sa.Column('search_text', sa.Text(), nullable=False, server_default='', comment='用于搜索的完整正文'),
+        sa.ForeignKeyConstraint(['knowledge_id'], ['knowledge_base.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('knowledge_id')
+    )
+    op.add_column('knowledge_base',
+        sa.Column('content_prefix', sa.Text(), nullable=False, server_default='', comment='正文开头部分'))
+    op.add_column('knowledge_base',
+        sa.Column('content_length', sa.Integer(), nullable=False, server_default='0', comment='正文字符数'))
+
+    # 分批把正文压缩迁移到 knowledge_contents
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.text("SELECT id, content FROM knowledge_base WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": BATCH_SIZE}
+        ).fetchall()
+        if not rows:
+            break
+
+        contents = []
+        for knowledge_id, content in rows:
+            content = content or ""
+            codec, data = compress_text(content)
+            contents.append({
+                "knowledge_id": knowledge_id,
+                "codec": codec,
+                "data": data,
+                "compressed_size": len(data),
+                "original_size": len(content.encode("utf-8")),
+                "search_text": content
+            })
+            bind.execute(
+                sa.text("UPDATE knowledge_base SET content_prefix = :prefix, content_length = :length WHERE id = :id"),
+                {"prefix": content[:CONTENT_PREFIX_LENGTH], "length": len(content), "id": knowledge_id}
+            )
+        bind.execute(
+            sa.text(
+                "INSERT INTO knowledge_contents (knowledge_id, codec, data, compressed_size, original_size, search_text) "
+                "VALUES (:knowledge_id, :codec, :data, :compressed_size, :original_size, :search_text)"
+            ),
+            contents
+        )
+        last_id = rows[-1][0]
+
+    op.drop_column('knowledge_base', 'content')
+
+    # PostgreSQL 下为搜索正文建三元组索引，ILIKE '%关键词%' 不必逐行扫描
+    if bind.dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.create_index(
+            'idx_knowledge_contents_search_trgm', 'knowledge_contents', ['search_text'],
+            postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}
+        )
+
+
+def downgrade():
+    op.add_column('knowledge_base',
+        sa.Column('content', sa.Text(), nullable=False, server_default='', comment='知识内容'))
+
+    bind = op.get_bind()
+    for knowledge_id, codec, data in bind.execute(
+        sa.text("SELECT knowledge_id, codec, data FROM knowledge_contents")
+    ).fetchall():
+        bind.execute(
+            sa.text("UPDATE knowledge_base SET content = :content WHERE id = :id"),
+            {"content": decompress_text(codec, data), "id": knowledge_id}
+        )
+
+    op.alter_column('knowledge_base', 'content', server_default=None)
+    op.drop_column('knowledge_base', 'content_length')
+    op.drop_column('knowledge_base', 'content_prefix')
+    op.drop_table('knowledge_contents')
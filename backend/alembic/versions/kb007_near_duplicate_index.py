@@ -0,0 +1,51 @@
+"""near_duplicate_index
+
+Revision ID: kb007
+Revises: kb006
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'kb007'
+down_revision = 'kb006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('knowledge_base',
+        sa.Column('version_of_id', sa.Integer(), nullable=True, comment='首个版本的知识ID'))
+    op.add_column('knowledge_base',
+        sa.Column('version_number', sa.Integer(), nullable=False, server_default='1', comment='版本号'))
+    op.create_foreign_key('fk_knowledge_base_version_of', 'knowledge_base', 'knowledge_base', ['version_of_id'], ['id'])
+    op.create_index('idx_knowledge_version_of', 'knowledge_base', ['version_of_id'], unique=False)
+
+    op.create_table('knowledge_fingerprints',
+        sa.Column('knowledge_id', sa.Integer(), nullable=False, comment='知识ID'),
+        sa.Column('signature', sa.LargeBinary(), nullable=False, comment='MinHash签名(uint32小端数组)'),
+        sa.Column('shingle_count', sa.Integer(), nullable=False, server_default='0', comment='不同shingle数'),
+        sa.ForeignKeyConstraint(['knowledge_id'], ['knowledge_base.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('knowledge_id')
+    )
+    op.create_table('knowledge_lsh_buckets',
+        sa.Column('band', sa.SmallInteger(), nullable=False, comment='band序号'),
+        sa.Column('bucket', sa.BigInteger(), nullable=False, comment='band内签名分量的哈希'),
+        sa.Column('knowledge_id', sa.Integer(), nullable=False, comment='知识ID'),
+        sa.ForeignKeyConstraint(['knowledge_id'], ['knowledge_base.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('band', 'bucket', 'knowledge_id')
+    )
+    op.create_index('idx_lsh_buckets_knowledge', 'knowledge_lsh_buckets', ['knowledge_id'], unique=False)
+    # 已有条目的签名通过 POST /api/knowledge/dedup/backfill 补算
+
+
+def downgrade():
+    op.drop_index('idx_lsh_buckets_knowledge', table_name='knowledge_lsh_buckets')
+    op.drop_table('knowledge_lsh_buckets')
+    op.drop_table('knowledge_fingerprints')
+    op.drop_index('idx_knowledge_version_of', table_name='knowledge_base')
+    op.drop_constraint('fk_knowledge_base_version_of', 'knowledge_base', type_='foreignkey')
+    op.drop_column('knowledge_base', 'version_number')
+    op.drop_column('knowledge_base', 'version_of_id')
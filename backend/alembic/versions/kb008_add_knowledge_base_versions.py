@@ -0,0 +1,46 @@
+"""add_knowledge_base_versions
+
+Revision ID: kb008
+Revises: kb007
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'kb008'
+down_revision = 'kb007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('knowledge_base_versions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('knowledge_id', sa.Integer(), nullable=False, comment='知识ID'),
+        sa.Column('version_number', sa.Integer(), nullable=False, comment='版本号'),
+        sa.Column('delta_codec', sa.String(length=10), nullable=False, comment='压缩编码: zstd, zlib'),
+        sa.Column('delta', sa.LargeBinary(), nullable=False, comment='以下一版本段落为基准的反向delta(JSON，压缩)'),
+        sa.Column('summary', sa.Text(), nullable=True, comment='该版本的摘要'),
+        sa.Column('tags', sa.String(length=500), nullable=True, comment='该版本的标签'),
+        sa.Column('ai_analysis', sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'), nullable=True, comment='该版本的AI分析结果'),
+        sa.Column('content_length', sa.Integer(), nullable=False, server_default='0', comment='该版本正文字符数'),
+        sa.Column('changed_sections', sa.Integer(), nullable=False, server_default='0', comment='与下一版本相比变化的段落数'),
+        sa.Column('created_by', sa.Integer(), nullable=True, comment='修订者ID'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True, comment='被替换的时间'),
+        sa.ForeignKeyConstraint(['knowledge_id'], ['knowledge_base.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_knowledge_base_versions_id'), 'knowledge_base_versions', ['id'], unique=False)
+    op.create_index('idx_knowledge_base_versions_item', 'knowledge_base_versions', ['knowledge_id', 'version_number'], unique=True)
+    op.add_column('knowledge_base', sa.Column('revision', sa.Integer(), nullable=False, server_default='1', comment='修订号'))
+
+
+def downgrade():
+    op.drop_column('knowledge_base', 'revision')
+    op.drop_index('idx_knowledge_base_versions_item', table_name='knowledge_base_versions')
+    op.drop_index(op.f('ix_knowledge_base_versions_id'), table_name='knowledge_base_versions')
+    op.drop_table('knowledge_base_versions')
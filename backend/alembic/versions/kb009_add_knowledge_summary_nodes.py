@@ -0,0 +1,48 @@
+"""add_knowledge_summary_nodes
+
+Revision ID: kb009
+Revises: kb008
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'kb009'
+down_revision = 'kb008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('knowledge_summary_nodes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('level', sa.String(length=20), nullable=False, comment='层级: chunk, document, cluster, corpus'),
+        sa.Column('parent_id', sa.Integer(), nullable=True, comment='上层节点ID'),
+        sa.Column('knowledge_id', sa.Integer(), nullable=True, comment='知识ID（分块和文档节点）'),
+        sa.Column('position', sa.Integer(), nullable=False, server_default='0', comment='分块在文档中的顺序'),
+        sa.Column('summary', sa.Text(), nullable=False, server_default='', comment='摘要'),
+        sa.Column('keywords', sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'), nullable=True, comment='关键词[{term, weight}]，用于相关性打分和聚类'),
+        sa.Column('child_count', sa.Integer(), nullable=False, server_default='0', comment='下层节点数'),
+        sa.Column('source_version', sa.Integer(), nullable=True, comment='生成摘要时的知识条目版本号（文档节点）'),
+        sa.Column('is_stale', sa.Boolean(), nullable=False, server_default=sa.false(), comment='成员变化后需要重新生成摘要（簇和语料节点）'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True, comment='创建时间'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True, comment='更新时间'),
+        sa.ForeignKeyConstraint(['parent_id'], ['knowledge_summary_nodes.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['knowledge_id'], ['knowledge_base.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_knowledge_summary_nodes_id'), 'knowledge_summary_nodes', ['id'], unique=False)
+    op.create_index('idx_summary_nodes_level', 'knowledge_summary_nodes', ['level'], unique=False)
+    op.create_index('idx_summary_nodes_parent', 'knowledge_summary_nodes', ['parent_id'], unique=False)
+    op.create_index('idx_summary_nodes_knowledge', 'knowledge_summary_nodes', ['knowledge_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_summary_nodes_knowledge', table_name='knowledge_summary_nodes')
+    op.drop_index('idx_summary_nodes_parent', table_name='knowledge_summary_nodes')
+    op.drop_index('idx_summary_nodes_level', table_name='knowledge_summary_nodes')
+    op.drop_index(op.f('ix_knowledge_summary_nodes_id'), table_name='knowledge_summary_nodes')
+    op.drop_table('knowledge_summary_nodes')
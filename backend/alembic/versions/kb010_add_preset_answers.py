@@ -0,0 +1,39 @@
+"""add_preset_answers
+
+Revision ID: kb010
+Revises: kb009
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'kb010'
+down_revision = 'kb009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('preset_answers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('preset_question_id', sa.Integer(), nullable=False, comment='预设问题ID'),
+        sa.Column('question', sa.String(length=500), nullable=False, comment='生成答案时的问题内容'),
+        sa.Column('answer', sa.Text(), nullable=False, comment='答案'),
+        sa.Column('context_versions', sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'), nullable=True, comment='上下文文档[[知识ID, 版本号], ...]'),
+        sa.Column('context_fingerprint', sa.String(length=64), nullable=True, comment='上下文指纹'),
+        sa.Column('generation_time', sa.Integer(), nullable=True, comment='生成耗时（毫秒）'),
+        sa.Column('generated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True, comment='生成时间'),
+        sa.ForeignKeyConstraint(['preset_question_id'], ['preset_questions.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_preset_answers_id'), 'preset_answers', ['id'], unique=False)
+    op.create_index('idx_preset_answers_question', 'preset_answers', ['preset_question_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('idx_preset_answers_question', table_name='preset_answers')
+    op.drop_index(op.f('ix_preset_answers_id'), table_name='preset_answers')
+    op.drop_table('preset_answers')
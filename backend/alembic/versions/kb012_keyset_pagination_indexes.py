@@ -0,0 +1,31 @@
+"""keyset_pagination_indexes
+
+Revision ID: kb012
+Revises: kb010
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'kb012'
+down_revision = 'kb010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('idx_knowledge_active_id', 'knowledge_base', ['is_active', 'id'], unique=False)
+    op.create_index('idx_qa_user_id_id', 'knowledge_qa', ['user_id', 'id'], unique=False)
+    op.create_index('idx_qa_session_id_id', 'knowledge_qa', ['session_id', 'id'], unique=False)
+    op.drop_index('idx_qa_user_id', table_name='knowledge_qa')
+    op.drop_index('idx_qa_session_id', table_name='knowledge_qa')
+
+
+def downgrade():
+    op.create_index('idx_qa_session_id', 'knowledge_qa', ['session_id'], unique=False)
+    op.create_index('idx_qa_user_id', 'knowledge_qa', ['user_id'], unique=False)
+    op.drop_index('idx_qa_session_id_id', table_name='knowledge_qa')
+    op.drop_index('idx_qa_user_id_id', table_name='knowledge_qa')
+    op.drop_index('idx_knowledge_active_id', table_name='knowledge_base')
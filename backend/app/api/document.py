@@ -1,24 +1,43 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Response, Depends
-from fastapi.responses import FileResponse
-from typing import List
+from fastapi import APIRouter, UploadFile, File, HTTPException, Response, Depends, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from sqlalchemy.orm import Session
 import os
+import heapq
+import json
 import tempfile
 import shutil
+import time
 from datetime import datetime
 from app.services.document_service import (
+    ALLOWED_EXTENSIONS,
     allowed_file, 
     extract_text_from_file, 
     analyze_with_openai,
     analyze_with_openai_xml,
+    analyze_with_openai_structured,
+    render_enterprise_info_xml,
+    render_plain_analysis,
+    parse_analysis_result,
     generate_xml_summary,
     combine_texts_for_analysis,
     generate_batch_xml_summary
 )
+from app.services.text_normalization_service import (
+    normalize_document_text,
+    summarize_normalization
+)
+from app.services.llm_governor import Priority
+from app.services.local_analysis_service import analyze_text_locally
+from app.services.progressive_analysis_service import AnalysisJob, progressive_analysis
+from app.services.near_duplicate_service import DuplicateMatch, Fingerprint, near_duplicates
+from app.services.knowledge_revision_service import RevisionPlan, knowledge_revisions
+from app.config.anti_blocking_config import config
+from app.utils.pagination import decode_cursor, encode_cursor, split_page
 from app.services.auth_service import get_current_active_user, get_current_user_or_guest
 from app.services.knowledge_service import KnowledgeService
 from app.models.user import User
-from app.models.database import get_db
+from app.models.database import get_db, SessionLocal
 from typing import Union
 
 router = APIRouter(prefix="/api/document", tags=["文档分析"])
@@ -29,9 +48,197 @@ RESULTS_FOLDER = "results"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RESULTS_FOLDER, exist_ok=True)
 
+SUPPORTED_FORMATS = ", ".join(sorted(ALLOWED_EXTENSIONS))
+
+def request_deadline() -> float:
+    """请求内LLM分析的截止时间：增量分析和完整分析共用一份预算，在中间件超时之前降级为本地分析"""
+    return time.monotonic() + config.REQUEST_LLM_BUDGET
+
+def remaining_time(deadline: Optional[float]) -> Optional[float]:
+    """距截止时间的剩余秒数；没有截止时间（后台分析）时返回None"""
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+async def analyze_for_xml_endpoint(
+    text: str, mode: str, priority: Priority = Priority.UPLOAD, deadline: Optional[float] = None
+):
+    """XML接口的分析入口，返回 (XML文本, 结构化结果)
+
+    structured 模式下结构化结果已经过Pydantic校验，XML仅在此处渲染一次；
+    xml 模式沿用提示词约定XML的旧流程，XML在这里解析一次
+    """
+    if mode == "structured":
+        info, fallback = await analyze_with_openai_structured(text, priority, remaining_time(deadline))
+        structured_analysis = info.to_analysis_dict("local" if fallback else "structured")
+        return render_enterprise_info_xml(structured_analysis), structured_analysis
+    
+    ai_analysis_xml, fallback = await analyze_with_openai_xml(text, priority, remaining_time(deadline))
+    return ai_analysis_xml, parse_model_analysis(ai_analysis_xml, fallback)
+
+def parse_model_analysis(analysis: str, fallback: bool) -> Optional[Dict[str, Any]]:
+    """解析分析结果；本地降级结果标记为 local，不会被近似重复复用或作为增量分析的基础"""
+    info = parse_analysis_result(analysis)
+    if info is not None and fallback:
+        info["format"] = "local"
+    return info
+
+PROGRESSIVE_QUERY = Query(False, description="渐进模式：立即返回本地初步分析，LLM分析在后台完成后替换结果和知识库条目")
+
+DUPLICATE_POLICY_QUERY = Query(
+    "reuse", pattern="^(reuse|version|revise|new)$",
+    description="近似重复处理：reuse（同名文件的本人条目就地修订；与其他条目几乎相同时复用其分析，相似时作为新版本）、"
+                "version（同 reuse，但不复用分析）、revise（相似的本人条目一律就地修订）或 new（不检测）"
+)
+
+def detect_duplicate(
+    db: Session,
+    text: str,
+    policy: str,
+    user_id: Optional[int],
+    source_file: str
+) -> Tuple[Optional[Fingerprint], Optional[DuplicateMatch], Optional[str]]:
+    """上传文本的近似重复检测，返回 (签名, 匹配的知识条目, 处理方式)
+
+    处理方式：revised 作为本人条目的修订版就地更新（增量分析，正文未变时不调用模型），
+    只在来源文件相同或 policy 为 revise 时发生；reused 与已有条目几乎相同，复用其分析；
+    versioned 作为已有条目的新版本另建条目。只复用LLM生成的分析，检测失败不影响上传流程
+    """
+    fingerprint = near_duplicates.fingerprint(text)
+    if policy == "new":
+        return fingerprint, None, None
+    try:
+        match = near_duplicates.find_best(db, fingerprint, config.DEDUP_VERSION_THRESHOLD)
+    except Exception as e:
+        print(f"近似重复检测失败: {str(e)}")
+        return fingerprint, None, None
+    if match is None:
+        return fingerprint, None, None
+    
+    if user_id is not None and match.knowledge.created_by == user_id \
+            and (policy == "revise" or match.knowledge.source_file == source_file):
+        return fingerprint, match, "revised"
+    analysis = match.knowledge.ai_analysis
+    if (policy == "reuse" and match.similarity >= config.DEDUP_REUSE_THRESHOLD
+            and analysis and analysis.get("format") != "local"):
+        return fingerprint, match, "reused"
+    if user_id is None:
+        return fingerprint, None, None
+    return fingerprint, match, "versioned"
+
+async def known_analysis(
+    duplicate: Optional[DuplicateMatch],
+    duplicate_action: Optional[str],
+    revision: Optional[RevisionPlan],
+    priority: Priority,
+    deadline: Optional[float] = None
+) -> Optional[Dict[str, Any]]:
+    """复用或增量更新已有条目的分析，返回结构化结果；需要完整分析时返回None"""
+    if duplicate_action == "reused":
+        return duplicate.knowledge.ai_analysis
+    if revision is not None:
+        return await knowledge_revisions.reanalyze(revision, priority, remaining_time(deadline))
+    return None
+
+def save_to_knowledge_base(
+    db: Session,
+    current_user: Union[User, dict],
+    duplicate: Optional[DuplicateMatch],
+    duplicate_action: Optional[str],
+    revision: Optional[RevisionPlan],
+    fingerprint: Optional[Fingerprint],
+    title: str,
+    content: str,
+    analysis: str,
+    source_file: str,
+    tags: Optional[str] = None,
+    ai_analysis: Optional[Dict[str, Any]] = None
+) -> Optional[int]:
+    """将分析结果存储到知识库（仅对注册用户），返回知识条目ID；存储失败不影响主流程"""
+    if not isinstance(current_user, User):
+        return None
+    if duplicate_action == "reused":
+        # 复用的分析已在知识库中，不重复入库
+        return duplicate.knowledge.id
+    try:
+        if revision is not None:
+            knowledge_item = knowledge_revisions.apply(
+                db, revision, analysis, current_user.id,
+                ai_analysis=ai_analysis, tags=tags, fingerprint=fingerprint,
+                title=title, source_file=source_file
+            )
+        else:
+            knowledge_item = KnowledgeService.create_knowledge_from_analysis(
+                db=db,
+                title=title,
+                content=content,
+                analysis=analysis,
+                source_file=source_file,
+                user_id=current_user.id,
+                tags=tags,
+                ai_analysis=ai_analysis,
+                fingerprint=fingerprint,
+                version_of=duplicate.knowledge if duplicate else None
+            )
+        return knowledge_item.id
+    except Exception as e:
+        db.rollback()
+        print(f"知识库存储失败: {str(e)}")
+        return None
+
+def preliminary_analysis(text: str, kind: str) -> Tuple[str, Dict[str, Any]]:
+    """本地分析引擎生成的初步结果，返回 (plain/xml文本, 结构化结果)"""
+    info = analyze_text_locally(text).to_analysis_dict("local")
+    if kind == "xml":
+        return render_enterprise_info_xml(info), info
+    return render_plain_analysis(info), info
+
+async def analyze_plain(
+    text: str, priority: Priority, deadline: Optional[float] = None
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    analysis, fallback = await analyze_with_openai(text, priority, remaining_time(deadline))
+    return analysis, parse_model_analysis(analysis, fallback)
+
+def start_progressive_upgrade(
+    kind: str,
+    analysis: str,
+    structured_analysis: Dict[str, Any],
+    knowledge_id: Optional[int],
+    result_filename: str,
+    analyze: Callable[[], Awaitable[Tuple[str, Optional[Dict[str, Any]]]]],
+    render_summary: Callable[[str], str]
+) -> Dict[str, Any]:
+    """登记渐进式分析任务并在后台启动LLM分析，返回需要合并到响应中的字段"""
+    job = progressive_analysis.create(
+        kind, analysis, structured_analysis,
+        knowledge_id=knowledge_id, result_file=result_filename
+    )
+    result_path = os.path.join(RESULTS_FOLDER, result_filename)
+    
+    def apply_upgrade(upgraded_analysis: str, upgraded_structured: Optional[Dict[str, Any]]):
+        # 覆盖结果文件并更新知识库条目
+        with open(result_path, "w", encoding="utf-8") as f:
+            f.write(render_summary(upgraded_analysis))
+        if knowledge_id is not None:
+            db = SessionLocal()
+            try:
+                KnowledgeService.update_knowledge_analysis(
+                    db, knowledge_id, upgraded_analysis, upgraded_structured
+                )
+            finally:
+                db.close()
+    
+    progressive_analysis.start_upgrade(job, analyze, apply_upgrade)
+    return {
+        "analysis_id": job.id,
+        "analysis_status": job.status,
+        "analysis_url": f"/api/document/analysis/{job.id}",
+        "analysis_events_url": f"/api/document/analysis/{job.id}/events"
+    }
+
 @router.post("/upload")
 async def upload_document(
     file: UploadFile = File(...),
+    progressive: bool = PROGRESSIVE_QUERY,
+    duplicate_policy: str = DUPLICATE_POLICY_QUERY,
     current_user: Union[User, dict] = Depends(get_current_user_or_guest),
     db: Session = Depends(get_db)
 ):
@@ -41,7 +248,7 @@ async def upload_document(
         if not allowed_file(file.filename):
             raise HTTPException(
                 status_code=400, 
-                detail=f"不支持的文件类型。支持的格式: txt, pdf, docx, doc"
+                detail=f"不支持的文件类型。支持的格式: {SUPPORTED_FORMATS}"
             )
         
         # 保存上传的文件
@@ -52,11 +259,28 @@ async def upload_document(
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
         
-        # 提取文本内容
+        # 提取文本内容并去除页眉页脚等重复内容
         text_content = extract_text_from_file(file_path, file.filename)
-        
-        # 使用OpenAI分析（异步）
-        ai_analysis = await analyze_with_openai(text_content)
+        normalization = normalize_document_text(text_content)
+        text_content = normalization.text
+        
+        fingerprint, duplicate, duplicate_action = detect_duplicate(
+            db, text_content, duplicate_policy, current_user.id if isinstance(current_user, User) else None,
+            file.filename
+        )
+        revision = knowledge_revisions.prepare(duplicate.knowledge, text_content) if duplicate_action == "revised" else None
+        deadline = request_deadline()
+        known_info = await known_analysis(duplicate, duplicate_action, revision, Priority.UPLOAD, deadline)
+        
+        # 复用或增量更新已有条目的分析；渐进模式先用本地分析，否则等待OpenAI分析（异步）
+        preliminary_info = None
+        if known_info is not None:
+            ai_analysis, preliminary_info = render_plain_analysis(known_info), known_info
+            progressive = False
+        elif progressive:
+            ai_analysis, preliminary_info = preliminary_analysis(text_content, "plain")
+        else:
+            ai_analysis, preliminary_info = await analyze_plain(text_content, Priority.UPLOAD, deadline)
         
         # 生成XML摘要
         xml_summary = generate_xml_summary(file.filename, text_content, ai_analysis)
@@ -69,34 +293,37 @@ async def upload_document(
             f.write(xml_summary)
         
         # 将分析结果存储到知识库（仅对注册用户）
-        knowledge_id = None
-        if isinstance(current_user, User):
-            try:
-                # 创建知识条目
-                knowledge_item = KnowledgeService.create_knowledge_from_analysis(
-                    db=db,
-                    title=f"文档分析：{file.filename}",
-                    content=text_content,
-                    analysis=ai_analysis,
-                    source_file=file.filename,
-                    user_id=current_user.id
-                )
-                knowledge_id = knowledge_item.id
-                
-            except Exception as e:
-                # 知识库存储失败不影响主流程
-                print(f"知识库存储失败: {str(e)}")
-        
-        return {
-            "message": "文档分析完成",
+        knowledge_id = save_to_knowledge_base(
+            db, current_user, duplicate, duplicate_action, revision, fingerprint,
+            title=f"文档分析：{file.filename}",
+            content=text_content,
+            analysis=ai_analysis,
+            source_file=file.filename,
+            ai_analysis=preliminary_info
+        )
+        
+        response = {
+            "message": "初步分析完成，AI分析进行中" if progressive else "文档分析完成",
             "filename": file.filename,
             "size": file.size,
             "analysis": ai_analysis,
             "xml_file": result_filename,
             "download_url": f"/api/document/download/{result_filename}",
             "knowledge_id": knowledge_id,
+            "text_normalization": normalization.to_dict(),
             "status": "success"
         }
+        if duplicate:
+            response["duplicate"] = duplicate.to_dict(duplicate_action)
+        if revision is not None:
+            response["revision"] = revision.to_dict()
+        if progressive:
+            response.update(start_progressive_upgrade(
+                "plain", ai_analysis, preliminary_info, knowledge_id, result_filename,
+                analyze=lambda: analyze_plain(text_content, Priority.UPLOAD),
+                render_summary=lambda analysis: generate_xml_summary(file.filename, text_content, analysis)
+            ))
+        return response
         
     except HTTPException:
         raise
@@ -107,6 +334,9 @@ async def upload_document(
 @router.post("/upload-xml")
 async def upload_document_xml(
     file: UploadFile = File(...),
+    mode: str = Query("structured", pattern="^(structured|xml)$", description="分析模式：structured（JSON Schema结构化输出）或 xml（提示词约定XML）"),
+    progressive: bool = PROGRESSIVE_QUERY,
+    duplicate_policy: str = DUPLICATE_POLICY_QUERY,
     current_user: Union[User, dict] = Depends(get_current_user_or_guest),
     db: Session = Depends(get_db)
 ):
@@ -116,7 +346,7 @@ async def upload_document_xml(
         if not allowed_file(file.filename):
             raise HTTPException(
                 status_code=400, 
-                detail=f"不支持的文件类型。支持的格式: txt, pdf, docx, doc"
+                detail=f"不支持的文件类型。支持的格式: {SUPPORTED_FORMATS}"
             )
         
         # 保存上传的文件
@@ -127,11 +357,30 @@ async def upload_document_xml(
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
         
-        # 提取文本内容
+        # 提取文本内容并去除页眉页脚等重复内容
         text_content = extract_text_from_file(file_path, file.filename)
-        
-        # 使用OpenAI分析（XML格式，异步）
-        ai_analysis_xml = await analyze_with_openai_xml(text_content)
+        normalization = normalize_document_text(text_content)
+        text_content = normalization.text
+        
+        fingerprint, duplicate, duplicate_action = detect_duplicate(
+            db, text_content, duplicate_policy, current_user.id if isinstance(current_user, User) else None,
+            file.filename
+        )
+        revision = knowledge_revisions.prepare(duplicate.knowledge, text_content) if duplicate_action == "revised" else None
+        deadline = request_deadline()
+        known_info = await known_analysis(duplicate, duplicate_action, revision, Priority.UPLOAD, deadline)
+        
+        # 复用或增量更新已有条目的分析；渐进模式先用本地分析，否则等待OpenAI分析（XML格式，异步）
+        if known_info is not None:
+            structured_analysis = known_info
+            ai_analysis_xml = render_enterprise_info_xml(structured_analysis)
+            progressive = False
+        elif progressive:
+            ai_analysis_xml, structured_analysis = preliminary_analysis(text_content, "xml")
+        else:
+            ai_analysis_xml, structured_analysis = await analyze_for_xml_endpoint(
+                text_content, mode, Priority.UPLOAD, deadline
+            )
         
         # 生成完整的XML摘要
         xml_summary = generate_xml_summary(file.filename, text_content, ai_analysis_xml)
@@ -144,34 +393,39 @@ async def upload_document_xml(
             f.write(xml_summary)
         
         # 将分析结果存储到知识库（仅对注册用户）
-        knowledge_id = None
-        if isinstance(current_user, User):
-            try:
-                # 创建知识条目
-                knowledge_item = KnowledgeService.create_knowledge_from_analysis(
-                    db=db,
-                    title=f"XML文档分析：{file.filename}",
-                    content=text_content,
-                    analysis=ai_analysis_xml,
-                    source_file=file.filename,
-                    user_id=current_user.id
-                )
-                knowledge_id = knowledge_item.id
-                
-            except Exception as e:
-                # 知识库存储失败不影响主流程
-                print(f"知识库存储失败: {str(e)}")
-        
-        return {
-            "message": "文档XML分析完成",
+        knowledge_id = save_to_knowledge_base(
+            db, current_user, duplicate, duplicate_action, revision, fingerprint,
+            title=f"XML文档分析：{file.filename}",
+            content=text_content,
+            analysis=ai_analysis_xml,
+            source_file=file.filename,
+            ai_analysis=structured_analysis
+        )
+        
+        response = {
+            "message": "初步分析完成，AI分析进行中" if progressive else "文档XML分析完成",
             "filename": file.filename,
             "size": file.size,
             "xml_analysis": ai_analysis_xml,
+            "structured_analysis": structured_analysis,
+            "analysis_mode": mode,
             "xml_file": result_filename,
             "download_url": f"/api/document/download/{result_filename}",
             "knowledge_id": knowledge_id,
+            "text_normalization": normalization.to_dict(),
             "status": "success"
         }
+        if duplicate:
+            response["duplicate"] = duplicate.to_dict(duplicate_action)
+        if revision is not None:
+            response["revision"] = revision.to_dict()
+        if progressive:
+            response.update(start_progressive_upgrade(
+                "xml", ai_analysis_xml, structured_analysis, knowledge_id, result_filename,
+                analyze=lambda: analyze_for_xml_endpoint(text_content, mode),
+                render_summary=lambda analysis: generate_xml_summary(file.filename, text_content, analysis)
+            ))
+        return response
         
     except HTTPException:
         raise
@@ -182,6 +436,8 @@ async def upload_document_xml(
 @router.post("/batch-upload")
 async def batch_upload_documents(
     files: List[UploadFile] = File(...),
+    progressive: bool = PROGRESSIVE_QUERY,
+    duplicate_policy: str = DUPLICATE_POLICY_QUERY,
     current_user: Union[User, dict] = Depends(get_current_user_or_guest),
     db: Session = Depends(get_db)
 ):
@@ -191,6 +447,7 @@ async def batch_upload_documents(
             raise HTTPException(status_code=400, detail="最多支持同时上传10个文件")
         
         all_texts = []
+        normalizations = []
         processed_files = []
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
@@ -206,9 +463,11 @@ async def batch_upload_documents(
             with open(file_path, "wb") as buffer:
                 shutil.copyfileobj(file.file, buffer)
             
-            # 提取文本
+            # 提取文本并规范化
             text_content = extract_text_from_file(file_path, file.filename)
-            all_texts.append(text_content)
+            normalization = normalize_document_text(text_content)
+            normalizations.append(normalization)
+            all_texts.append(normalization.text)
             processed_files.append(file.filename)
         
         if not all_texts:
@@ -217,8 +476,23 @@ async def batch_upload_documents(
         # 合并所有文本进行分析
         combined_text = combine_texts_for_analysis(all_texts)
         
-        # 使用OpenAI分析（异步）
-        ai_analysis = await analyze_with_openai(combined_text)
+        fingerprint, duplicate, duplicate_action = detect_duplicate(
+            db, combined_text, duplicate_policy, current_user.id if isinstance(current_user, User) else None,
+            ", ".join(processed_files)
+        )
+        revision = knowledge_revisions.prepare(duplicate.knowledge, combined_text) if duplicate_action == "revised" else None
+        deadline = request_deadline()
+        known_info = await known_analysis(duplicate, duplicate_action, revision, Priority.BATCH, deadline)
+        
+        # 复用或增量更新已有条目的分析；渐进模式先用本地分析，否则等待OpenAI分析（异步）
+        preliminary_info = None
+        if known_info is not None:
+            ai_analysis, preliminary_info = render_plain_analysis(known_info), known_info
+            progressive = False
+        elif progressive:
+            ai_analysis, preliminary_info = preliminary_analysis(combined_text, "plain")
+        else:
+            ai_analysis, preliminary_info = await analyze_plain(combined_text, Priority.BATCH, deadline)
         
         # 生成批量分析的XML摘要
         total_word_count = sum(len(text) for text in all_texts)
@@ -232,26 +506,17 @@ async def batch_upload_documents(
             f.write(xml_summary)
         
         # 将分析结果存储到知识库（仅对注册用户）
-        knowledge_id = None
-        if isinstance(current_user, User):
-            try:
-                # 创建知识条目
-                knowledge_item = KnowledgeService.create_knowledge_from_analysis(
-                    db=db,
-                    title=f"批量文档分析：{len(processed_files)}个文件",
-                    content=combined_text,
-                    analysis=ai_analysis,
-                    source_file=", ".join(processed_files),
-                    user_id=current_user.id,
-                    tags="批量分析,多文档"
-                )
-                knowledge_id = knowledge_item.id
-                
-            except Exception as e:
-                # 知识库存储失败不影响主流程
-                print(f"知识库存储失败: {str(e)}")
-        
-        return {
+        knowledge_id = save_to_knowledge_base(
+            db, current_user, duplicate, duplicate_action, revision, fingerprint,
+            title=f"批量文档分析：{len(processed_files)}个文件",
+            content=combined_text,
+            analysis=ai_analysis,
+            source_file=", ".join(processed_files),
+            tags="批量分析,多文档",
+            ai_analysis=preliminary_info
+        )
+        
+        response = {
             "message": f"批量分析完成，共处理 {len(processed_files)} 个文件",
             "processed_files": processed_files,
             "total_files": len(processed_files),
@@ -259,8 +524,20 @@ async def batch_upload_documents(
             "xml_file": result_filename,
             "download_url": f"/api/document/download/{result_filename}",
             "knowledge_id": knowledge_id,
+            "text_normalization": summarize_normalization(normalizations),
             "status": "success"
         }
+        if duplicate:
+            response["duplicate"] = duplicate.to_dict(duplicate_action)
+        if revision is not None:
+            response["revision"] = revision.to_dict()
+        if progressive:
+            response.update(start_progressive_upgrade(
+                "plain", ai_analysis, preliminary_info, knowledge_id, result_filename,
+                analyze=lambda: analyze_plain(combined_text, Priority.BATCH),
+                render_summary=lambda analysis: generate_batch_xml_summary(all_texts, analysis, total_word_count)
+            ))
+        return response
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"批量分析失败: {str(e)}")
@@ -268,6 +545,9 @@ async def batch_upload_documents(
 @router.post("/batch-upload-xml")
 async def batch_upload_documents_xml(
     files: List[UploadFile] = File(...),
+    mode: str = Query("structured", pattern="^(structured|xml)$", description="分析模式：structured（JSON Schema结构化输出）或 xml（提示词约定XML）"),
+    progressive: bool = PROGRESSIVE_QUERY,
+    duplicate_policy: str = DUPLICATE_POLICY_QUERY,
     current_user: Union[User, dict] = Depends(get_current_user_or_guest),
     db: Session = Depends(get_db)
 ):
@@ -277,6 +557,7 @@ async def batch_upload_documents_xml(
             raise HTTPException(status_code=400, detail="最多支持同时上传10个文件")
         
         all_texts = []
+        normalizations = []
         processed_files = []
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
@@ -292,9 +573,11 @@ async def batch_upload_documents_xml(
             with open(file_path, "wb") as buffer:
                 shutil.copyfileobj(file.file, buffer)
             
-            # 提取文本
+            # 提取文本并规范化
             text_content = extract_text_from_file(file_path, file.filename)
-            all_texts.append(text_content)
+            normalization = normalize_document_text(text_content)
+            normalizations.append(normalization)
+            all_texts.append(normalization.text)
             processed_files.append(file.filename)
         
         if not all_texts:
@@ -303,8 +586,25 @@ async def batch_upload_documents_xml(
         # 合并所有文本进行分析
         combined_text = combine_texts_for_analysis(all_texts)
         
-        # 使用OpenAI分析（XML格式，异步）
-        ai_analysis_xml = await analyze_with_openai_xml(combined_text)
+        fingerprint, duplicate, duplicate_action = detect_duplicate(
+            db, combined_text, duplicate_policy, current_user.id if isinstance(current_user, User) else None,
+            ", ".join(processed_files)
+        )
+        revision = knowledge_revisions.prepare(duplicate.knowledge, combined_text) if duplicate_action == "revised" else None
+        deadline = request_deadline()
+        known_info = await known_analysis(duplicate, duplicate_action, revision, Priority.BATCH, deadline)
+        
+        # 复用或增量更新已有条目的分析；渐进模式先用本地分析，否则等待OpenAI分析（XML格式，异步）
+        if known_info is not None:
+            structured_analysis = known_info
+            ai_analysis_xml = render_enterprise_info_xml(structured_analysis)
+            progressive = False
+        elif progressive:
+            ai_analysis_xml, structured_analysis = preliminary_analysis(combined_text, "xml")
+        else:
+            ai_analysis_xml, structured_analysis = await analyze_for_xml_endpoint(
+                combined_text, mode, Priority.BATCH, deadline
+            )
         
         # 生成批量分析的XML摘要
         total_word_count = sum(len(text) for text in all_texts)
@@ -318,35 +618,40 @@ async def batch_upload_documents_xml(
             f.write(xml_summary)
         
         # 将分析结果存储到知识库（仅对注册用户）
-        knowledge_id = None
-        if isinstance(current_user, User):
-            try:
-                # 创建知识条目
-                knowledge_item = KnowledgeService.create_knowledge_from_analysis(
-                    db=db,
-                    title=f"批量XML文档分析：{len(processed_files)}个文件",
-                    content=combined_text,
-                    analysis=ai_analysis_xml,
-                    source_file=", ".join(processed_files),
-                    user_id=current_user.id,
-                    tags="批量分析,多文档,XML"
-                )
-                knowledge_id = knowledge_item.id
-                
-            except Exception as e:
-                # 知识库存储失败不影响主流程
-                print(f"知识库存储失败: {str(e)}")
-        
-        return {
+        knowledge_id = save_to_knowledge_base(
+            db, current_user, duplicate, duplicate_action, revision, fingerprint,
+            title=f"批量XML文档分析：{len(processed_files)}个文件",
+            content=combined_text,
+            analysis=ai_analysis_xml,
+            source_file=", ".join(processed_files),
+            tags="批量分析,多文档,XML",
+            ai_analysis=structured_analysis
+        )
+        
+        response = {
             "message": f"批量XML分析完成，共处理 {len(processed_files)} 个文件",
             "processed_files": processed_files,
             "total_files": len(processed_files),
             "xml_analysis": ai_analysis_xml,
+            "structured_analysis": structured_analysis,
+            "analysis_mode": mode,
             "xml_file": result_filename,
             "download_url": f"/api/document/download/{result_filename}",
             "knowledge_id": knowledge_id,
+            "text_normalization": summarize_normalization(normalizations),
             "status": "success"
         }
+        if duplicate:
+            response["duplicate"] = duplicate.to_dict(duplicate_action)
+        if revision is not None:
+            response["revision"] = revision.to_dict()
+        if progressive:
+            response.update(start_progressive_upgrade(
+                "xml", ai_analysis_xml, structured_analysis, knowledge_id, result_filename,
+                analyze=lambda: analyze_for_xml_endpoint(combined_text, mode, Priority.BATCH),
+                render_summary=lambda analysis: generate_batch_xml_summary(all_texts, analysis, total_word_count)
+            ))
+        return response
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"批量XML分析失败: {str(e)}")
@@ -368,44 +673,109 @@ async def download_file(
         media_type='application/xml'
     )
 
+def _get_analysis_job(analysis_id: str) -> AnalysisJob:
+    job = progressive_analysis.get(analysis_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="分析任务不存在或已过期")
+    return job
+
+@router.get("/analysis/{analysis_id}")
+async def get_progressive_analysis(
+    analysis_id: str,
+    current_user: Union[User, dict] = Depends(get_current_user_or_guest)
+):
+    """获取渐进式分析的当前结果（初步结果或升级后的LLM结果）"""
+    return _get_analysis_job(analysis_id).to_dict()
+
+@router.get("/analysis/{analysis_id}/events")
+async def subscribe_progressive_analysis(
+    analysis_id: str,
+    current_user: Union[User, dict] = Depends(get_current_user_or_guest)
+):
+    """订阅渐进式分析的状态变化（SSE），任务结束后关闭连接"""
+    job = _get_analysis_job(analysis_id)
+    
+    async def generate_events():
+        async for state in progressive_analysis.watch(job):
+            yield f"data: {json.dumps({'type': 'status', 'data': state.to_dict()}, ensure_ascii=False)}\n\n"
+        yield f"data: {json.dumps({'type': 'done', 'data': None}, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(
+        generate_events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive"
+        }
+    )
+
 @router.get("/results")
 async def list_analysis_results(
+    limit: int = Query(50, ge=1, le=200, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="分页游标，取自上一页的 next_cursor"),
     current_user: Union[User, dict] = Depends(get_current_user_or_guest)
 ):
-    """获取分析结果列表"""
+    """获取分析结果列表（按创建时间倒序，游标分页）"""
     try:
         # 游客用户返回空列表
         if isinstance(current_user, dict) and current_user.get("is_guest", False):
             return {
                 "message": "游客模式下无历史记录",
                 "total": 0,
-                "results": []
+                "results": [],
+                "next_cursor": None,
+                "has_more": False
             }
         
-        results = []
-        
+        position = None
+        if cursor:
+            try:
+                position = decode_cursor(cursor)
+                position = (float(position["created"]), str(position["filename"]))
+            except (ValueError, KeyError, TypeError):
+                raise HTTPException(status_code=400, detail="无效的分页游标")
+        
+        # 只保留排序键在游标之后的文件，用堆取本页，不对整个目录排序
+        total = 0
+        entries = []
         if os.path.exists(RESULTS_FOLDER):
-            for filename in os.listdir(RESULTS_FOLDER):
-                if filename.endswith('.xml'):
-                    file_path = os.path.join(RESULTS_FOLDER, filename)
-                    file_stat = os.stat(file_path)
-                    
-                    results.append({
-                        "filename": filename,
-                        "size": file_stat.st_size,
-                        "created_time": datetime.fromtimestamp(file_stat.st_ctime).strftime("%Y-%m-%d %H:%M:%S"),
-                        "download_url": f"/api/document/download/{filename}"
-                    })
-        
-        # 按创建时间倒序排列
-        results.sort(key=lambda x: x["created_time"], reverse=True)
+            with os.scandir(RESULTS_FOLDER) as scanner:
+                for entry in scanner:
+                    if not entry.name.endswith('.xml'):
+                        continue
+                    total += 1
+                    file_stat = entry.stat()
+                    key = (file_stat.st_ctime, entry.name)
+                    if position is None or key < position:
+                        entries.append((key, file_stat.st_size))
+        
+        page = heapq.nlargest(limit + 1, entries)
+        page, has_more = split_page(page, limit)
+        
+        results = [
+            {
+                "filename": filename,
+                "size": size,
+                "created_time": datetime.fromtimestamp(created).strftime("%Y-%m-%d %H:%M:%S"),
+                "download_url": f"/api/document/download/{filename}"
+            }
+            for (created, filename), size in page
+        ]
+        next_cursor = None
+        if has_more:
+            (created, filename), _ = page[-1]
+            next_cursor = encode_cursor({"created": created, "filename": filename})
         
         return {
             "message": "分析结果列表",
-            "total": len(results),
-            "results": results
+            "total": total,
+            "results": results,
+            "next_cursor": next_cursor,
+            "has_more": has_more
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取结果列表失败: {str(e)}")
 
@@ -4,7 +4,7 @@ GraphRAG API 端点
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel, Field
 import logging
@@ -68,8 +68,8 @@ async def build_graphrag_index(
                 detail="GraphRAG不可用，请检查安装和API密钥配置"
             )
         
-        # 获取知识库数据
-        query = db.query(KnowledgeBase)
+        # 获取知识库数据（索引需要完整正文，一次性预加载）
+        query = db.query(KnowledgeBase).options(selectinload(KnowledgeBase.body))
         
         if request.knowledge_ids:
             query = query.filter(KnowledgeBase.id.in_(request.knowledge_ids))
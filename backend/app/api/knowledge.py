@@ -5,17 +5,28 @@ from typing import List, Optional
 from datetime import datetime
 import json
 import io
+import time
+import uuid
 import zipfile
-from xml.dom.minidom import parseString
 
 from app.models.database import get_db
+from app.models.knowledge_base import KnowledgeSummaryNode
 from app.models.knowledge_schemas import (
     KnowledgeBase, KnowledgeBaseCreate, KnowledgeBaseUpdate, KnowledgeBaseList,
     KnowledgeSearchRequest, KnowledgeSearchResult, KnowledgeQACreate, 
     KnowledgeQAResponse, KnowledgeQAFeedback, PresetQuestion, PresetQuestionCreate,
-    KnowledgeStats
+    KnowledgeStats, KnowledgeBulkQARequest
 )
 from app.services.knowledge_service import KnowledgeService
+from app.services.corpus_stats_service import corpus_stats
+from app.services.near_duplicate_service import near_duplicates
+from app.services.knowledge_revision_service import knowledge_revisions
+from app.services.summary_tree_service import summary_tree
+from app.services.answer_cache_service import answer_cache
+from app.services.preset_answer_service import preset_answers
+from app.services.conversation_memory_service import conversation_memory
+from app.config.anti_blocking_config import config
+from app.services.document_service import render_enterprise_info_xml
 from app.services.auth_service import get_current_active_user, get_current_registered_user
 from app.models.user import User
 
@@ -52,17 +63,77 @@ async def get_knowledge_item(
     
     return knowledge_item
 
-@router.post("/search", response_model=KnowledgeSearchResult)
+@router.get("/items/{knowledge_id}/versions")
+async def list_knowledge_versions(
+    knowledge_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """获取知识条目的修订列表（当前修订在前）"""
+    knowledge_item = KnowledgeService.get_knowledge_by_id(db, knowledge_id)
+    if not knowledge_item:
+        raise HTTPException(status_code=404, detail="知识条目不存在")
+    
+    versions = [{
+        "revision": knowledge_item.revision,
+        "content_length": knowledge_item.content_length,
+        "summary": knowledge_item.summary,
+        "is_current": True,
+        "updated_at": knowledge_item.updated_at or knowledge_item.created_at
+    }]
+    for version in knowledge_revisions.list_versions(db, knowledge_id):
+        versions.append({
+            "revision": version.version_number,
+            "content_length": version.content_length,
+            "summary": version.summary,
+            "changed_sections": version.changed_sections,
+            "is_current": False,
+            "replaced_at": version.created_at
+        })
+    return {"knowledge_id": knowledge_id, "versions": versions}
+
+@router.get("/items/{knowledge_id}/versions/{revision}")
+async def get_knowledge_version(
+    knowledge_id: int,
+    revision: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """获取知识条目指定修订的正文和分析结果"""
+    knowledge_item = KnowledgeService.get_knowledge_by_id(db, knowledge_id)
+    if not knowledge_item:
+        raise HTTPException(status_code=404, detail="知识条目不存在")
+    
+    version = knowledge_revisions.get_version(db, knowledge_item, revision)
+    if version is None:
+        raise HTTPException(status_code=404, detail="版本不存在")
+    return {"knowledge_id": knowledge_id, **version}
+
+@router.post("/search", response_model=KnowledgeSearchResult, response_model_exclude_none=True)
 async def search_knowledge(
     search_request: KnowledgeSearchRequest,
     current_user: User = Depends(get_current_registered_user),
     db: Session = Depends(get_db)
 ):
-    """搜索知识库"""
+    """搜索知识库：默认返回元数据和带高亮的摘录，完整正文通过 fields=["content"] 或详情接口获取"""
     try:
-        result = KnowledgeService.search_knowledge(db, search_request)
+        try:
+            result = KnowledgeService.search_knowledge(db, search_request)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        result["knowledge_items"] = KnowledgeService.build_search_hits(
+            db,
+            result["knowledge_items"],
+            search_request.query,
+            fields=search_request.fields,
+            snippet_count=search_request.snippet_count,
+            snippet_length=search_request.snippet_length,
+            duplicates=result["duplicates"]
+        )
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
 
@@ -76,16 +147,17 @@ async def ask_question(
     try:
         # 只有注册用户可以使用
         user_id = current_user.id
-        session_id = None
+        session_id = qa_request.session_id
         is_guest = False
         
-        result = KnowledgeService.ask_question(
+        result = await KnowledgeService.ask_question(
             db=db,
             question=qa_request.question,
             user_id=user_id,
             session_id=session_id,
             is_guest=is_guest,
-            knowledge_ids=qa_request.knowledge_ids
+            knowledge_ids=qa_request.knowledge_ids,
+            mode=qa_request.mode
         )
         
         return KnowledgeQAResponse(
@@ -93,7 +165,7 @@ async def ask_question(
             question=result["question"],
             answer=result["answer"],
             knowledge_id=result["related_knowledge"][0] if result["related_knowledge"] else None,
-            session_id=session_id,
+            session_id=result["session_id"],
             is_guest=is_guest,
             response_time=result["response_time"],
             created_at=datetime.now()
@@ -169,28 +241,138 @@ async def get_knowledge_stats(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取统计信息失败: {str(e)}")
 
+@router.get("/trending-terms")
+async def get_trending_terms(
+    limit: int = Query(20, ge=1, le=100, description="返回词项数"),
+    min_document_frequency: int = Query(2, ge=1, description="最少出现在多少个文档中"),
+    current_user: User = Depends(get_current_registered_user),
+    db: Session = Depends(get_db)
+):
+    """获取知识库语料热门词项（按TF-IDF关键词权重累计排序）"""
+    try:
+        terms = KnowledgeService.get_trending_terms(db, limit, min_document_frequency)
+        return {"terms": terms, "total": len(terms)}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取热门词项失败: {str(e)}")
+
+@router.post("/corpus/rebuild", status_code=202)
+async def rebuild_corpus_stats(
+    current_user: User = Depends(get_current_active_user)
+):
+    """在后台重建语料统计和全部条目的关键词（仅管理员），进度和结果见 GET 同一路径"""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="权限不足")
+    rebuild, started = corpus_stats.start_rebuild()
+    return {
+        "message": "语料统计重建已在后台开始" if started else "已有语料统计重建在进行中",
+        "rebuild": rebuild,
+        "status_url": "/api/knowledge/corpus/rebuild"
+    }
+
+@router.get("/corpus/rebuild")
+async def get_corpus_rebuild_status(
+    current_user: User = Depends(get_current_active_user)
+):
+    """获取最近一次语料统计重建的状态（仅管理员）"""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="权限不足")
+    return {"rebuild": corpus_stats.rebuild_job.state}
+
+@router.post("/dedup/backfill", status_code=202)
+async def backfill_near_duplicate_index(
+    current_user: User = Depends(get_current_active_user)
+):
+    """在后台为尚无签名的知识条目补算近似重复签名（仅管理员），进度和结果见 GET 同一路径"""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="权限不足")
+    backfill, started = near_duplicates.start_backfill()
+    return {
+        "message": "近似重复签名补算已在后台开始" if started else "已有近似重复签名补算在进行中",
+        "backfill": backfill,
+        "status_url": "/api/knowledge/dedup/backfill"
+    }
+
+@router.get("/dedup/backfill")
+async def get_near_duplicate_backfill_status(
+    current_user: User = Depends(get_current_active_user)
+):
+    """获取最近一次近似重复签名补算的状态（仅管理员）"""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="权限不足")
+    return {"backfill": near_duplicates.backfill_job.state}
+
+@router.get("/summary-tree")
+async def get_summary_tree(
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """获取层次摘要树的概况：各层节点数、语料摘要和主题簇"""
+    try:
+        clusters = db.query(KnowledgeSummaryNode).filter(
+            KnowledgeSummaryNode.level == "cluster"
+        ).order_by(KnowledgeSummaryNode.child_count.desc()).all()
+        return {
+            **summary_tree.get_stats(db),
+            "clusters": [
+                {
+                    "id": cluster.id,
+                    "summary": cluster.summary,
+                    "documents": cluster.child_count,
+                    "keywords": [keyword["term"] for keyword in (cluster.keywords or [])[:10]],
+                    "updated_at": cluster.updated_at or cluster.created_at
+                }
+                for cluster in clusters
+            ]
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取摘要树失败: {str(e)}")
+
+@router.post("/summary-tree/build", status_code=202)
+async def build_summary_tree(
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="本轮最多处理的文档数，默认 SUMMARY_TREE_BATCH"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """在后台执行一轮摘要树增量构建（仅管理员），进度和结果见 GET /summary-tree 的 manual_build"""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="权限不足")
+    build, started = summary_tree.start_build(limit)
+    return {
+        "message": "摘要树增量构建已在后台开始" if started else "已有摘要树构建在进行中",
+        "build": build,
+        "status_url": "/api/knowledge/summary-tree"
+    }
+
 @router.get("/qa-history")
 async def get_qa_history(
     limit: int = Query(20, ge=1, le=100, description="返回数量限制"),
+    cursor: Optional[str] = Query(None, description="分页游标，取自上一页的 next_cursor"),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """获取问答历史"""
+    """获取问答历史（按时间倒序，游标分页）"""
     try:
         # 只有注册用户可以查看历史
         user_id = current_user.id
         session_id = None
         
-        history = KnowledgeService.get_user_qa_history(
-            db=db,
-            user_id=user_id,
-            session_id=session_id,
-            limit=limit
-        )
+        try:
+            history, next_cursor = KnowledgeService.get_user_qa_history(
+                db=db,
+                user_id=user_id,
+                session_id=session_id,
+                limit=limit,
+                cursor=cursor
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         return {
             "history": history,
-            "total": len(history)
+            "total": len(history),
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         }
         
     except HTTPException:
@@ -219,6 +401,30 @@ async def create_preset_question(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"创建预设问题失败: {str(e)}")
 
+@router.post("/preset-questions/precompute", status_code=202)
+async def precompute_preset_answers(
+    limit: Optional[int] = Query(None, ge=1, le=100, description="本轮最多重新生成的答案数，默认 PRESET_ANSWER_BATCH"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """在后台检查并重新生成需要刷新的预设问题答案（仅管理员），进度和结果见 GET 同一路径"""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="权限不足")
+    refresh, started = preset_answers.start_refresh(limit)
+    return {
+        "message": "预设问题答案刷新已在后台开始" if started else "已有预设问题答案刷新在进行中",
+        "refresh": refresh,
+        "status_url": "/api/knowledge/preset-questions/precompute"
+    }
+
+@router.get("/preset-questions/precompute")
+async def get_preset_answer_status(
+    current_user: User = Depends(get_current_active_user)
+):
+    """获取预设问题答案的预生成状态（仅管理员）"""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="权限不足")
+    return preset_answers.get_stats()
+
 @router.post("/init-preset-questions")
 async def init_preset_questions(
     current_user: User = Depends(get_current_active_user),
@@ -256,9 +462,8 @@ async def delete_knowledge_item(
         if knowledge_item.created_by != current_user.id and not current_user.is_superuser:
             raise HTTPException(status_code=403, detail="权限不足，只能删除自己创建的文档")
         
-        # 软删除：将is_active设为False
-        knowledge_item.is_active = False
-        db.commit()
+        # 软删除：将is_active设为False，同时更新语料统计
+        KnowledgeService.soft_delete_knowledge(db, knowledge_item)
         
         return {"message": "文档删除成功", "id": knowledge_id}
         
@@ -303,12 +508,11 @@ async def export_selected_documents(
                 filename = f"{i:02d}_{sanitize_filename(item.title)}.md"
                 zip_file.writestr(filename, doc_content.encode('utf-8'))
                 
-                # 如果有分析结果，也创建XML格式
-                if item.summary and "企业信息XML结构" in item.summary:
-                    xml_content = extract_xml_from_summary(item.summary)
-                    if xml_content:
-                        xml_filename = f"{i:02d}_{sanitize_filename(item.title)}.xml"
-                        zip_file.writestr(xml_filename, xml_content.encode('utf-8'))
+                # 如果有结构化分析结果，也创建XML格式
+                if item.ai_analysis:
+                    xml_content = render_enterprise_info_xml(item.ai_analysis)
+                    xml_filename = f"{i:02d}_{sanitize_filename(item.title)}.xml"
+                    zip_file.writestr(xml_filename, xml_content.encode('utf-8'))
         
         zip_buffer.seek(0)
         
@@ -331,6 +535,45 @@ async def export_selected_documents(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"导出失败: {str(e)}")
 
+@router.post("/ask-bulk")
+async def ask_questions_bulk(
+    bulk_request: KnowledgeBulkQARequest,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """批量问答：以NDJSON逐行返回每个问题的结果（按完成顺序，index 为问题在列表中的位置），最后一行为汇总"""
+    questions = [question.strip() for question in bulk_request.questions]
+    if not all(questions):
+        raise HTTPException(status_code=400, detail="问题不能为空")
+    
+    async def generate_lines():
+        try:
+            async for item in KnowledgeService.ask_questions_bulk(
+                db,
+                questions,
+                user_id=current_user.id,
+                knowledge_ids=bulk_request.knowledge_ids,
+                mode=bulk_request.mode,
+                concurrency=bulk_request.concurrency
+            ):
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        except Exception as e:
+            db.rollback()
+            yield json.dumps({"type": "error", "error": f"批量问答失败: {str(e)}"}, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(
+        generate_lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+def replay_answer_events(answer: str):
+    """把已有的完整答案切成SSE内容分片"""
+    step = config.ANSWER_CACHE_REPLAY_CHARS
+    for start in range(0, len(answer), step):
+        chunk = answer[start:start + step]
+        yield f"data: {json.dumps({'type': 'content', 'data': chunk}, ensure_ascii=False)}\n\n"
+
 @router.post("/ask-stream")
 async def ask_question_stream(
     qa_request: KnowledgeQACreate,
@@ -341,48 +584,69 @@ async def ask_question_stream(
     try:
         # 只有注册用户可以使用
         user_id = current_user.id
-        session_id = None
+        session_id = qa_request.session_id or str(uuid.uuid4())
         is_guest = False
         
         # 使用生成器函数进行流式输出
-        def generate_stream():
+        async def generate_stream():
+            start_time = time.time()
             try:
-                # 获取相关知识库内容
-                context_items = []
-                used_knowledge_ids = []
-                
-                if qa_request.knowledge_ids and len(qa_request.knowledge_ids) > 0:
-                    for knowledge_id in qa_request.knowledge_ids:
-                        item = KnowledgeService.get_knowledge_by_id(db, knowledge_id)
-                        if item and item.is_active:
-                            context_items.append(f"文档标题: {item.title}\n文档内容: {item.content}")
-                            used_knowledge_ids.append(item.id)
+                # 先告知会话ID，后续追问带上它即可延续对话
+                yield f"data: {json.dumps({'type': 'session', 'data': session_id}, ensure_ascii=False)}\n\n"
+                history = await conversation_memory.history(db, user_id, session_id)
                 
-                if not context_items:
-                    # 如果没有指定文档，搜索相关知识
-                    from app.models.knowledge_schemas import KnowledgeSearchRequest
-                    search_request = KnowledgeSearchRequest(
-                        query=qa_request.question,
-                        limit=5
+                # 预设问题直接回放后台预先生成的答案（会话中的追问除外）
+                preset = preset_answers.lookup(qa_request.question) \
+                    if not qa_request.knowledge_ids and qa_request.mode == "search" and not history else None
+                if preset is not None:
+                    for event in replay_answer_events(preset.answer):
+                        yield event
+                    conversation_memory.remember(db, user_id, session_id, qa_request.question, preset.answer)
+                    KnowledgeService.record_qa(
+                        db, qa_request.question, preset.answer, preset.knowledge_ids, user_id, session_id,
+                        is_guest, int((time.time() - start_time) * 1000)
                     )
-                    search_result = KnowledgeService.search_knowledge(db, search_request)
-                    
-                    for item in search_result["knowledge_items"]:
-                        context_items.append(f"文档标题: {item.title}\n文档内容: {item.content[:800]}...")
-                        used_knowledge_ids.append(item.id)
+                    yield f"data: {json.dumps({'type': 'done', 'data': None}, ensure_ascii=False)}\n\n"
+                    return
+                
+                # 获取相关知识库内容（与非流式问答相同的上下文构建，不计入文档浏览）
+                context_items, used_knowledge_ids, _ = KnowledgeService.build_qa_context(
+                    db, qa_request.question, qa_request.knowledge_ids, qa_request.mode
+                )
                 
                 context = "\n\n=== 分隔符 ===\n\n".join(context_items)
                 
-                # 流式调用OpenAI API
-                answer_chunks = KnowledgeService.ask_question_stream(
-                    question=qa_request.question,
-                    context=context,
-                    context_count=len(context_items)
-                )
+                fingerprint = KnowledgeService.qa_context_fingerprint(db, used_knowledge_ids, context)
+                cached = answer_cache.get(qa_request.question, fingerprint) if not history else None
+                if cached is not None:
+                    # 回放缓存的答案
+                    answer = cached.answer
+                    for event in replay_answer_events(answer):
+                        yield event
+                else:
+                    # 流式调用OpenAI API
+                    answer_chunks = KnowledgeService.ask_question_stream(
+                        question=qa_request.question,
+                        context=context,
+                        context_count=len(context_items),
+                        history=history
+                    )
+                    
+                    # 发送流式响应，完整生成后写入缓存（会话中的追问不写入）
+                    answer_parts = []
+                    async for chunk in answer_chunks:
+                        answer_parts.append(chunk)
+                        yield f"data: {json.dumps({'type': 'content', 'data': chunk}, ensure_ascii=False)}\n\n"
+                    answer = "".join(answer_parts).strip()
+                    if not history:
+                        answer_cache.put(qa_request.question, fingerprint, answer, used_knowledge_ids)
+                conversation_memory.remember(db, user_id, session_id, qa_request.question, answer)
                 
-                # 发送流式响应
-                for chunk in answer_chunks:
-                    yield f"data: {json.dumps({'type': 'content', 'data': chunk}, ensure_ascii=False)}\n\n"
+                # 与非流式问答一样记录问答，会话被淘汰或在其他进程中继续时据此恢复历史
+                KnowledgeService.record_qa(
+                    db, qa_request.question, answer, used_knowledge_ids, user_id, session_id,
+                    is_guest, int((time.time() - start_time) * 1000)
+                )
                 
                 # 发送完成信号
                 yield f"data: {json.dumps({'type': 'done', 'data': None}, ensure_ascii=False)}\n\n"
@@ -471,7 +735,7 @@ def generate_document_markdown(item, index: int) -> str:
 
 ## 内容摘要
 {item.summary or '无摘要'}
-
+{format_structured_analysis(item.ai_analysis)}
 ## 原始内容
 ```
 {item.content}
@@ -489,26 +753,29 @@ def generate_document_markdown(item, index: int) -> str:
 """
     return content
 
-def extract_xml_from_summary(summary: str) -> str:
-    """从摘要中提取XML内容"""
-    try:
-        # 查找XML结构开始和结束位置
-        xml_start = summary.find('<enterprise_info>')
-        xml_end = summary.find('</enterprise_info>')
-        
-        if xml_start != -1 and xml_end != -1:
-            xml_content = summary[xml_start:xml_end + len('</enterprise_info>')]
-            
-            # 格式化XML
-            try:
-                dom = parseString(xml_content)
-                return dom.toprettyxml(indent="  ", encoding=None)
-            except:
-                return xml_content
-        
-        return None
-    except Exception:
-        return None
+def format_structured_analysis(ai_analysis) -> str:
+    """将结构化分析结果格式化为Markdown段落"""
+    if not ai_analysis:
+        return ""
+    
+    lines = ["", "## 结构化分析"]
+    text_fields = [
+        ("公司名称", "company_name"),
+        ("主要业务", "main_business"),
+        ("成立信息", "establishment_info"),
+        ("目标客户", "target_customers"),
+        ("其他信息", "additional_info"),
+    ]
+    for label, field in text_fields:
+        if ai_analysis.get(field):
+            lines.append(f"- **{label}**: {ai_analysis[field]}")
+    
+    for label, field in [("关键特色", "key_features"), ("服务内容", "services")]:
+        if ai_analysis.get(field):
+            lines.append(f"- **{label}**:")
+            lines.extend(f"  - {value}" for value in ai_analysis[field])
+    
+    return "\n".join(lines) + "\n"
 
 def sanitize_filename(filename: str) -> str:
     """清理文件名，移除非法字符"""
@@ -5,6 +5,7 @@
 """
 
 import asyncio
+import os
 import time
 from typing import Dict, Any, Optional
 from dataclasses import dataclass, field
@@ -43,11 +44,82 @@ class AntiBlockingConfig:
     # 连接池配置
     MAX_CONNECTIONS: int = 10
     CONNECTION_TIMEOUT: float = 5.0  # 缩短连接超时
+    KEEPALIVE_EXPIRY: float = 60.0   # 空闲keep-alive连接保留时间
     
     # 任务队列配置
     MAX_QUEUE_SIZE: int = 100
     TASK_TIMEOUT: float = 180.0  # 缩短任务超时到3分钟
     
+    # OpenAI调度配置（与账号的速率限制保持一致）
+    OPENAI_RPM: int = int(os.getenv("OPENAI_RPM", "500"))              # 每分钟请求数
+    OPENAI_TPM: int = int(os.getenv("OPENAI_TPM", "200000"))           # 每分钟token数
+    OPENAI_MAX_CONCURRENCY: int = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+    OPENAI_MIN_CONCURRENCY: int = 1
+    OPENAI_LATENCY_TARGET: float = 15.0  # 响应延迟超过该值时收缩并发（秒）
+    OPENAI_QUEUE_TIMEOUT: float = 60.0   # 排队等待调度许可的最长时间（秒）
+    REQUEST_LLM_BUDGET: float = 30.0     # 请求内等待LLM的总时长（排队+调用，秒），超过后本地降级；须小于中间件对上传和问答的超时（DEFAULT_TIMEOUT*2）
+    
+    # LLM请求对冲配置（仅对显式开启的交互调用生效）
+    LLM_HEDGE_PERCENTILE: float = 0.9    # 超过近期延迟的该分位数仍未响应时补发请求
+    LLM_HEDGE_MIN_DELAY: float = 2.0     # 对冲等待时间下限（秒）
+    LLM_HEDGE_BUDGET: float = 0.1        # 对冲请求数占可对冲调用数的比例上限
+    LLM_HEDGE_MIN_SAMPLES: int = 10      # 延迟样本不足时不对冲
+    
+    # 自动标签配置
+    TAG_DICTIONARY_PATH: str = os.getenv("TAG_DICTIONARY_PATH", "")  # 标签词典文件，每行一个词
+    TAG_DICTIONARY_REFRESH: float = 300.0  # 从knowledge_tags重新加载词典的间隔（秒）
+    MAX_AUTO_TAGS: int = 5                 # 每个知识条目自动提取的标签数上限
+    
+    # 语料统计配置
+    CORPUS_KEYWORDS_TOP_K: int = 10        # 每个知识条目保存的TF-IDF关键词数
+    CORPUS_SNAPSHOT_TTL: float = 60.0      # 热门词项数组快照的有效期（秒）
+    
+    # 知识库统计配置
+    KNOWLEDGE_STATS_CACHE_TTL: float = 10.0       # 统计结果进程内缓存时间（秒）
+    KNOWLEDGE_STATS_RECONCILE_INTERVAL: float = 3600.0  # 计数器校准间隔（秒）
+    
+    # 近似重复检测配置（阈值为MinHash估计的Jaccard相似度）
+    DEDUP_REUSE_THRESHOLD: float = 0.95    # 上传文档与已有条目相似度不低于该值时直接复用已有分析
+    DEDUP_VERSION_THRESHOLD: float = 0.8   # 不低于该值时作为已有条目的新版本入库
+    DEDUP_HIT_THRESHOLD: float = 0.9       # 检索结果中相似度不低于该值的命中只保留一条
+    DEDUP_MAX_CHARS: int = 200000          # 计算签名时使用的正文字符数上限
+    
+    # 文档修订配置
+    REVISION_FULL_ANALYSIS_RATIO: float = 0.3  # 段落变更比例超过该值时做完整分析而不是增量分析
+    
+    # 层次摘要树配置
+    SUMMARY_TREE_INTERVAL: float = 60.0      # 后台增量构建的间隔（秒）
+    SUMMARY_TREE_BATCH: int = 10             # 每轮最多处理的新增/修订文档数
+    SUMMARY_CHUNK_CHARS: int = 3000          # 文档分块的目标长度（字符）
+    SUMMARY_MAX_CHUNKS: int = 16             # 每个文档的分块数上限（更长的文档增大分块）
+    SUMMARY_CLUSTER_SIZE: int = 20           # 每个主题簇的文档数上限
+    SUMMARY_CLUSTER_SIMILARITY: float = 0.2  # 文档加入已有簇所需的关键词余弦相似度
+    SUMMARY_TREE_BEAM: int = 3               # 问答时每层展开的节点数
+    SUMMARY_TREE_CONTEXT_TOKENS: int = 3000  # tree模式问答的上下文token上限
+    
+    # 问答答案缓存配置
+    ANSWER_CACHE_MAX_ENTRIES: int = 2000     # 缓存的答案条数上限（LRU淘汰）
+    ANSWER_CACHE_TTL: float = 86400.0        # 答案缓存存活时间（秒）
+    ANSWER_CACHE_SIMILARITY: float = 0.0     # 同一上下文下改写问题命中缓存所需的词项余弦相似度（如0.9），0表示只做精确匹配
+    ANSWER_CACHE_REPLAY_CHARS: int = 20      # 流式接口回放缓存答案时每个分片的字符数
+    
+    # 预设问题答案预生成配置
+    PRESET_ANSWER_INTERVAL: float = 300.0        # 后台检查预设问题答案是否需要刷新的间隔（秒）
+    PRESET_ANSWER_BATCH: int = 5                 # 每轮最多重新生成的答案数（按点击次数优先）
+    PRESET_ANSWER_CHANGE_THRESHOLD: float = 0.3  # 检索到的上下文文档（ID和版本）变化比例达到该值时重新生成
+    PRESET_ANSWER_MAX_AGE: float = 7 * 86400.0   # 答案的最长保留时间（秒），超过后重新生成
+    
+    # 问答会话记忆配置
+    CONVERSATION_RECENT_TOKENS: int = 1500     # 原文保留的最近几轮问答的token上限
+    CONVERSATION_SUMMARY_TOKENS: int = 400     # 较早轮次折叠成的滚动摘要的token上限
+    CONVERSATION_IDLE_TTL: float = 1800.0      # 会话空闲超过该时间后从内存淘汰（秒）
+    CONVERSATION_MAX_SESSIONS: int = 10000     # 内存中保留的会话数上限
+    CONVERSATION_LOAD_TURNS: int = 10          # 会话不在内存中时从问答记录恢复的最多轮数
+    CONVERSATION_FOLD_WAIT: float = 5.0        # 提问时等待上一次摘要折叠完成的最长时间（秒）
+    
+    # 批量问答配置
+    BULK_QA_CONCURRENCY: int = 4               # 批量问答默认同时生成的答案数（请求可指定，上限16）
+    
     # 熔断器配置 - 使用field(default_factory=...)修复dataclass问题
     circuit_breaker: CircuitBreakerConfig = field(default_factory=CircuitBreakerConfig)
 
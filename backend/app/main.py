@@ -1,4 +1,5 @@
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 import asyncio
@@ -19,6 +20,16 @@ from app.config.anti_blocking_config import (
     ServiceStatus, with_timeout_and_fallback,
     openai_circuit_breaker, database_circuit_breaker
 )
+from app.services.llm_singleflight import llm_singleflight
+from app.services.llm_governor import llm_governor
+from app.services.llm_gateway import llm_gateway
+from app.services.progressive_analysis_service import progressive_analysis
+from app.services.knowledge_stats_service import knowledge_stats
+from app.services.summary_tree_service import summary_tree
+from app.services.answer_cache_service import answer_cache
+from app.services.preset_answer_service import preset_answers
+from app.services.conversation_memory_service import conversation_memory
+from app.models.database import SessionLocal
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -60,10 +71,22 @@ async def lifespan(app: FastAPI):
     await task_queue.start_workers(worker_count=3)
     logger.info("✅ 任务队列已启动")
     
+    # 启动LLM网关（共享OpenAI连接池）
+    await llm_gateway.startup()
+    
     # 启动健康检查后台任务
     health_task = asyncio.create_task(background_health_check())
     logger.info("✅ 健康检查服务已启动")
     
+    # 启动知识库统计校准后台任务
+    stats_task = asyncio.create_task(background_stats_reconcile())
+    
+    # 启动层次摘要树增量构建后台任务
+    summary_tree_task = asyncio.create_task(background_summary_tree())
+    
+    # 启动预设问题答案预生成后台任务
+    preset_answer_task = asyncio.create_task(background_preset_answers())
+    
     logger.info("🎉 防阻塞架构启动完成！")
     
     yield
@@ -71,7 +94,11 @@ async def lifespan(app: FastAPI):
     # 关闭时
     logger.info("🛑 正在停止防阻塞架构...")
     health_task.cancel()
+    stats_task.cancel()
+    summary_tree_task.cancel()
+    preset_answer_task.cancel()
     await task_queue.stop()
+    await llm_gateway.shutdown()
     logger.info("✅ 防阻塞架构已停止")
 
 async def background_health_check():
@@ -90,6 +117,59 @@ async def background_health_check():
             logger.error(f"健康检查后台任务出错: {e}")
             await asyncio.sleep(10)
 
+def reconcile_knowledge_stats():
+    """用COUNT校准知识库统计计数器（在线程池中执行）"""
+    db = SessionLocal()
+    try:
+        knowledge_stats.reconcile(db)
+    finally:
+        db.close()
+
+async def background_stats_reconcile():
+    """后台定期校准知识库统计计数器（启动时先校准一次）"""
+    while True:
+        try:
+            await asyncio.to_thread(reconcile_knowledge_stats)
+            await asyncio.sleep(config.KNOWLEDGE_STATS_RECONCILE_INTERVAL)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f"知识库统计校准出错: {e}")
+            await asyncio.sleep(60)
+
+async def background_summary_tree():
+    """后台定期增量构建层次摘要树（每轮最多处理 SUMMARY_TREE_BATCH 个文档，有积压时不等待）"""
+    while True:
+        try:
+            db = SessionLocal()
+            try:
+                result = await summary_tree.build(db)
+            finally:
+                db.close()
+            if result["documents_built"] < config.SUMMARY_TREE_BATCH:
+                await asyncio.sleep(config.SUMMARY_TREE_INTERVAL)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f"摘要树构建出错: {e}")
+            await asyncio.sleep(60)
+
+async def background_preset_answers():
+    """后台定期刷新预设问题的预生成答案（启动时先生成一次）"""
+    while True:
+        try:
+            db = SessionLocal()
+            try:
+                await preset_answers.refresh(db)
+            finally:
+                db.close()
+            await asyncio.sleep(config.PRESET_ANSWER_INTERVAL)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f"预设问题答案刷新出错: {e}")
+            await asyncio.sleep(60)
+
 app = FastAPI(
     title="企业文档智能分析系统 (防阻塞版)",
     description="基于 OpenAI GPT-4o 的企业文档智能分析 API - 防阻塞架构",
@@ -230,6 +310,16 @@ async def detailed_health():
                 "uptime": time.time(),
                 "version": "2.0.0"
             },
+            "llm": {
+                "gateway": llm_gateway.get_stats(),
+                "singleflight": llm_singleflight.get_stats(),
+                "governor": llm_governor.get_stats(),
+                "progressive_analysis": progressive_analysis.get_stats()
+            },
+            "knowledge_stats": knowledge_stats.get_cache_stats(),
+            "answer_cache": answer_cache.get_stats(),
+            "preset_answers": preset_answers.get_stats(),
+            "conversations": conversation_memory.get_stats(),
             "configuration": {
                 "timeouts": {
                     "quick": config.QUICK_TIMEOUT,
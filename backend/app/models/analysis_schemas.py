@@ -0,0 +1,47 @@
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, List, Dict, Any
+
+# 文档分析结构化输出模式（与 <enterprise_info> XML 结构一一对应）
+class EnterpriseInfo(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    company_name: Optional[str] = Field(None, description="公司名称，未提及时为null")
+    main_business: str = Field(..., description="详细的主要业务描述")
+    establishment_info: Optional[str] = Field(None, description="成立信息")
+    key_features: List[str] = Field(default_factory=list, description="主要特色")
+    target_customers: Optional[str] = Field(None, description="目标客户群体描述")
+    services: List[str] = Field(default_factory=list, description="具体服务内容")
+    additional_info: Optional[str] = Field(None, description="其他重要信息")
+    analysis_note: Optional[str] = Field(None, description="分析备注")
+
+    def to_analysis_dict(self, format: str = "structured") -> Dict[str, Any]:
+        """转换为存入 knowledge_base.ai_analysis 的字典；format标记结果来源"""
+        return {"format": format, **self.model_dump()}
+
+def _nullable(schema_type: str, description: str) -> Dict[str, Any]:
+    return {"type": [schema_type, "null"], "description": description}
+
+# OpenAI structured outputs (strict模式) 使用的JSON Schema：
+# 所有字段必须列入required，可选字段通过null类型表达
+ENTERPRISE_INFO_JSON_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "company_name": _nullable("string", "公司名称，文档未提及时为null"),
+        "main_business": {"type": "string", "description": "详细的主要业务描述"},
+        "establishment_info": _nullable("string", "成立信息，没有则为null"),
+        "key_features": {
+            "type": "array", "items": {"type": "string"}, "description": "主要特色"
+        },
+        "target_customers": _nullable("string", "目标客户群体描述"),
+        "services": {
+            "type": "array", "items": {"type": "string"}, "description": "具体服务内容"
+        },
+        "additional_info": _nullable("string", "其他重要信息"),
+        "analysis_note": _nullable("string", "分析备注，通常为null"),
+    },
+    "required": [
+        "company_name", "main_business", "establishment_info", "key_features",
+        "target_customers", "services", "additional_info", "analysis_note"
+    ],
+    "additionalProperties": False,
+}
@@ -33,6 +33,17 @@ Base = declarative_base()
 # 元数据
 metadata = MetaData()
 
+def dialect_insert(db):
+    """返回当前数据库方言支持 ON CONFLICT 的 insert 构造（PostgreSQL/SQLite），其他数据库返回 None"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
 # 数据库依赖注入
 def get_db():
     """获取数据库会话"""
@@ -1,7 +1,12 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Index
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, Float, String, Text, DateTime, Boolean, ForeignKey, JSON, Index, LargeBinary
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 from .database import Base
+from app.utils.compression import compress_text, decompress_text
+
+# 知识条目在主表中保留的正文前缀长度（字符）
+CONTENT_PREFIX_LENGTH = 2000
 
 class KnowledgeCategory(Base):
     """知识库分类表"""
@@ -31,9 +36,14 @@ class KnowledgeTag(Base):
     name = Column(String(50), nullable=False, unique=True, comment="标签名称")
     color = Column(String(7), default="#007bff", comment="标签颜色(HEX)")
     description = Column(Text, comment="标签描述")
-    usage_count = Column(Integer, default=0, comment="使用次数")
+    usage_count = Column(Integer, default=0, comment="使用次数（关联的有效知识条目数）")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
     
+    # 索引
+    __table_args__ = (
+        Index('idx_knowledge_tags_usage', 'usage_count'),
+    )
+    
     def __repr__(self):
         return f"<KnowledgeTag(id={self.id}, name='{self.name}')>"
 
@@ -157,17 +167,29 @@ class KnowledgeBase(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False, comment="知识标题")
-    content = Column(Text, nullable=False, comment="知识内容")
+    # 正文压缩存放在 knowledge_contents 表，这里只保留开头部分用于列表和摘录
+    content_prefix = Column(Text, nullable=False, default="", comment="正文开头部分")
+    content_length = Column(Integer, nullable=False, default=0, comment="正文字符数")
     summary = Column(Text, comment="知识摘要")
     source_file = Column(String(500), comment="来源文件")
     source_type = Column(String(50), default="document", comment="来源类型")
     tags = Column(String(500), comment="标签，逗号分隔")
     
+    # AI分析相关（PostgreSQL下使用JSONB）
+    ai_analysis = Column(JSON().with_variant(JSONB(), "postgresql"), comment="AI分析结果(结构化JSON)")
+    ai_keywords = Column(JSON().with_variant(JSONB(), "postgresql"), comment="语料TF-IDF关键词[{term, weight}]")
+    
     # 用户和状态
     created_by = Column(Integer, ForeignKey("users.id"), comment="创建者ID")
     is_active = Column(Boolean, default=True, comment="是否启用")
     view_count = Column(Integer, default=0, comment="查看次数")
     
+    # 版本关联（近似重复的文档作为新版本入库时指向首个版本）
+    version_of_id = Column(Integer, ForeignKey("knowledge_base.id"), nullable=True, comment="首个版本的知识ID")
+    version_number = Column(Integer, nullable=False, default=1, comment="版本号")
+    # 就地修订（同一条目的正文更新，历史正文见 knowledge_base_versions）
+    revision = Column(Integer, nullable=False, default=1, server_default="1", comment="修订号")
+    
     # 时间戳
     created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), comment="更新时间")
@@ -175,6 +197,10 @@ class KnowledgeBase(Base):
     # 关系
     creator = relationship("User", back_populates="knowledge_items")
     qa_records = relationship("KnowledgeQA", back_populates="knowledge_item")
+    body = relationship(
+        "KnowledgeContent", uselist=False, lazy="select",
+        back_populates="knowledge", cascade="all, delete-orphan"
+    )
     
     # 索引
     __table_args__ = (
@@ -182,11 +208,198 @@ class KnowledgeBase(Base):
         Index('idx_knowledge_tags', 'tags'),
         Index('idx_knowledge_created_by', 'created_by'),
         Index('idx_knowledge_created_at', 'created_at'),
+        Index('idx_knowledge_version_of', 'version_of_id'),
+        Index('idx_knowledge_active_id', 'is_active', 'id'),  # 搜索结果的键集分页
     )
     
+    @property
+    def content(self) -> str:
+        """完整正文（首次访问时加载并解压）"""
+        if self.body is None:
+            return self.content_prefix or ""
+        return self.body.text
+    
+    @content.setter
+    def content(self, text: str):
+        text = text or ""
+        self.content_prefix = text[:CONTENT_PREFIX_LENGTH]
+        self.content_length = len(text)
+        if self.body is None:
+            self.body = KnowledgeContent()
+        self.body.text = text
+    
+    def content_head(self, length: int) -> str:
+        """正文前length个字符；前缀足够时不加载正文"""
+        if length <= CONTENT_PREFIX_LENGTH or (self.content_length or 0) <= CONTENT_PREFIX_LENGTH:
+            return (self.content_prefix or "")[:length]
+        return self.content[:length]
+    
     def __repr__(self):
         return f"<KnowledgeBase(id={self.id}, title='{self.title}')>"
 
+class KnowledgeContent(Base):
+    """知识库正文表（压缩存储，按需加载）"""
+    __tablename__ = "knowledge_contents"
+    
+    knowledge_id = Column(Integer, ForeignKey("knowledge_base.id", ondelete="CASCADE"), primary_key=True, comment="知识ID")
+    codec = Column(String(10), nullable=False, comment="压缩编码: zstd, zlib")
+    data = Column(LargeBinary, nullable=False, comment="压缩后的正文")
+    compressed_size = Column(Integer, nullable=False, default=0, comment="压缩后字节数")
+    original_size = Column(Integer, nullable=False, default=0, comment="原始UTF-8字节数")
+    # 未压缩的完整正文，只用于关键词搜索和摘录，加载正文时不读取
+    search_text = deferred(Column(Text, nullable=False, default="", comment="用于搜索的完整正文"))
+    
+    knowledge = relationship("KnowledgeBase", back_populates="body")
+    
+    # 索引：PostgreSQL 下用三元组索引支持 ILIKE '%关键词%'
+    __table_args__ = (
+        Index(
+            'idx_knowledge_contents_search_trgm', 'search_text',
+            postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}
+        ).ddl_if(dialect='postgresql'),
+    )
+    
+    @property
+    def text(self) -> str:
+        cached = self.__dict__.get("_text")
+        if cached is None:
+            cached = decompress_text(self.codec, self.data)
+            self.__dict__["_text"] = cached
+        return cached
+    
+    @text.setter
+    def text(self, value: str):
+        self.codec, self.data = compress_text(value)
+        self.compressed_size = len(self.data)
+        self.original_size = len(value.encode("utf-8"))
+        self.search_text = value
+        self.__dict__["_text"] = value
+    
+    def __repr__(self):
+        return f"<KnowledgeContent(knowledge_id={self.knowledge_id}, codec='{self.codec}')>"
+
+class KnowledgeBaseVersion(Base):
+    """知识条目历史版本表
+
+    只保存以下一版本正文为基准的反向delta（压缩），还原第n版需要从当前正文依次应用
+    第n版及之后各版本的delta。version_number 为被替换时条目的修订号（knowledge_base.revision），
+    与近似重复版本链的 knowledge_base.version_number 无关
+    """
+    __tablename__ = "knowledge_base_versions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    knowledge_id = Column(Integer, ForeignKey("knowledge_base.id", ondelete="CASCADE"), nullable=False, comment="知识ID")
+    version_number = Column(Integer, nullable=False, comment="版本号")
+    delta_codec = Column(String(10), nullable=False, comment="压缩编码: zstd, zlib")
+    delta = Column(LargeBinary, nullable=False, comment="以下一版本段落为基准的反向delta(JSON，压缩)")
+    summary = Column(Text, comment="该版本的摘要")
+    tags = Column(String(500), comment="该版本的标签")
+    ai_analysis = Column(JSON().with_variant(JSONB(), "postgresql"), comment="该版本的AI分析结果")
+    content_length = Column(Integer, nullable=False, default=0, comment="该版本正文字符数")
+    changed_sections = Column(Integer, nullable=False, default=0, comment="与下一版本相比变化的段落数")
+    created_by = Column(Integer, ForeignKey("users.id"), comment="修订者ID")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="被替换的时间")
+    
+    # 索引
+    __table_args__ = (
+        Index('idx_knowledge_base_versions_item', 'knowledge_id', 'version_number', unique=True),
+    )
+    
+    def __repr__(self):
+        return f"<KnowledgeBaseVersion(knowledge_id={self.knowledge_id}, version={self.version_number})>"
+
+class KnowledgeBaseTag(Base):
+    """知识库条目与标签关联表"""
+    __tablename__ = "knowledge_base_tags"
+    
+    knowledge_id = Column(Integer, ForeignKey("knowledge_base.id", ondelete="CASCADE"), primary_key=True, comment="知识ID")
+    tag_id = Column(Integer, ForeignKey("knowledge_tags.id", ondelete="CASCADE"), primary_key=True, comment="标签ID")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+    
+    # 索引：主键覆盖按条目查标签，反向索引覆盖按标签查条目
+    __table_args__ = (
+        Index('idx_knowledge_base_tags_tag', 'tag_id', 'knowledge_id'),
+    )
+    
+    def __repr__(self):
+        return f"<KnowledgeBaseTag(knowledge_id={self.knowledge_id}, tag_id={self.tag_id})>"
+
+class KnowledgeFingerprint(Base):
+    """知识条目MinHash签名表"""
+    __tablename__ = "knowledge_fingerprints"
+    
+    knowledge_id = Column(Integer, ForeignKey("knowledge_base.id", ondelete="CASCADE"), primary_key=True, comment="知识ID")
+    signature = Column(LargeBinary, nullable=False, comment="MinHash签名(uint32小端数组)")
+    shingle_count = Column(Integer, nullable=False, default=0, comment="不同shingle数")
+    
+    def __repr__(self):
+        return f"<KnowledgeFingerprint(knowledge_id={self.knowledge_id}, shingles={self.shingle_count})>"
+
+class KnowledgeLSHBucket(Base):
+    """MinHash签名的LSH分桶表（每个band一行）"""
+    __tablename__ = "knowledge_lsh_buckets"
+    
+    band = Column(SmallInteger, primary_key=True, comment="band序号")
+    bucket = Column(BigInteger, primary_key=True, comment="band内签名分量的哈希")
+    knowledge_id = Column(Integer, ForeignKey("knowledge_base.id", ondelete="CASCADE"), primary_key=True, comment="知识ID")
+    
+    # 索引
+    __table_args__ = (
+        Index('idx_lsh_buckets_knowledge', 'knowledge_id'),
+    )
+    
+    def __repr__(self):
+        return f"<KnowledgeLSHBucket(band={self.band}, knowledge_id={self.knowledge_id})>"
+
+class KnowledgeSummaryNode(Base):
+    """层次摘要树节点表（分块 → 文档 → 主题簇 → 语料）"""
+    __tablename__ = "knowledge_summary_nodes"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    level = Column(String(20), nullable=False, comment="层级: chunk, document, cluster, corpus")
+    parent_id = Column(Integer, ForeignKey("knowledge_summary_nodes.id", ondelete="CASCADE"), nullable=True, comment="上层节点ID")
+    knowledge_id = Column(Integer, ForeignKey("knowledge_base.id", ondelete="CASCADE"), nullable=True, comment="知识ID（分块和文档节点）")
+    position = Column(Integer, nullable=False, default=0, comment="分块在文档中的顺序")
+    summary = Column(Text, nullable=False, default="", comment="摘要")
+    keywords = Column(JSON().with_variant(JSONB(), "postgresql"), comment="关键词[{term, weight}]，用于相关性打分和聚类")
+    child_count = Column(Integer, nullable=False, default=0, comment="下层节点数")
+    source_version = Column(Integer, comment="生成摘要时的知识条目版本号（文档节点）")
+    is_stale = Column(Boolean, nullable=False, default=False, comment="成员变化后需要重新生成摘要（簇和语料节点）")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), comment="更新时间")
+    
+    # 索引
+    __table_args__ = (
+        Index('idx_summary_nodes_level', 'level'),
+        Index('idx_summary_nodes_parent', 'parent_id'),
+        Index('idx_summary_nodes_knowledge', 'knowledge_id'),
+    )
+    
+    def __repr__(self):
+        return f"<KnowledgeSummaryNode(id={self.id}, level='{self.level}')>"
+
+class KnowledgeTermStat(Base):
+    """知识库语料词项统计表（文档频率与关键词权重，增量维护）"""
+    __tablename__ = "knowledge_term_stats"
+    
+    term = Column(String(100), primary_key=True, comment="词项")
+    document_frequency = Column(Integer, nullable=False, default=0, comment="包含该词项的有效文档数")
+    keyword_weight = Column(Float, nullable=False, default=0.0, comment="作为文档关键词时的TF-IDF权重累计")
+    
+    def __repr__(self):
+        return f"<KnowledgeTermStat(term='{self.term}', df={self.document_frequency})>"
+
+class KnowledgeStatCounter(Base):
+    """知识库统计计数器表（写入时增量维护，定期校准）"""
+    __tablename__ = "knowledge_stats_counters"
+    
+    name = Column(String(50), primary_key=True, comment="计数器名称")
+    value = Column(BigInteger, nullable=False, default=0, comment="计数值")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
+    
+    def __repr__(self):
+        return f"<KnowledgeStatCounter(name='{self.name}', value={self.value})>"
+
 class KnowledgeQA(Base):
     """知识问答记录表"""
     __tablename__ = "knowledge_qa"
@@ -216,8 +429,9 @@ class KnowledgeQA(Base):
     # 索引
     __table_args__ = (
         Index('idx_qa_knowledge_id', 'knowledge_id'),
-        Index('idx_qa_user_id', 'user_id'),
-        Index('idx_qa_session_id', 'session_id'),
+        # 问答历史按用户/会话过滤、按id键集分页
+        Index('idx_qa_user_id_id', 'user_id', 'id'),
+        Index('idx_qa_session_id_id', 'session_id', 'id'),
         Index('idx_qa_created_at', 'created_at'),
     )
     
@@ -248,4 +462,25 @@ class PresetQuestion(Base):
     )
     
     def __repr__(self):
-        return f"<PresetQuestion(id={self.id}, question='{self.question[:50]}')>" 
\ No newline at end of file
+        return f"<PresetQuestion(id={self.id}, question='{self.question[:50]}')>" 
+
+class PresetAnswer(Base):
+    """预设问题的预生成答案表"""
+    __tablename__ = "preset_answers"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    preset_question_id = Column(Integer, ForeignKey("preset_questions.id", ondelete="CASCADE"), nullable=False, comment="预设问题ID")
+    question = Column(String(500), nullable=False, comment="生成答案时的问题内容")
+    answer = Column(Text, nullable=False, comment="答案")
+    context_versions = Column(JSON().with_variant(JSONB(), "postgresql"), comment="上下文文档[[知识ID, 版本号], ...]")
+    context_fingerprint = Column(String(64), comment="上下文指纹")
+    generation_time = Column(Integer, comment="生成耗时（毫秒）")
+    generated_at = Column(DateTime(timezone=True), server_default=func.now(), comment="生成时间")
+    
+    # 索引
+    __table_args__ = (
+        Index('idx_preset_answers_question', 'preset_question_id', unique=True),
+    )
+    
+    def __repr__(self):
+        return f"<PresetAnswer(id={self.id}, preset_question_id={self.preset_question_id})>"
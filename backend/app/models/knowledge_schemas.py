@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 from .auth_schemas import BaseSchema
 
@@ -11,6 +11,7 @@ class KnowledgeBaseCreate(BaseSchema):
     source_file: Optional[str] = Field(None, max_length=500, description="来源文件")
     source_type: str = Field("document", max_length=50, description="来源类型")
     tags: Optional[str] = Field(None, max_length=500, description="标签，逗号分隔")
+    ai_analysis: Optional[Dict[str, Any]] = Field(None, description="结构化AI分析结果")
 
 class KnowledgeBaseUpdate(BaseSchema):
     title: Optional[str] = Field(None, min_length=1, max_length=200)
@@ -27,9 +28,14 @@ class KnowledgeBase(BaseSchema):
     source_file: Optional[str] = None
     source_type: str
     tags: Optional[str] = None
+    ai_analysis: Optional[Dict[str, Any]] = None
+    ai_keywords: Optional[List[Dict[str, Any]]] = None
     created_by: int
     is_active: bool
     view_count: int
+    version_of_id: Optional[int] = None
+    version_number: int = 1
+    revision: int = 1
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -39,6 +45,8 @@ class KnowledgeBaseList(BaseSchema):
     summary: Optional[str] = None
     source_file: Optional[str] = None
     tags: Optional[str] = None
+    ai_analysis: Optional[Dict[str, Any]] = None
+    content_length: Optional[int] = None
     view_count: int
     created_at: datetime
 
@@ -46,6 +54,14 @@ class KnowledgeBaseList(BaseSchema):
 class KnowledgeQACreate(BaseSchema):
     question: str = Field(..., min_length=1, description="问题")
     knowledge_ids: Optional[List[int]] = Field(None, description="指定的知识文档ID列表作为上下文")
+    mode: str = Field("search", pattern="^(search|tree)$", description="上下文方式：search（检索相关文档）或 tree（遍历层次摘要树）")
+    session_id: Optional[str] = Field(None, max_length=100, description="会话ID，同一会话中的问题会带上之前的问答；不传时新建会话")
+
+class KnowledgeBulkQARequest(BaseSchema):
+    questions: List[str] = Field(..., min_length=1, max_length=500, description="问题列表（归一化后相同的问题只回答一次）")
+    knowledge_ids: Optional[List[int]] = Field(None, description="所有问题共用的上下文知识文档ID列表")
+    mode: str = Field("search", pattern="^(search|tree)$", description="上下文方式：search 或 tree")
+    concurrency: Optional[int] = Field(None, ge=1, le=16, description="同时生成的答案数，默认 BULK_QA_CONCURRENCY")
 
 class KnowledgeQAResponse(BaseSchema):
     id: int
@@ -88,12 +104,53 @@ class KnowledgeSearchRequest(BaseSchema):
     query: Optional[str] = Field(None, max_length=200, description="搜索关键词")
     tags: Optional[List[str]] = Field(None, description="标签筛选")
     source_type: Optional[str] = Field(None, description="来源类型筛选")
+    company_name: Optional[str] = Field(None, max_length=200, description="按分析出的公司名称筛选")
+    service: Optional[str] = Field(None, max_length=200, description="按分析出的服务内容筛选")
     limit: int = Field(10, ge=1, le=50, description="返回数量限制")
+    fields: Optional[List[str]] = Field(
+        None,
+        description="额外返回的字段：ai_analysis, ai_keywords, content（完整正文）；默认只返回元数据和摘录"
+    )
+    snippet_count: int = Field(2, ge=0, le=5, description="每条结果的摘录数")
+    snippet_length: int = Field(160, ge=40, le=500, description="摘录长度（字符）")
+    sort: str = Field("relevance", pattern="^(relevance|recent)$", description="排序：relevance（标题命中关键词的在前，其次按创建时间）或 recent（创建时间）")
+    cursor: Optional[str] = Field(None, description="分页游标，取自上一页的 next_cursor")
+    count: str = Field("capped", pattern="^(capped|exact|none)$", description="总数统计方式：capped（最多数到上限）、exact 或 none")
+    collapse_duplicates: bool = Field(True, description="合并同一版本链和内容近似重复的命中")
+
+class KnowledgeSnippet(BaseSchema):
+    text: str
+    offset: int = Field(description="摘录在正文中的起始位置")
+    highlights: List[List[int]] = Field(description="摘录内的高亮区间[start, end)")
+    truncated_before: bool
+    truncated_after: bool
+
+class KnowledgeSearchHit(BaseSchema):
+    id: int
+    title: str
+    title_highlights: List[List[int]] = []
+    summary: Optional[str] = None
+    source_file: Optional[str] = None
+    source_type: Optional[str] = None
+    tags: Optional[str] = None
+    view_count: int
+    created_at: datetime
+    content_length: Optional[int] = None
+    snippets: List[KnowledgeSnippet] = []
+    version_number: Optional[int] = None
+    duplicate_ids: Optional[List[int]] = Field(None, description="被合并到本条的近似重复命中ID")
+    # 以下字段仅在 fields 中请求时返回
+    ai_analysis: Optional[Dict[str, Any]] = None
+    ai_keywords: Optional[List[Dict[str, Any]]] = None
+    content: Optional[str] = None
 
 class KnowledgeSearchResult(BaseSchema):
-    knowledge_items: List[KnowledgeBaseList]
-    total: int
+    knowledge_items: List[KnowledgeSearchHit]
+    total: Optional[int] = Field(None, description="总数（count=none时不返回）")
+    total_is_exact: bool = True
     query: str
+    next_cursor: Optional[str] = None
+    has_more: bool = False
 
 # 知识库统计模式
 class KnowledgeStats(BaseSchema):
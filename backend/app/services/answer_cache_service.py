@@ -0,0 +1,196 @@
+"""
+知识问答答案缓存
+
+同一个（或换一种说法的）问题在知识库没有变化时反复提问，检索仍照常执行（开销小），
+但模型回答从缓存取：
+- 键 = 归一化问题 + 上下文指纹（上下文文档ID与修订号、上下文文本的哈希），
+  上下文中任何文档的内容或版本变化都会使指纹变化而不再命中；
+- 可选（ANSWER_CACHE_SIMILARITY > 0，默认关闭）：同一上下文指纹下没有完全相同的问题时，
+  按问题词项（去掉疑问词和虚词后的二元组和英文单词）的余弦相似度查找改写过的问题，
+  数字、数词和否定词必须完全相同（"第一季度"和"第二季度"、"允许"和"不允许"不会互相命中）；
+- 知识条目被修改、重新分析、修订或删除时按条目ID主动失效引用它的缓存项；
+- 进程内LRU，条目数和存活时间受限。
+"""
+
+import hashlib
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.config.anti_blocking_config import config
+from app.utils.text_tokenizer import tokenize
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD = re.compile(r"[\W_]+")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+# 改变问题含义的用字：数字、中文数词和否定词，改写问题与缓存问题中的这些字必须依次相同
+_GUARD = re.compile(r"\d+(?:\.\d+)?|[零一二两三四五六七八九十百千万亿半]|[不没无非未别勿莫否]")
+
+# 比较改写问题时先去掉的疑问词和虚词用字（"是什么"和"有哪些"这类问法差异不影响相似度）
+_QUESTION_STOP_CHARS = re.compile("[的了吗呢吧啊么是什哪些怎样如何请问有]")
+
+def normalize_question(question: str) -> str:
+    """全角转半角、小写、去掉空白和标点"""
+    return _NON_WORD.sub("", unicodedata.normalize("NFKC", question).lower())
+
+def question_terms(question: str) -> Counter:
+    """改写问题比较用的词项：中文二元组（保留词序信息）、英文单词和数字"""
+    text = _QUESTION_STOP_CHARS.sub("", unicodedata.normalize("NFKC", question).lower())
+    return Counter(tokenize(text) + _NUMBER.findall(text))
+
+def question_guard(question: str) -> Tuple[str, ...]:
+    """问题中的数字、数词和否定词（按出现顺序）"""
+    return tuple(_GUARD.findall(unicodedata.normalize("NFKC", question).lower()))
+
+def context_fingerprint(versions: Iterable[Tuple[int, int]], context: str) -> str:
+    """上下文指纹：(文档ID, 修订号) + 上下文文本哈希（上下文相同的普通和流式问答共享缓存）"""
+    digest = hashlib.sha256()
+    for knowledge_id, version in versions:
+        digest.update(f"{knowledge_id}:{version}|".encode("utf-8"))
+    digest.update(b"|")
+    digest.update(context.encode("utf-8"))
+    return digest.hexdigest()
+
+def _cosine(a: Counter, b: Counter) -> float:
+    if not a or not b:
+        return 0.0
+    dot = sum(count * b[term] for term, count in a.items() if term in b)
+    norm = math.sqrt(sum(c * c for c in a.values())) * math.sqrt(sum(c * c for c in b.values()))
+    return dot / norm if norm else 0.0
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    knowledge_ids: List[int]
+    terms: Counter
+    guard: Tuple[str, ...]
+    created_at: float = field(default_factory=time.monotonic)
+    hits: int = 0
+
+class AnswerCache:
+    """进程内问答答案缓存（LRU + TTL + 按知识条目失效）"""
+
+    def __init__(self, max_entries: int, ttl: float, similarity: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries: "OrderedDict[Tuple[str, str], CachedAnswer]" = OrderedDict()
+        # 上下文指纹 -> 该上下文下缓存的归一化问题（用于改写问题查找）
+        self._by_context: Dict[str, Set[str]] = {}
+        # 知识ID -> 引用它的缓存键（用于失效）
+        self._by_knowledge: Dict[int, Set[Tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, question: str, fingerprint: str) -> Optional[CachedAnswer]:
+        normalized = normalize_question(question)
+        now = time.monotonic()
+        with self._lock:
+            key = (fingerprint, normalized)
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.created_at > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self.hits += 1
+            elif self.similarity > 0:
+                key, entry = self._find_similar(fingerprint, question_terms(question), question_guard(question), now)
+                if entry is not None:
+                    self.similar_hits += 1
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            return entry
+
+    def _find_similar(self, fingerprint: str, terms: Counter, guard: Tuple[str, ...], now: float):
+        best_key, best_entry, best_score = None, None, self.similarity
+        for normalized in list(self._by_context.get(fingerprint, ())):
+            key = (fingerprint, normalized)
+            entry = self._entries[key]
+            if now - entry.created_at > self.ttl:
+                self._remove(key)
+                continue
+            if entry.guard != guard:
+                continue
+            score = _cosine(terms, entry.terms)
+            if score >= best_score:
+                best_key, best_entry, best_score = key, entry, score
+        return best_key, best_entry
+
+    def put(self, question: str, fingerprint: str, answer: str, knowledge_ids: List[int]):
+        key = (fingerprint, normalize_question(question))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CachedAnswer(
+                answer, list(knowledge_ids), question_terms(question), question_guard(question)
+            )
+            self._by_context.setdefault(fingerprint, set()).add(key[1])
+            for knowledge_id in knowledge_ids:
+                self._by_knowledge.setdefault(knowledge_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, knowledge_id: int) -> int:
+        """删除引用该知识条目的所有缓存项"""
+        with self._lock:
+            keys = self._by_knowledge.pop(knowledge_id, set())
+            for key in keys:
+                self._remove(key)
+            if keys:
+                self.invalidations += len(keys)
+                logger.debug(f"知识条目 {knowledge_id} 变更，失效 {len(keys)} 条缓存答案")
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+            self._by_knowledge.clear()
+
+    def _remove(self, key: Tuple[str, str]):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        questions = self._by_context.get(key[0])
+        if questions is not None:
+            questions.discard(key[1])
+            if not questions:
+                del self._by_context[key[0]]
+        for knowledge_id in entry.knowledge_ids:
+            keys = self._by_knowledge.get(knowledge_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_knowledge[knowledge_id]
+
+    def get_stats(self) -> Dict[str, object]:
+        lookups = self.hits + self.similar_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.similar_hits) / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations
+        }
+
+# 全局答案缓存实例
+answer_cache = AnswerCache(
+    max_entries=config.ANSWER_CACHE_MAX_ENTRIES,
+    ttl=config.ANSWER_CACHE_TTL,
+    similarity=config.ANSWER_CACHE_SIMILARITY
+)
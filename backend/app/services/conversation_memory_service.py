@@ -0,0 +1,219 @@
+"""
+问答会话记忆
+
+按 (用户, session_id) 保存多轮问答，供后续问题作为对话历史：
+- 最近的若干轮原文保留，总token数不超过 CONVERSATION_RECENT_TOKENS；
+- 超出的较早轮次在后台折叠进滚动摘要（摘要不超过 CONVERSATION_SUMMARY_TOKENS），
+  下一次提问时折叠尚未完成则最多等待 CONVERSATION_FOLD_WAIT 秒，超时改用本地摘录；
+- 进程内LRU，空闲超过 CONVERSATION_IDLE_TTL 的会话被淘汰；淘汰后或在其他进程中
+  继续同一会话时，从 knowledge_qa 载入最近的问答（只恢复原文部分）。
+因此每次问答附带的历史token数有固定上限，与会话长度无关。
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+
+from sqlalchemy import desc
+from sqlalchemy.orm import Session
+
+from app.config.anti_blocking_config import config
+from app.models.knowledge_base import KnowledgeQA
+from app.services.llm_gateway import llm_gateway
+from app.services.llm_governor import Priority
+from app.services.local_analysis_service import extract_key_sentences
+from app.utils.text_tokenizer import split_sentences
+from app.utils.token_utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MODEL = "gpt-4o-mini"
+
+# 本地摘录时每个回答保留的句子数
+LOCAL_FOLD_SENTENCES = 2
+
+FOLD_PROMPT = (
+    "你负责维护一段问答对话的滚动摘要。请把已有摘要和新增的几轮问答合并为一段新的摘要，"
+    "保留用户关心的对象、问题和回答中的关键结论与数据，省略客套和重复内容，不超过{limit}字。"
+)
+
+@dataclass
+class Turn:
+    question: str
+    answer: str
+    tokens: int
+
+@dataclass
+class ConversationSession:
+    summary: str = ""
+    turns: Deque[Turn] = field(default_factory=deque)
+    # 已移出原文窗口、等待折叠进摘要的轮次
+    pending: List[Turn] = field(default_factory=list)
+    # 正在折叠的轮次
+    folding: List[Turn] = field(default_factory=list)
+    fold_task: Optional[asyncio.Task] = None
+    last_active: float = field(default_factory=time.monotonic)
+
+    @property
+    def recent_tokens(self) -> int:
+        return sum(turn.tokens for turn in self.turns)
+
+def trim_to_tokens(text: str, budget: int) -> str:
+    """超出预算时从开头（较早的内容）截去"""
+    while text and estimate_tokens(text) > budget:
+        text = text[max(1, len(text) // 10):]
+    return text
+
+def local_fold(summary: str, turns: List[Turn], budget: int) -> str:
+    """本地折叠：已有摘要 + 每轮的问题和回答的关键句"""
+    parts = [summary] if summary else []
+    for turn in turns:
+        sentences = split_sentences(turn.answer)
+        if len(sentences) > LOCAL_FOLD_SENTENCES:
+            indices = extract_key_sentences(sentences, top_k=LOCAL_FOLD_SENTENCES)
+            answer = "".join(sentences[index] for index in indices)
+        else:
+            answer = turn.answer
+        parts.append(f"问：{turn.question} 答：{answer}")
+    return trim_to_tokens("\n".join(parts), budget)
+
+class ConversationMemory:
+    """按会话保存问答历史（原文窗口 + 滚动摘要）"""
+
+    def __init__(self):
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self.loaded = 0
+        self.folds = 0
+        self.local_folds = 0
+        self.evicted = 0
+
+    @staticmethod
+    def _key(user_id: Optional[int], session_id: str) -> str:
+        # 会话按用户隔离，猜到别人的 session_id 也读不到对方的历史
+        return f"{user_id or 0}:{session_id}"
+
+    def _evict_idle(self, now: float):
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if now - session.last_active <= config.CONVERSATION_IDLE_TTL \
+                    and len(self._sessions) <= config.CONVERSATION_MAX_SESSIONS:
+                break
+            if session.fold_task is not None:
+                session.fold_task.cancel()
+            del self._sessions[key]
+            self.evicted += 1
+
+    def _session(self, db: Session, user_id: Optional[int], session_id: str) -> ConversationSession:
+        now = time.monotonic()
+        self._evict_idle(now)
+        key = self._key(user_id, session_id)
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._load(db, user_id, session_id)
+            self._sessions[key] = session
+        self._sessions.move_to_end(key)
+        session.last_active = now
+        return session
+
+    def _load(self, db: Session, user_id: Optional[int], session_id: str) -> ConversationSession:
+        """从问答记录恢复最近几轮（不超过原文预算）"""
+        session = ConversationSession()
+        records = db.query(KnowledgeQA.question, KnowledgeQA.answer).filter(
+            KnowledgeQA.session_id == session_id,
+            KnowledgeQA.user_id == user_id
+        ).order_by(desc(KnowledgeQA.created_at), desc(KnowledgeQA.id)).limit(config.CONVERSATION_LOAD_TURNS).all()
+        budget = config.CONVERSATION_RECENT_TOKENS
+        for question, answer in records:
+            turn = Turn(question, answer, estimate_tokens(question) + estimate_tokens(answer))
+            if turn.tokens > budget:
+                break
+            session.turns.appendleft(turn)
+            budget -= turn.tokens
+        if session.turns:
+            self.loaded += 1
+        return session
+
+    async def history(self, db: Session, user_id: Optional[int], session_id: Optional[str]) -> List[Dict[str, str]]:
+        """返回作为对话历史的消息（摘要 + 最近几轮原文），新会话返回空列表"""
+        if not session_id:
+            return []
+        session = self._session(db, user_id, session_id)
+        if session.fold_task is not None and not session.fold_task.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(session.fold_task), timeout=config.CONVERSATION_FOLD_WAIT)
+            except Exception:
+                pass
+        summary = session.summary
+        unfolded = session.folding + session.pending
+        if unfolded:
+            # 折叠未及时完成：本次先用本地摘录，不影响后台的模型摘要
+            summary = local_fold(summary, unfolded, config.CONVERSATION_SUMMARY_TOKENS)
+            self.local_folds += 1
+
+        messages: List[Dict[str, str]] = []
+        if summary:
+            messages.append({"role": "system", "content": f"此前对话的摘要：\n{summary}"})
+        budget = config.CONVERSATION_RECENT_TOKENS
+        for turn in session.turns:
+            question, answer = turn.question, turn.answer
+            if turn.tokens > budget:
+                # 单轮就超出预算（如问题里粘贴了长文）时各保留结尾部分
+                question, answer = trim_to_tokens(question, budget // 2), trim_to_tokens(answer, budget // 2)
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant", "content": answer})
+        return messages
+
+    def remember(self, db: Session, user_id: Optional[int], session_id: Optional[str], question: str, answer: str):
+        """记录一轮问答；原文超出预算的较早轮次交给后台折叠"""
+        if not session_id:
+            return
+        session = self._session(db, user_id, session_id)
+        session.turns.append(Turn(question, answer, estimate_tokens(question) + estimate_tokens(answer)))
+        while len(session.turns) > 1 and session.recent_tokens > config.CONVERSATION_RECENT_TOKENS:
+            session.pending.append(session.turns.popleft())
+        if session.pending and (session.fold_task is None or session.fold_task.done()):
+            session.fold_task = asyncio.create_task(self._fold(session))
+
+    async def _fold(self, session: ConversationSession):
+        while session.pending:
+            session.folding, session.pending = session.pending, []
+            session.summary = await self._summarize(session.summary, session.folding)
+            session.folding = []
+            self.folds += 1
+
+    async def _summarize(self, summary: str, turns: List[Turn]) -> str:
+        budget = config.CONVERSATION_SUMMARY_TOKENS
+        if not llm_gateway.is_configured:
+            return local_fold(summary, turns, budget)
+        dialogue = "\n".join(f"问：{turn.question}\n答：{turn.answer}" for turn in turns)
+        try:
+            response = await llm_gateway.complete(
+                [
+                    {"role": "system", "content": FOLD_PROMPT.format(limit=budget)},
+                    {"role": "user", "content": f"已有摘要：\n{summary or '（无）'}\n\n新增问答：\n{dialogue}"}
+                ],
+                model=SUMMARY_MODEL,
+                priority=Priority.INTERACTIVE,
+                max_tokens=budget,
+                temperature=0.2,
+                timeout=config.OPENAI_TIMEOUT
+            )
+            return trim_to_tokens(response.choices[0].message.content.strip(), budget)
+        except Exception as e:
+            logger.warning(f"对话摘要生成失败，使用本地摘录: {type(e).__name__}: {e}")
+            return local_fold(summary, turns, budget)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._sessions),
+            "loaded": self.loaded,
+            "folds": self.folds,
+            "local_folds": self.local_folds,
+            "evicted": self.evicted
+        }
+
+# 全局会话记忆实例
+conversation_memory = ConversationMemory()
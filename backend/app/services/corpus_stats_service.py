@@ -0,0 +1,326 @@
+"""
+知识库语料统计（TF-IDF）
+
+knowledge_term_stats 表记录每个词项的文档频率（DF），在知识条目入库和软删除时增量更新，
+与条目本身的写入处于同一事务。条目入库时只对本文档分词，并按文档内出现的词项查询DF，
+计算本文档的TF-IDF关键词写入 ai_keywords，开销与文档长度成正比，与语料规模无关。
+
+热门词项查询使用内存中的NumPy数组快照（词项、DF、关键词权重），定期从统计表重建。
+"""
+
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.config.anti_blocking_config import config
+from app.models.database import SessionLocal, dialect_insert
+from app.models.knowledge_base import KnowledgeBase, KnowledgeContent, KnowledgeTermStat
+from app.utils.background_job import BackgroundJob
+from app.utils.text_tokenizer import tokenize
+
+logger = logging.getLogger(__name__)
+
+# 记录有效文档总数的保留行（分词结果不会产生尖括号）
+DOCUMENT_COUNT_TERM = "<documents>"
+
+# 词项列的长度上限
+MAX_TERM_LENGTH = 100
+
+# 含有这些虚字的二元组多为跨词切分的结果，计入DF但不作为关键词
+CJK_FUNCTION_CHARS = set("的了是在和与及或而也都就对把被从向于以之其这那有为")
+
+def is_keyword_candidate(term: str) -> bool:
+    return not any(char in CJK_FUNCTION_CHARS for char in term)
+
+@dataclass
+class CorpusSnapshot:
+    """统计表的只读数组快照"""
+    terms: np.ndarray
+    document_frequency: np.ndarray
+    keyword_weight: np.ndarray
+    documents: int
+    built_at: float
+
+class CorpusStatistics:
+    """语料词项统计"""
+
+    def __init__(self, keywords_top_k: int = 10, snapshot_ttl: float = 60.0):
+        self.keywords_top_k = keywords_top_k
+        self.snapshot_ttl = snapshot_ttl
+        self._snapshot: Optional[CorpusSnapshot] = None
+        self._lock = threading.Lock()
+        self.rebuild_job = BackgroundJob("语料统计重建")
+
+    @staticmethod
+    def document_terms(content: str) -> Counter:
+        """文档的词频（词项 -> 出现次数）"""
+        return Counter(term for term in tokenize(content) if len(term) <= MAX_TERM_LENGTH)
+
+    def compute_keywords(self, db: Session, term_counts: Counter, counted: bool = False) -> List[Dict[str, Any]]:
+        """按当前语料DF计算文档的TF-IDF关键词（counted=False时把本文档计入DF）"""
+        if not term_counts:
+            return []
+
+        stats = dict(
+            db.query(KnowledgeTermStat.term, KnowledgeTermStat.document_frequency)
+            .filter(KnowledgeTermStat.term.in_(list(term_counts) + [DOCUMENT_COUNT_TERM]))
+            .all()
+        )
+        own = 0 if counted else 1
+        documents = max(stats.get(DOCUMENT_COUNT_TERM, 0) + own, 1)
+        total = sum(term_counts.values())
+
+        scored = []
+        for term, count in term_counts.items():
+            if not is_keyword_candidate(term):
+                continue
+            document_frequency = max(stats.get(term, 0) + own, 1)
+            idf = math.log((1 + documents) / (1 + document_frequency)) + 1.0
+            scored.append((count / total * idf, term))
+        scored.sort(reverse=True)
+
+        return [
+            {"term": term, "weight": round(weight, 6)}
+            for weight, term in scored[:self.keywords_top_k]
+        ]
+
+    def add_document(self, db: Session, knowledge: KnowledgeBase):
+        """条目入库：计算关键词并累加DF（不提交，由调用方统一提交）"""
+        term_counts = self.document_terms(knowledge.content)
+        knowledge.ai_keywords = self.compute_keywords(db, term_counts)
+        self._apply(db, term_counts, knowledge.ai_keywords, sign=1)
+
+    def remove_document(self, db: Session, knowledge: KnowledgeBase):
+        """条目软删除：扣减DF和关键词权重（不提交）"""
+        term_counts = self.document_terms(knowledge.content)
+        self._apply(db, term_counts, knowledge.ai_keywords or [], sign=-1)
+
+    def update_document(self, db: Session, knowledge: KnowledgeBase, old_counts: Counter, new_counts: Counter):
+        """条目正文修订：只调整出现状态变化的词项的DF，并重新计算关键词（不提交）"""
+        deltas: Dict[str, List[float]] = {}
+        for term in new_counts.keys() - old_counts.keys():
+            deltas[term] = [1, 0.0]
+        for term in old_counts.keys() - new_counts.keys():
+            deltas[term] = [-1, 0.0]
+        for keyword in knowledge.ai_keywords or []:
+            deltas.setdefault(keyword["term"], [0, 0.0])[1] -= keyword["weight"]
+        if deltas:
+            self._upsert(db, [
+                {"term": term, "document_frequency": frequency, "keyword_weight": weight}
+                for term, (frequency, weight) in deltas.items()
+            ])
+
+        knowledge.ai_keywords = self.compute_keywords(db, new_counts, counted=True)
+        if knowledge.ai_keywords:
+            self._upsert(db, [
+                {"term": keyword["term"], "document_frequency": 0, "keyword_weight": keyword["weight"]}
+                for keyword in knowledge.ai_keywords
+            ])
+
+        removed = list(old_counts.keys() - new_counts.keys())
+        if removed:
+            db.query(KnowledgeTermStat).filter(
+                KnowledgeTermStat.term.in_(removed),
+                KnowledgeTermStat.document_frequency <= 0
+            ).delete(synchronize_session=False)
+        self._snapshot = None
+
+    def _apply(self, db: Session, term_counts: Counter, keywords: List[Dict[str, Any]], sign: int):
+        weights = {keyword["term"]: keyword["weight"] for keyword in keywords}
+        rows = [
+            {"term": term, "document_frequency": sign, "keyword_weight": sign * weights.get(term, 0.0)}
+            for term in term_counts
+        ]
+        rows.append({"term": DOCUMENT_COUNT_TERM, "document_frequency": sign, "keyword_weight": 0.0})
+        self._upsert(db, rows)
+
+        if sign < 0:
+            db.query(KnowledgeTermStat).filter(
+                KnowledgeTermStat.term.in_(list(term_counts)),
+                KnowledgeTermStat.document_frequency <= 0
+            ).delete(synchronize_session=False)
+        self._snapshot = None
+
+    @staticmethod
+    def _upsert(db: Session, rows: List[Dict[str, Any]]):
+        """按增量累加统计行；PostgreSQL/SQLite使用 ON CONFLICT，单条语句内完成"""
+        insert = dialect_insert(db)
+        if insert is not None:
+            table = KnowledgeTermStat.__table__
+            statement = insert(table)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.term],
+                set_={
+                    "document_frequency": table.c.document_frequency + statement.excluded.document_frequency,
+                    "keyword_weight": table.c.keyword_weight + statement.excluded.keyword_weight
+                }
+            )
+            db.execute(statement, rows)
+            return
+
+        for row in rows:
+            stat = db.get(KnowledgeTermStat, row["term"])
+            if stat is None:
+                db.add(KnowledgeTermStat(**row))
+            else:
+                stat.document_frequency += row["document_frequency"]
+                stat.keyword_weight += row["keyword_weight"]
+
+    def rebuild(self, db: Session, batch_size: int = 200) -> int:
+        """按全部有效条目重建统计表和每个条目的关键词（用于初始化或修复）
+
+        按id分批读取未压缩的搜索正文：第一遍累计DF，第二遍计算关键词并逐批写回条目，
+        最后在一个事务中替换统计表；内存占用与词表大小相关，与语料规模无关。
+        """
+        document_frequency: Counter = Counter()
+        documents = 0
+        for batch in self._iter_active_texts(db, batch_size):
+            for _, text in batch:
+                document_frequency.update(self.document_terms(text).keys())
+            documents += len(batch)
+
+        keyword_weight: Counter = Counter()
+        for batch in self._iter_active_texts(db, batch_size):
+            updates = []
+            for knowledge_id, text in batch:
+                term_counts = self.document_terms(text)
+                total = sum(term_counts.values()) or 1
+                scored = sorted(
+                    (
+                        (count / total * (math.log((1 + documents) / (1 + document_frequency[term])) + 1.0), term)
+                        for term, count in term_counts.items()
+                        if is_keyword_candidate(term)
+                    ),
+                    reverse=True
+                )[:self.keywords_top_k]
+                updates.append({
+                    "id": knowledge_id,
+                    "ai_keywords": [{"term": term, "weight": round(weight, 6)} for weight, term in scored]
+                })
+                for weight, term in scored:
+                    keyword_weight[term] += round(weight, 6)
+            db.bulk_update_mappings(KnowledgeBase, updates)
+            db.commit()
+
+        db.query(KnowledgeTermStat).delete(synchronize_session=False)
+        rows = [
+            {"term": term, "document_frequency": frequency, "keyword_weight": keyword_weight.get(term, 0.0)}
+            for term, frequency in document_frequency.items()
+        ]
+        rows.append({"term": DOCUMENT_COUNT_TERM, "document_frequency": documents, "keyword_weight": 0.0})
+        db.bulk_insert_mappings(KnowledgeTermStat, rows)
+        db.commit()
+        self._snapshot = None
+        logger.info(f"语料统计已重建：{documents} 个文档，{len(document_frequency)} 个词项")
+        return documents
+
+    @staticmethod
+    def _iter_active_texts(db: Session, batch_size: int) -> Iterator[List[Tuple[int, str]]]:
+        """按id分批产出有效条目的 (ID, 正文)"""
+        last_id = 0
+        while True:
+            batch = db.query(KnowledgeContent.knowledge_id, KnowledgeContent.search_text).join(
+                KnowledgeBase, KnowledgeBase.id == KnowledgeContent.knowledge_id
+            ).filter(
+                KnowledgeBase.is_active == True,
+                KnowledgeContent.knowledge_id > last_id
+            ).order_by(KnowledgeContent.knowledge_id).limit(batch_size).all()
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1][0]
+
+    def start_rebuild(self) -> Tuple[Dict[str, Any], bool]:
+        """在后台线程中重建统计，返回 (任务状态, 是否新启动)"""
+        return self.rebuild_job.start(lambda: asyncio.to_thread(self._rebuild_in_new_session))
+
+    def _rebuild_in_new_session(self) -> Dict[str, Any]:
+        db = SessionLocal()
+        try:
+            return {"documents": self.rebuild(db)}
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def get_snapshot(self, db: Session) -> CorpusSnapshot:
+        """获取数组快照，超过有效期或统计变更后重建"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.built_at < self.snapshot_ttl:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is not None and self._snapshot is not snapshot:
+                return self._snapshot
+            rows = db.query(
+                KnowledgeTermStat.term,
+                KnowledgeTermStat.document_frequency,
+                KnowledgeTermStat.keyword_weight
+            ).all()
+
+            documents = 0
+            terms, frequencies, weights = [], [], []
+            for term, frequency, weight in rows:
+                if term == DOCUMENT_COUNT_TERM:
+                    documents = frequency
+                    continue
+                terms.append(term)
+                frequencies.append(frequency)
+                weights.append(weight)
+
+            self._snapshot = CorpusSnapshot(
+                terms=np.array(terms, dtype=object),
+                document_frequency=np.array(frequencies, dtype=np.int64),
+                keyword_weight=np.array(weights, dtype=np.float64),
+                documents=documents,
+                built_at=time.monotonic()
+            )
+            return self._snapshot
+
+    def trending_terms(self, db: Session, limit: int = 20, min_document_frequency: int = 2) -> List[Dict[str, Any]]:
+        """语料热门词项：按作为文档关键词的累计TF-IDF权重排序"""
+        snapshot = self.get_snapshot(db)
+        if not len(snapshot.terms):
+            return []
+
+        scores = np.where(
+            snapshot.document_frequency >= min_document_frequency,
+            snapshot.keyword_weight,
+            0.0
+        )
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates])]
+
+        return [
+            {
+                "term": snapshot.terms[index],
+                "score": round(float(scores[index]), 6),
+                "document_frequency": int(snapshot.document_frequency[index])
+            }
+            for index in candidates
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "snapshot_terms": len(snapshot.terms) if snapshot else None,
+            "snapshot_documents": snapshot.documents if snapshot else None,
+            "snapshot_age": round(time.monotonic() - snapshot.built_at, 1) if snapshot else None
+        }
+
+# 全局语料统计
+corpus_stats = CorpusStatistics(
+    keywords_top_k=config.CORPUS_KEYWORDS_TOP_K,
+    snapshot_ttl=config.CORPUS_SNAPSHOT_TTL
+)
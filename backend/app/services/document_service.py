@@ -1,10 +1,15 @@
 import os
+import re
+import json
 import tempfile
-from typing import List, Dict, Any, Optional
+import zipfile
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 import PyPDF2
 import docx
+import openpyxl
 from lxml import etree
 import openai
+from pydantic import ValidationError
 from datetime import datetime
 from dotenv import load_dotenv
 import time
@@ -18,12 +23,26 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-ALLOWED_EXTENSIONS = {'txt', 'pdf', 'docx', 'doc'}
+ALLOWED_EXTENSIONS = {
+    'txt', 'pdf', 'docx', 'doc',
+    'xlsx', 'pptx', 'html', 'htm', 'md', 'markdown'
+}
+
+# 流式读取时每次读取的字节数
+STREAM_CHUNK_SIZE = 64 * 1024
 
 # 导入防阻塞配置
 from app.config.anti_blocking_config import (
     openai_circuit_breaker, config, with_timeout_and_fallback
 )
+from app.services.text_normalization_service import PAGE_BREAK
+from app.services.llm_gateway import llm_gateway
+from app.services.local_analysis_service import analyze_text_locally
+from app.services.llm_governor import Priority
+from app.models.analysis_schemas import EnterpriseInfo, ENTERPRISE_INFO_JSON_SCHEMA
+
+# 后台分析（未指定等待时长）最多等待一次排队加一次调用；请求内的分析由调用方传入剩余的请求预算
+BACKGROUND_ANALYSIS_TIMEOUT = config.OPENAI_QUEUE_TIMEOUT + config.OPENAI_TIMEOUT
 
 def allowed_file(filename: str) -> bool:
     """检查文件扩展名是否被允许"""
@@ -39,12 +58,13 @@ def extract_text_from_file(file_path: str, filename: str) -> str:
                 return file.read()
         
         elif file_extension == 'pdf':
-            text = ""
+            pages = []
             with open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
                 for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-            return text
+                    pages.append(page.extract_text() + "\n")
+            # 保留分页符，供规范化阶段识别跨页重复的页眉页脚
+            return PAGE_BREAK.join(pages)
         
         elif file_extension in ['docx', 'doc']:
             doc = docx.Document(file_path)
@@ -52,55 +72,192 @@ def extract_text_from_file(file_path: str, filename: str) -> str:
             for paragraph in doc.paragraphs:
                 text += paragraph.text + "\n"
             return text
+        
+        elif file_extension == 'xlsx':
+            return "".join(_iter_xlsx_text(file_path))
+        
+        elif file_extension == 'pptx':
+            return "".join(_iter_pptx_text(file_path))
+        
+        elif file_extension in ['html', 'htm']:
+            return "".join(_iter_html_text(file_path))
+        
+        elif file_extension in ['md', 'markdown']:
+            return "".join(_iter_markdown_text(file_path))
     
     except Exception as e:
         logger.error(f"文件读取错误: {str(e)}")
         raise Exception(f"文件读取错误: {str(e)}")
 
-# 异步OpenAI客户端
-async def get_openai_client() -> Optional[openai.AsyncOpenAI]:
-    """获取异步OpenAI客户端"""
-    api_key = os.getenv('OPENAI_API_KEY')
-    if not api_key:
+def _iter_xlsx_text(file_path: str) -> Iterator[str]:
+    """逐行读取XLSX工作簿（只读模式，不会将整个工作簿加载到内存）"""
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            yield f"【工作表：{sheet.title}】\n"
+            for row in sheet.iter_rows(values_only=True):
+                cells = [str(value).strip() for value in row if value is not None]
+                cells = [cell for cell in cells if cell]
+                if cells:
+                    yield "\t".join(cells) + "\n"
+    finally:
+        # 只读模式会保持文件句柄，必须显式关闭
+        workbook.close()
+
+# PPTX幻灯片中的DrawingML命名空间
+_DRAWINGML_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+_PPTX_SLIDE_PATTERN = re.compile(r"^ppt/slides/slide(\d+)\.xml$")
+
+def _iter_pptx_text(file_path: str) -> Iterator[str]:
+    """逐页流式解析PPTX幻灯片XML，按段落输出文本"""
+    text_tag = f"{{{_DRAWINGML_NS}}}t"
+    paragraph_tag = f"{{{_DRAWINGML_NS}}}p"
+    
+    with zipfile.ZipFile(file_path) as archive:
+        slides = []
+        for name in archive.namelist():
+            match = _PPTX_SLIDE_PATTERN.match(name)
+            if match:
+                slides.append((int(match.group(1)), name))
+        
+        for index, (_, name) in enumerate(sorted(slides)):
+            if index > 0:
+                yield PAGE_BREAK
+            with archive.open(name) as slide_xml:
+                runs = []
+                for _, element in etree.iterparse(
+                    slide_xml, events=("end",), tag=(text_tag, paragraph_tag)
+                ):
+                    if element.tag == text_tag:
+                        runs.append(element.text or "")
+                    else:
+                        line = "".join(runs).strip()
+                        if line:
+                            yield line + "\n"
+                        runs = []
+                    # 释放已处理的节点，保持内存占用恒定
+                    element.clear()
+
+class _HTMLTextCollector:
+    """lxml解析器目标：在解析过程中直接收集可见文本，不构建DOM树"""
+    
+    SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'head', 'svg'}
+    BLOCK_TAGS = {
+        'p', 'div', 'br', 'li', 'tr', 'table', 'section', 'article', 'header',
+        'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'pre', 'blockquote', 'title'
+    }
+    
+    def __init__(self):
+        self.parts: List[str] = []
+        self._skip_depth = 0
+    
+    def start(self, tag, attrib):
+        tag = str(tag).lower()
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+    
+    def end(self, tag):
+        tag = str(tag).lower()
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+    
+    def data(self, data):
+        if self._skip_depth == 0:
+            self.parts.append(data)
+    
+    def comment(self, text):
+        pass
+    
+    def close(self):
         return None
     
-    return openai.AsyncOpenAI(
-        api_key=api_key,
-        timeout=config.OPENAI_TIMEOUT,
-        max_retries=config.MAX_RETRIES
-    )
+    def drain(self) -> str:
+        """取出已收集的文本并清空缓冲"""
+        text = "".join(self.parts)
+        self.parts = []
+        return text
+
+_HTML_CHARSET_PATTERN = re.compile(rb"""<meta[^>]+charset=["']?([A-Za-z0-9_-]+)""", re.IGNORECASE)
 
-async def analyze_with_openai(text: str) -> str:
-    """使用OpenAI GPT-4o分析文档内容，简化版本便于测试"""
+def _iter_html_text(file_path: str) -> Iterator[str]:
+    """分块喂给lxml HTML解析器，边解析边输出文本"""
+    collector = _HTMLTextCollector()
     
-    # 降级响应 - 当AI不可用时的默认分析
-    async def get_fallback_analysis(text: str) -> str:
-        word_count = len(text)
-        return f"""
-公司名称：未知（文档分析中未明确提及）
+    with open(file_path, 'rb') as file:
+        chunk = file.read(STREAM_CHUNK_SIZE)
+        # 未声明编码时libxml2默认按latin-1解析，这里优先使用文档声明的编码，否则按UTF-8
+        match = _HTML_CHARSET_PATTERN.search(chunk)
+        encoding = match.group(1).decode('ascii') if match else 'utf-8'
+        parser = etree.HTMLParser(target=collector, encoding=encoding)
+        
+        while chunk:
+            parser.feed(chunk)
+            text = collector.drain()
+            if text:
+                yield text
+            chunk = file.read(STREAM_CHUNK_SIZE)
+    parser.close()
+    
+    text = collector.drain()
+    if text:
+        yield text
 
-主要业务：基于文档内容，这是一份企业相关文档，包含业务信息、培训内容或管理制度等内容。
+_MARKDOWN_INLINE_PATTERNS = [
+    (re.compile(r"!\[([^\]]*)\]\([^)]*\)"), r"\1"),     # 图片 -> 替代文本
+    (re.compile(r"\[([^\]]+)\]\([^)]*\)"), r"\1"),      # 链接 -> 链接文本
+    (re.compile(r"<[^>]+>"), ""),                         # 内嵌HTML标签
+    (re.compile(r"(\*\*|\*|~~|`)(?=\S)(.+?)(?<=\S)\1"), r"\2"),      # 强调/行内代码
+    (re.compile(r"(?<!\w)(__|_)(?=\S)(.+?)(?<=\S)\1(?!\w)"), r"\2"),  # 下划线强调（词内下划线不算，如 snake_case）
+]
+_MARKDOWN_LINE_PREFIX = re.compile(r"^\s{0,3}(#{1,6}\s+|>\s?|[-*+]\s+|\d+[.)]\s+)")
+_MARKDOWN_RULE = re.compile(r"^\s{0,3}([-*_]\s*){3,}$|^\s*\|?\s*:?-{3,}")
 
-关键特色：
-- 文档字数约 {word_count} 字符
-- 包含结构化的企业信息
-- 涉及业务流程或培训内容
+def _iter_markdown_text(file_path: str) -> Iterator[str]:
+    """逐行读取Markdown并去除标记符号"""
+    in_code_block = False
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            stripped = line.strip()
+            if stripped.startswith("```") or stripped.startswith("~~~"):
+                in_code_block = not in_code_block
+                continue
+            if in_code_block:
+                yield line
+                continue
+            if _MARKDOWN_RULE.match(line):
+                continue
+            
+            line = _MARKDOWN_LINE_PREFIX.sub("", line)
+            for pattern, replacement in _MARKDOWN_INLINE_PATTERNS:
+                line = pattern.sub(replacement, line)
+            yield line
 
-服务对象：企业内部员工或相关业务人员
+async def analyze_with_openai(
+    text: str, priority: Priority = Priority.UPLOAD, timeout: Optional[float] = None
+) -> Tuple[str, bool]:
+    """使用OpenAI GPT-4o分析文档内容，简化版本便于测试
 
-📝 注意：此分析为系统默认生成（AI服务暂时不可用）。如需完整AI分析，请稍后重试。
-"""
+    timeout 为排队和调用的总等待时长，超时后本地降级；未指定时按后台分析等待。
+    返回 (分析文本, 是否为本地降级结果)
+    """
+    
+    # 降级响应 - 当AI不可用时使用本地分析引擎
+    async def get_fallback_analysis(text: str) -> str:
+        return render_plain_analysis(analyze_text_locally(text).to_analysis_dict("local"))
 
     # 快速检查 - 如果文本过短，直接返回降级响应
     if len(text.strip()) < 20:
-        return await get_fallback_analysis(text)
+        return await get_fallback_analysis(text), True
     
     # 简化版本：直接调用OpenAI API
     try:
-        client = await get_openai_client()
-        if not client:
+        if not llm_gateway.is_configured:
             logger.warning("OpenAI客户端未配置，使用降级分析")
-            return await get_fallback_analysis(text)
+            return await get_fallback_analysis(text), True
         
         # 文本长度控制
         max_text_length = 2000
@@ -113,8 +270,9 @@ async def analyze_with_openai(text: str) -> str:
         
         # 直接调用，设置合理超时
         response = await asyncio.wait_for(
-            client.chat.completions.create(
+            llm_gateway.complete(
                 model="gpt-4o-mini",
+                priority=priority,
                 messages=[
                     {
                         "role": "system", 
@@ -135,54 +293,43 @@ async def analyze_with_openai(text: str) -> str:
                 max_tokens=800,
                 temperature=0.1
             ),
-            timeout=25.0  # 25秒超时
+            timeout=BACKGROUND_ANALYSIS_TIMEOUT if timeout is None else timeout
         )
         
         logger.info("OpenAI智能分析完成")
-        return response.choices[0].message.content
+        return response.choices[0].message.content, False
         
     except asyncio.TimeoutError:
         logger.warning("OpenAI API调用超时")
-        return await get_fallback_analysis(text) + "\n\n⚠️ API调用超时，请稍后重试"
+        return await get_fallback_analysis(text) + "\n\n⚠️ API调用超时，请稍后重试", True
         
     except openai.RateLimitError as e:
         logger.warning(f"OpenAI API限流: {e}")
-        return await get_fallback_analysis(text) + "\n\n⚠️ API调用限流，请稍后重试"
+        return await get_fallback_analysis(text) + "\n\n⚠️ API调用限流，请稍后重试", True
         
     except Exception as e:
         logger.error(f"OpenAI API调用失败: {type(e).__name__}: {e}")
-        return await get_fallback_analysis(text) + f"\n\n⚠️ 分析失败: {type(e).__name__}"
+        return await get_fallback_analysis(text) + f"\n\n⚠️ 分析失败: {type(e).__name__}", True
+
+async def analyze_with_openai_xml(
+    text: str, priority: Priority = Priority.UPLOAD, timeout: Optional[float] = None
+) -> Tuple[str, bool]:
+    """使用OpenAI分析文档并输出XML格式，带防阻塞保护
 
-async def analyze_with_openai_xml(text: str) -> str:
-    """使用OpenAI分析文档并输出XML格式，带防阻塞保护"""
+    timeout 同 analyze_with_openai。返回 (XML文本, 是否为本地降级结果)
+    """
     
-    # 降级XML响应
-    async def get_fallback_xml_analysis(text: str) -> str:
-        word_count = len(text)
-        return f"""
-<enterprise_info>
-    <basic_info>
-        <company_name>未知（文档中未明确提及）</company_name>
-        <main_business>企业文档，包含业务或培训相关内容</main_business>
-    </basic_info>
-    <key_features>
-        <feature>文档字数约 {word_count} 字符</feature>
-        <feature>包含结构化企业信息</feature>
-        <feature>涉及业务流程或培训内容</feature>
-    </key_features>
-    <target_customers>企业内部员工或业务相关人员</target_customers>
-    <analysis_note>系统默认分析（AI服务暂时不可用）</analysis_note>
-</enterprise_info>
-"""
+    # 降级XML响应（本地分析引擎）
+    async def get_fallback_xml_analysis(text: str) -> Tuple[str, bool]:
+        return render_enterprise_info_xml(analyze_text_locally(text).to_analysis_dict("local")), True
 
     # 快速检查
     if len(text.strip()) < 50:
         return await get_fallback_xml_analysis(text)
     
     # 异步XML分析函数
-    async def _openai_xml_analysis():
-        client = await get_openai_client()
-        if not client:
+    async def _openai_xml_analysis(text: str):
+        if not llm_gateway.is_configured:
             logger.warning("OpenAI客户端未配置，使用降级XML分析")
             return await get_fallback_xml_analysis(text)
         
@@ -195,8 +342,9 @@ async def analyze_with_openai_xml(text: str) -> str:
         
         logger.info("开始OpenAI XML智能分析")
         
-        response = await client.chat.completions.create(
+        response = await llm_gateway.complete(
             model="gpt-4o-mini",
+            priority=priority,
             messages=[
                 {
                     "role": "system", 
@@ -234,14 +382,14 @@ async def analyze_with_openai_xml(text: str) -> str:
         )
         
         logger.info("OpenAI XML智能分析完成")
-        return response.choices[0].message.content
+        return response.choices[0].message.content, False
     
     # 使用熔断器保护的XML分析
     try:
         return await openai_circuit_breaker.call(
             with_timeout_and_fallback,
             _openai_xml_analysis,
-            config.OPENAI_TIMEOUT,
+            BACKGROUND_ANALYSIS_TIMEOUT if timeout is None else timeout,
             get_fallback_xml_analysis,
             text
         )
@@ -249,11 +397,155 @@ async def analyze_with_openai_xml(text: str) -> str:
         logger.warning(f"OpenAI XML分析完全失败: {str(e)}")
         return await get_fallback_xml_analysis(text)
 
+def get_fallback_enterprise_info(text: str) -> EnterpriseInfo:
+    """结构化分析的降级结果（本地分析引擎）"""
+    return analyze_text_locally(text)
+
+async def analyze_with_openai_structured(
+    text: str, priority: Priority = Priority.UPLOAD, timeout: Optional[float] = None
+) -> Tuple[EnterpriseInfo, bool]:
+    """使用OpenAI结构化输出（JSON Schema）分析文档，响应经Pydantic校验
+
+    模型输出受schema约束，不再依赖提示词约定XML格式；
+    校验失败直接降级，不触发重试。timeout 同 analyze_with_openai。返回 (分析结果, 是否为本地降级结果)
+    """
+    
+    async def _fallback(text: str) -> Tuple[EnterpriseInfo, bool]:
+        return get_fallback_enterprise_info(text), True
+    
+    if len(text.strip()) < 50:
+        return get_fallback_enterprise_info(text), True
+    
+    async def _openai_structured_analysis(text: str):
+        if not llm_gateway.is_configured:
+            logger.warning("OpenAI客户端未配置，使用降级结构化分析")
+            return get_fallback_enterprise_info(text), True
+        
+        # 文本长度控制
+        max_text_length = 4000
+        if len(text) > max_text_length:
+            text_to_analyze = text[:max_text_length] + "\n\n[文档内容因长度限制已截断...]"
+        else:
+            text_to_analyze = text
+        
+        logger.info("开始OpenAI结构化智能分析")
+        
+        response = await llm_gateway.complete(
+            model="gpt-4o-mini",
+            priority=priority,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "你是专业的企业文档分析专家。请分析文档，提取企业的基本信息、主要特色、目标客户和服务内容，内容详细专业。文档未提及的信息请填null。"
+                },
+                {
+                    "role": "user",
+                    "content": f"请分析以下企业文档：\n\n{text_to_analyze}"
+                }
+            ],
+            response_format={
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "enterprise_info",
+                    "strict": True,
+                    "schema": ENTERPRISE_INFO_JSON_SCHEMA
+                }
+            },
+            max_tokens=1500,
+            temperature=0.2
+        )
+        
+        message = response.choices[0].message
+        if getattr(message, "refusal", None):
+            logger.warning(f"OpenAI拒绝结构化分析: {message.refusal}")
+            return get_fallback_enterprise_info(text), True
+        
+        try:
+            info = EnterpriseInfo.model_validate_json(message.content)
+        except ValidationError as e:
+            logger.warning(f"结构化分析结果校验失败，使用降级分析: {e}")
+            return get_fallback_enterprise_info(text), True
+        
+        logger.info("OpenAI结构化智能分析完成")
+        return info, False
+    
+    # 使用熔断器保护的结构化分析
+    try:
+        return await openai_circuit_breaker.call(
+            with_timeout_and_fallback,
+            _openai_structured_analysis,
+            BACKGROUND_ANALYSIS_TIMEOUT if timeout is None else timeout,
+            _fallback,
+            text
+        )
+    except Exception as e:
+        logger.warning(f"OpenAI结构化分析完全失败: {str(e)}")
+        return get_fallback_enterprise_info(text), True
+
+async def analyze_revision_with_openai(
+    previous: Dict[str, Any],
+    added_text: str,
+    removed_text: str,
+    priority: Priority = Priority.UPLOAD,
+    timeout: Optional[float] = None
+) -> Optional[EnterpriseInfo]:
+    """根据上一版本的结构化分析和本次修订增删的段落更新分析结果
+
+    只向模型发送变化的段落，开销与修订量成正比；失败或超过timeout时返回None，由调用方改为完整分析
+    """
+    if not llm_gateway.is_configured:
+        return None
+    
+    max_text_length = 3000
+    previous_info = {key: value for key, value in previous.items() if key != "format"}
+    sections = [f"上一版本的分析结果（JSON）：\n{json.dumps(previous_info, ensure_ascii=False)}"]
+    if removed_text.strip():
+        sections.append(f"本次修订删除或改写前的段落：\n{removed_text[:max_text_length]}")
+    if added_text.strip():
+        sections.append(f"本次修订新增或改写后的段落：\n{added_text[:max_text_length]}")
+    
+    try:
+        logger.info("开始OpenAI增量分析")
+        response = await asyncio.wait_for(
+            llm_gateway.complete(
+                model="gpt-4o-mini",
+                priority=priority,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "你是专业的企业文档分析专家。文档有了新版本，请根据修订内容更新上一版本的分析结果：保留未受影响的信息，修正或补充受修订影响的字段。文档未提及的信息请填null。"
+                    },
+                    {"role": "user", "content": "\n\n".join(sections)}
+                ],
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": {
+                        "name": "enterprise_info",
+                        "strict": True,
+                        "schema": ENTERPRISE_INFO_JSON_SCHEMA
+                    }
+                },
+                max_tokens=1500,
+                temperature=0.2
+            ),
+            timeout=BACKGROUND_ANALYSIS_TIMEOUT if timeout is None else timeout
+        )
+        message = response.choices[0].message
+        if getattr(message, "refusal", None):
+            logger.warning(f"OpenAI拒绝增量分析: {message.refusal}")
+            return None
+        info = EnterpriseInfo.model_validate_json(message.content)
+        logger.info("OpenAI增量分析完成")
+        return info
+    except Exception as e:
+        logger.warning(f"OpenAI增量分析失败，改为完整分析: {type(e).__name__}: {e}")
+        return None
+
 # 保持向后兼容的同步接口
 def analyze_with_openai_sync(text: str) -> str:
     """同步版本的OpenAI分析（向后兼容）"""
     try:
-        return asyncio.run(analyze_with_openai(text))
+        return asyncio.run(analyze_with_openai(text))[0]
     except Exception as e:
         logger.error(f"同步OpenAI分析失败: {e}")
         word_count = len(text)
@@ -274,7 +566,7 @@ def analyze_with_openai_sync(text: str) -> str:
 def analyze_with_openai_xml_sync(text: str) -> str:
     """同步版本的OpenAI XML分析（向后兼容）"""
     try:
-        return asyncio.run(analyze_with_openai_xml(text))
+        return asyncio.run(analyze_with_openai_xml(text))[0]
     except Exception as e:
         logger.error(f"同步OpenAI XML分析失败: {e}")
         return """
@@ -311,6 +603,148 @@ def generate_xml_summary(filename: str, original_text: str, ai_summary: str) ->
     
     return xml_content
 
+# <enterprise_info> 结构中的文本字段与列表字段
+ENTERPRISE_TEXT_FIELDS = [
+    "company_name", "main_business", "establishment_info",
+    "target_customers", "additional_info", "analysis_note"
+]
+ENTERPRISE_LIST_FIELDS = {"key_features": "feature", "services": "service"}
+
+# 纯文本分析结果中的字段标签
+_PLAIN_FIELD_LABELS = {
+    "公司名称": "company_name",
+    "主要业务": "main_business",
+    "关键特色": "key_features",
+    "服务对象": "target_customers",
+    "目标客户": "target_customers",
+    "主要服务": "services",
+}
+_PLAIN_FIELD_PATTERN = re.compile(
+    r"^[#\s*]*(" + "|".join(_PLAIN_FIELD_LABELS) + r")[*\s]*[:：]\s*(.*)$"
+)
+_BARE_AMPERSAND_PATTERN = re.compile(r"&(?!(?:amp|lt|gt|quot|apos|#\d+|#x[0-9a-fA-F]+);)")
+_PLAIN_LIST_ITEM_PATTERN = re.compile(r"^\s*(?:[-*•·]|\d+[.、)])\s*(.+)$")
+
+def _clean_field_text(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    value = re.sub(r"\s+", " ", value).strip().strip("*").strip()
+    return value or None
+
+def parse_enterprise_info_xml(analysis: str) -> Optional[Dict[str, Any]]:
+    """用lxml解析 <enterprise_info> 分析结果为结构化字典"""
+    start = analysis.find("<enterprise_info")
+    end = analysis.rfind("</enterprise_info>")
+    if start == -1 or end == -1:
+        return None
+    
+    fragment = analysis[start:end + len("</enterprise_info>")]
+    # 模型经常输出未转义的 &，先转义以免内容被丢弃
+    fragment = _BARE_AMPERSAND_PATTERN.sub("&amp;", fragment)
+    try:
+        # recover模式可容忍模型输出中的其他小错误（如标签未闭合）
+        root = etree.fromstring(
+            fragment.encode("utf-8"),
+            parser=etree.XMLParser(recover=True, resolve_entities=False)
+        )
+    except etree.XMLSyntaxError:
+        return None
+    if root is None:
+        return None
+    
+    info: Dict[str, Any] = {"format": "enterprise_info"}
+    for field in ENTERPRISE_TEXT_FIELDS:
+        info[field] = _clean_field_text(root.findtext(f".//{field}"))
+    for field, item_tag in ENTERPRISE_LIST_FIELDS.items():
+        items = [_clean_field_text(element.text) for element in root.iterfind(f".//{field}/{item_tag}")]
+        info[field] = [item for item in items if item]
+    return info
+
+def parse_plain_analysis(analysis: str) -> Optional[Dict[str, Any]]:
+    """解析“公司名称：…/主要业务：…”格式的纯文本分析结果"""
+    info: Dict[str, Any] = {"format": "plain"}
+    for field in ENTERPRISE_TEXT_FIELDS:
+        info[field] = None
+    for field in ENTERPRISE_LIST_FIELDS:
+        info[field] = []
+    
+    current_field = None
+    matched = False
+    for line in analysis.splitlines():
+        field_match = _PLAIN_FIELD_PATTERN.match(line)
+        if field_match:
+            matched = True
+            current_field = _PLAIN_FIELD_LABELS[field_match.group(1)]
+            value = _clean_field_text(field_match.group(2))
+            if current_field in ENTERPRISE_LIST_FIELDS:
+                if value:
+                    info[current_field].append(value)
+            else:
+                info[current_field] = value
+            continue
+        
+        if not current_field or not line.strip():
+            continue
+        item_match = _PLAIN_LIST_ITEM_PATTERN.match(line)
+        if current_field in ENTERPRISE_LIST_FIELDS:
+            if item_match:
+                info[current_field].append(_clean_field_text(item_match.group(1)))
+        elif not info[current_field]:
+            # 字段值写在下一行的情况
+            info[current_field] = _clean_field_text(line)
+    
+    return info if matched else None
+
+def parse_analysis_result(analysis: str) -> Optional[Dict[str, Any]]:
+    """将AI分析输出（XML或纯文本格式）解析为结构化字典，无法识别时返回None"""
+    if not analysis:
+        return None
+    return parse_enterprise_info_xml(analysis) or parse_plain_analysis(analysis)
+
+def render_enterprise_info_xml(info: Dict[str, Any]) -> str:
+    """由结构化分析结果生成 <enterprise_info> XML"""
+    root = etree.Element("enterprise_info")
+    basic_info = etree.SubElement(root, "basic_info")
+    for field in ["company_name", "main_business", "establishment_info"]:
+        if info.get(field):
+            etree.SubElement(basic_info, field).text = info[field]
+    
+    features = etree.SubElement(root, "key_features")
+    for feature in info.get("key_features") or []:
+        etree.SubElement(features, "feature").text = feature
+    
+    if info.get("target_customers"):
+        etree.SubElement(root, "target_customers").text = info["target_customers"]
+    
+    if info.get("services"):
+        services = etree.SubElement(root, "services")
+        for service in info["services"]:
+            etree.SubElement(services, "service").text = service
+    
+    for field in ["additional_info", "analysis_note"]:
+        if info.get(field):
+            etree.SubElement(root, field).text = info[field]
+    
+    return etree.tostring(root, encoding="unicode", pretty_print=True)
+
+def render_plain_analysis(info: Dict[str, Any]) -> str:
+    """由结构化分析结果生成“公司名称：…”格式的纯文本分析"""
+    lines = [
+        f"公司名称：{info.get('company_name') or '未知（文档中未明确提及）'}",
+        "",
+        f"主要业务：{info.get('main_business') or '未识别'}",
+        "",
+        "关键特色："
+    ]
+    lines.extend(f"- {feature}" for feature in info.get("key_features") or [])
+    if info.get("services"):
+        lines.extend(["", "主要服务："])
+        lines.extend(f"- {service}" for service in info["services"])
+    lines.extend(["", f"服务对象：{info.get('target_customers') or '未识别'}"])
+    if info.get("analysis_note"):
+        lines.extend(["", f"📝 注意：{info['analysis_note']}"])
+    return "\n".join(lines)
+
 def combine_texts_for_analysis(all_texts: List[str]) -> str:
     """合并多个文档的文本内容用于批量分析"""
     combined = "\n\n=== 文档分隔符 ===\n\n".join(all_texts)
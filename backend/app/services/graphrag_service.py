@@ -34,6 +34,9 @@ except ImportError as e:
     logging.info("GraphRAG functions will use subprocess calls to dedicated environment")
 
 from app.models.knowledge_base import KnowledgeBase
+from app.config.anti_blocking_config import config as anti_blocking_config
+from app.services.llm_governor import Priority, llm_governor
+from app.utils.token_utils import estimate_tokens
 from sqlalchemy.orm import Session
 
 logger = logging.getLogger(__name__)
@@ -41,6 +44,10 @@ logger = logging.getLogger(__name__)
 class GraphRAGService:
     """GraphRAG 服务类"""
     
+    # 单次搜索的token预估（上下文上限 + 生成上限），用于向调度器申请额度
+    GLOBAL_SEARCH_TOKENS = 12000 + 2000
+    LOCAL_SEARCH_TOKENS = 8000 + 2000
+    
     def __init__(self):
         # 获取当前文件的绝对路径，然后构建GraphRAG工作空间路径
         current_file = Path(__file__).resolve()
@@ -60,8 +67,9 @@ class GraphRAGService:
         self.model = os.getenv("GRAPHRAG_MODEL", "gpt-4o")
         self.embedding_model = os.getenv("GRAPHRAG_EMBEDDING_MODEL", "text-embedding-3-small")
         self.concurrent_requests = int(os.getenv("GRAPHRAG_CONCURRENT_REQUESTS", "25"))
-        self.tpm = int(os.getenv("GRAPHRAG_TPM", "50000"))
-        self.rpm = int(os.getenv("GRAPHRAG_RPM", "500"))
+        # GraphRAG流水线自带限流，其额度不应超过全局OpenAI调度器的额度
+        self.tpm = min(int(os.getenv("GRAPHRAG_TPM", "50000")), anti_blocking_config.OPENAI_TPM)
+        self.rpm = min(int(os.getenv("GRAPHRAG_RPM", "500")), anti_blocking_config.OPENAI_RPM)
         self.request_timeout = float(os.getenv("GRAPHRAG_REQUEST_TIMEOUT", "180.0"))
         self.max_retries = int(os.getenv("GRAPHRAG_MAX_RETRIES", "10"))
         
@@ -290,6 +298,7 @@ class GraphRAGService:
             
             # 准备输入文档
             logger.info(f"准备 {len(knowledge_items)} 个文档用于GraphRAG索引构建")
+            indexing_tokens = 0
             
             for i, item in enumerate(knowledge_items):
                 # 为每个文档创建文本文件
@@ -307,43 +316,14 @@ class GraphRAGService:
                     content_parts.append(f"AI分析: {item.ai_analysis}")
                 
                 full_content = "\n\n".join(content_parts)
+                indexing_tokens += estimate_tokens(full_content)
                 
                 with open(doc_file, 'w', encoding='utf-8') as f:
                     f.write(full_content)
             
-            logger.info("开始运行GraphRAG索引流水线...")
-            
-            # 如果GraphRAG直接可用，使用原有方法
-            if GRAPHRAG_AVAILABLE:
-                # 创建配置文件
-                config = self.create_default_config()
-                
-                # 保存配置为YAML格式
-                import yaml
-                with open(self.config_path, 'w', encoding='utf-8') as f:
-                    yaml.dump(config, f, default_flow_style=False, allow_unicode=True)
-                
-                # 运行GraphRAG索引构建
-                pipeline_config = PipelineConfig.from_dict(config)
-                
-                # 异步运行索引构建
-                await asyncio.get_event_loop().run_in_executor(
-                    None,
-                    lambda: run_pipeline_with_config(pipeline_config)
-                )
-            else:
-                # 使用subprocess调用专用虚拟环境
-                logger.info("使用专用虚拟环境运行GraphRAG索引构建...")
-                
-                result = await asyncio.get_event_loop().run_in_executor(
-                    None,
-                    lambda: self._run_graphrag_command(["index"])
-                )
-                
-                if not result["success"]:
-                    raise Exception(f"GraphRAG索引构建失败: {result.get('error', result.get('stderr', '未知错误'))}")
-                
-                logger.info("GraphRAG索引构建完成")
+            logger.info("等待OpenAI调度许可（索引构建优先级最低）...")
+            async with llm_governor.acquire(Priority.INDEXING, indexing_tokens, adaptive=False):
+                await self._run_index_pipeline()
             
             # 检查输出
             artifacts_path = self.output_path / "artifacts"
@@ -366,6 +346,43 @@ class GraphRAGService:
                 "message": "GraphRAG索引构建失败"
             }
     
+    async def _run_index_pipeline(self):
+        """运行GraphRAG索引流水线"""
+        logger.info("开始运行GraphRAG索引流水线...")
+        
+        # 如果GraphRAG直接可用，使用原有方法
+        if GRAPHRAG_AVAILABLE:
+            # 创建配置文件
+            config = self.create_default_config()
+            
+            # 保存配置为YAML格式
+            import yaml
+            with open(self.config_path, 'w', encoding='utf-8') as f:
+                yaml.dump(config, f, default_flow_style=False, allow_unicode=True)
+            
+            # 运行GraphRAG索引构建
+            pipeline_config = PipelineConfig.from_dict(config)
+            
+            # 异步运行索引构建
+            await asyncio.get_event_loop().run_in_executor(
+                None,
+                lambda: run_pipeline_with_config(pipeline_config)
+            )
+        else:
+            # 使用subprocess调用专用虚拟环境
+            logger.info("使用专用虚拟环境运行GraphRAG索引构建...")
+            
+            result = await asyncio.get_event_loop().run_in_executor(
+                None,
+                lambda: self._run_graphrag_command(["index"])
+            )
+            
+            if not result["success"]:
+                raise Exception(f"GraphRAG索引构建失败: {result.get('error', result.get('stderr', '未知错误'))}")
+            
+            logger.info("GraphRAG索引构建完成")
+        
+    
     def _init_search_engines(self):
         """初始化搜索引擎"""
         if not self.is_available():
@@ -460,10 +477,11 @@ class GraphRAGService:
         try:
             logger.info(f"执行全局搜索: {query}")
             
-            result = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self._global_search.search(query)
-            )
+            async with llm_governor.acquire(Priority.INTERACTIVE, self.GLOBAL_SEARCH_TOKENS, adaptive=False):
+                result = await asyncio.get_event_loop().run_in_executor(
+                    None,
+                    lambda: self._global_search.search(query)
+                )
             
             return {
                 "success": True,
@@ -494,10 +512,11 @@ class GraphRAGService:
         try:
             logger.info(f"执行本地搜索: {query}")
             
-            result = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self._local_search.search(query)
-            )
+            async with llm_governor.acquire(Priority.INTERACTIVE, self.LOCAL_SEARCH_TOKENS, adaptive=False):
+                result = await asyncio.get_event_loop().run_in_executor(
+                    None,
+                    lambda: self._local_search.search(query)
+                )
             
             return {
                 "success": True,
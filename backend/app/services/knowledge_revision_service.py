@@ -0,0 +1,194 @@
+"""
+知识条目修订（段落级增量再分析）
+
+用户上传自己已有条目的修订版时，在原条目上就地更新而不是新建条目：
+- 正文按段落与上一版本求差异，旧版本以反向delta压缩存入 knowledge_base_versions；
+- 只把增删的段落连同上一版本的结构化分析发给模型更新分析结果，正文未变时不调用模型，
+  变更比例超过 REVISION_FULL_ANALYSIS_RATIO 时才做完整分析；
+- 语料DF只调整出现状态变化的词项（旧版本词频由变化段落推算），标签关联只增删差集，
+  近似重复签名重算后替换。
+"""
+
+import json
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import desc
+from sqlalchemy.orm import Session
+
+from app.config.anti_blocking_config import config
+from app.models.knowledge_base import KnowledgeBase, KnowledgeBaseVersion
+from app.services.answer_cache_service import answer_cache
+from app.services.corpus_stats_service import corpus_stats
+from app.services.document_service import analyze_revision_with_openai, parse_analysis_result
+from app.services.knowledge_service import KnowledgeService
+from app.services.llm_governor import Priority
+from app.services.near_duplicate_service import Fingerprint, near_duplicates
+from app.services.preset_answer_service import preset_answers
+from app.utils.compression import compress_text, decompress_text
+from app.utils.section_diff import SectionDiff, apply_delta, diff_sections, split_sections
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class RevisionPlan:
+    knowledge: KnowledgeBase
+    new_text: str
+    diff: SectionDiff
+    from_revision: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "from_revision": self.from_revision,
+            "sections": len(self.diff.new_sections),
+            "changed_sections": self.diff.changed_sections,
+            "change_ratio": round(self.diff.change_ratio, 4)
+        }
+
+class KnowledgeRevisionService:
+    """知识条目的版本修订"""
+
+    @staticmethod
+    def prepare(knowledge: KnowledgeBase, new_text: str) -> RevisionPlan:
+        return RevisionPlan(
+            knowledge, new_text, diff_sections(knowledge.content, new_text), knowledge.revision or 1
+        )
+
+    @staticmethod
+    async def reanalyze(
+        plan: RevisionPlan,
+        priority: Priority = Priority.UPLOAD,
+        timeout: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """增量更新结构化分析；需要完整分析时返回None（timeout 同 analyze_revision_with_openai）"""
+        previous = plan.knowledge.ai_analysis
+        if not previous or previous.get("format") == "local":
+            return None
+        if plan.diff.unchanged:
+            return previous
+        if plan.diff.change_ratio > config.REVISION_FULL_ANALYSIS_RATIO:
+            return None
+
+        info = await analyze_revision_with_openai(
+            previous,
+            "".join(plan.diff.added_sections),
+            "".join(plan.diff.removed_sections),
+            priority,
+            timeout
+        )
+        return info.to_analysis_dict() if info is not None else None
+
+    @staticmethod
+    def apply(
+        db: Session,
+        plan: RevisionPlan,
+        analysis: str,
+        user_id: int,
+        ai_analysis: Optional[Dict[str, Any]] = None,
+        tags: Optional[str] = None,
+        fingerprint: Optional[Fingerprint] = None,
+        title: Optional[str] = None,
+        source_file: Optional[str] = None
+    ) -> KnowledgeBase:
+        """保存修订：旧版本写入版本表，条目正文、分析和派生索引就地更新（标题和来源文件随本次上传更新）"""
+        knowledge = plan.knowledge
+        diff = plan.diff
+        if ai_analysis is None:
+            ai_analysis = parse_analysis_result(analysis)
+        if title:
+            knowledge.title = title
+        if source_file:
+            knowledge.source_file = source_file
+        if diff.unchanged:
+            # 正文未变，不产生新版本；分析结果有变化（如原为本地初步分析）时只更新分析
+            if ai_analysis == knowledge.ai_analysis:
+                db.commit()
+                return knowledge
+            return KnowledgeService.update_knowledge_analysis(db, knowledge.id, analysis, ai_analysis)
+
+        codec, data = compress_text(json.dumps(diff.reverse_delta(), ensure_ascii=False, separators=(",", ":")))
+        db.add(KnowledgeBaseVersion(
+            knowledge_id=knowledge.id,
+            version_number=knowledge.revision or 1,
+            delta_codec=codec,
+            delta=data,
+            summary=knowledge.summary,
+            tags=knowledge.tags,
+            ai_analysis=knowledge.ai_analysis,
+            content_length=knowledge.content_length,
+            changed_sections=diff.changed_sections,
+            created_by=user_id
+        ))
+
+        # 旧版本词频 = 新版本词频 - 新增段落词频 + 删除段落词频
+        new_counts = corpus_stats.document_terms(plan.new_text)
+        old_counts = Counter(new_counts)
+        old_counts.subtract(corpus_stats.document_terms("".join(diff.added_sections)))
+        old_counts.update(corpus_stats.document_terms("".join(diff.removed_sections)))
+        corpus_stats.update_document(db, knowledge, +old_counts, new_counts)
+
+        if not tags:
+            tags = KnowledgeService._extract_tags_from_content(plan.new_text, analysis, db)
+        KnowledgeService._sync_tags(db, knowledge.id, knowledge.tags, tags)
+
+        if fingerprint is None:
+            fingerprint = near_duplicates.fingerprint(plan.new_text)
+        near_duplicates.replace(db, knowledge.id, fingerprint)
+
+        knowledge.content = plan.new_text
+        knowledge.summary = KnowledgeService._build_summary(analysis, ai_analysis)
+        knowledge.ai_analysis = ai_analysis
+        knowledge.tags = tags
+        knowledge.revision = (knowledge.revision or 1) + 1
+        db.commit()
+        db.refresh(knowledge)
+        answer_cache.invalidate(knowledge.id)
+        preset_answers.invalidate(knowledge.id)
+        logger.info(
+            f"知识条目 {knowledge.id} 更新到第 {knowledge.revision} 次修订，"
+            f"变化段落 {diff.changed_sections}/{len(diff.new_sections)}"
+        )
+        return knowledge
+
+    @staticmethod
+    def list_versions(db: Session, knowledge_id: int) -> List[KnowledgeBaseVersion]:
+        return db.query(KnowledgeBaseVersion).filter(
+            KnowledgeBaseVersion.knowledge_id == knowledge_id
+        ).order_by(desc(KnowledgeBaseVersion.version_number)).all()
+
+    @staticmethod
+    def get_version(db: Session, knowledge: KnowledgeBase, revision: int) -> Optional[Dict[str, Any]]:
+        """还原指定修订：从当前正文开始依次应用较新修订的反向delta"""
+        if revision == (knowledge.revision or 1):
+            return {
+                "revision": knowledge.revision or 1,
+                "content": knowledge.content,
+                "summary": knowledge.summary,
+                "tags": knowledge.tags,
+                "ai_analysis": knowledge.ai_analysis
+            }
+
+        versions = db.query(KnowledgeBaseVersion).filter(
+            KnowledgeBaseVersion.knowledge_id == knowledge.id,
+            KnowledgeBaseVersion.version_number >= revision
+        ).order_by(desc(KnowledgeBaseVersion.version_number)).all()
+        if not versions or versions[-1].version_number != revision:
+            return None
+
+        text = knowledge.content
+        for version in versions:
+            delta = json.loads(decompress_text(version.delta_codec, version.delta))
+            text = apply_delta(split_sections(text), delta)
+        target = versions[-1]
+        return {
+            "revision": target.version_number,
+            "content": text,
+            "summary": target.summary,
+            "tags": target.tags,
+            "ai_analysis": target.ai_analysis
+        }
+
+# 全局知识修订服务实例
+knowledge_revisions = KnowledgeRevisionService()
@@ -1,20 +1,48 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, desc
-from typing import List, Optional, Dict, Any, Union
-import openai
+from sqlalchemy.orm import Session, load_only, selectinload
+from sqlalchemy import and_, or_, func, desc, exists, case
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple, Union
+import asyncio
 import json
 import uuid
 import time
 import os
 from datetime import datetime, timedelta
 from app.config.timeout_config import OPENAI_TIMEOUT, MAX_TOKENS
+from app.config.anti_blocking_config import config
 
-from app.models.knowledge_base import KnowledgeBase, KnowledgeQA, PresetQuestion
+from app.models.database import dialect_insert
+from app.models.knowledge_base import (
+    CONTENT_PREFIX_LENGTH, KnowledgeBase, KnowledgeBaseTag, KnowledgeContent, KnowledgeQA, KnowledgeTag, PresetQuestion
+)
 from app.models.knowledge_schemas import (
     KnowledgeBaseCreate, KnowledgeBaseUpdate, KnowledgeSearchRequest,
     KnowledgeQACreate, KnowledgeQAFeedback, PresetQuestionCreate
 )
 from app.models.user import User
+from app.services.document_service import parse_analysis_result
+from app.services.llm_gateway import llm_gateway
+from app.services.llm_governor import Priority
+from app.services.tag_extraction_service import tag_dictionary
+from app.services.corpus_stats_service import corpus_stats
+from app.services.near_duplicate_service import Fingerprint, near_duplicates
+from app.services.summary_tree_service import summary_tree
+from app.services.answer_cache_service import answer_cache, context_fingerprint, normalize_question
+from app.services.preset_answer_service import preset_answers
+from app.services.conversation_memory_service import conversation_memory
+from app.utils.snippets import build_snippets, highlight_ranges, query_terms
+from app.utils.pagination import capped_count, decode_cursor, encode_cursor, keyset_filter, split_page
+from app.services.knowledge_stats_service import (
+    knowledge_stats, TOTAL_KNOWLEDGE, TOTAL_QA, ACTIVE_KNOWLEDGE
+)
+
+# 知识问答使用的模型
+QA_MODEL = "gpt-4o"
+
+# 搜索结果中需要显式请求才返回的字段
+SEARCH_OPTIONAL_FIELDS = {"ai_analysis", "ai_keywords", "content"}
+
+# capped 模式下总数统计的上限
+SEARCH_COUNT_CAP = 1000
 
 class KnowledgeService:
     
@@ -22,9 +50,11 @@ class KnowledgeService:
     def create_knowledge_item(
         db: Session, 
         knowledge_data: KnowledgeBaseCreate, 
-        user_id: int
+        user_id: int,
+        fingerprint: Optional[Fingerprint] = None,
+        version_of: Optional[KnowledgeBase] = None
     ) -> KnowledgeBase:
-        """创建知识条目"""
+        """创建知识条目；version_of 不为空时作为该条目所在版本链的新版本"""
         db_knowledge = KnowledgeBase(
             title=knowledge_data.title,
             content=knowledge_data.content,
@@ -32,9 +62,20 @@ class KnowledgeService:
             source_file=knowledge_data.source_file,
             source_type=knowledge_data.source_type,
             tags=knowledge_data.tags,
+            ai_analysis=knowledge_data.ai_analysis,
             created_by=user_id
         )
+        if version_of is not None:
+            db_knowledge.version_of_id, db_knowledge.version_number = near_duplicates.next_version(db, version_of)
         db.add(db_knowledge)
+        db.flush()
+        # 标签关联、语料统计和近似重复签名与条目在同一事务中写入
+        KnowledgeService._attach_tags(db, db_knowledge.id, knowledge_data.tags)
+        if fingerprint is None:
+            fingerprint = near_duplicates.fingerprint(knowledge_data.content)
+        near_duplicates.add(db, db_knowledge.id, fingerprint)
+        corpus_stats.add_document(db, db_knowledge)
+        knowledge_stats.increment(db, TOTAL_KNOWLEDGE)
         db.commit()
         db.refresh(db_knowledge)
         return db_knowledge
@@ -47,15 +88,21 @@ class KnowledgeService:
         analysis: str,
         source_file: str,
         user_id: int,
-        tags: Optional[str] = None
+        tags: Optional[str] = None,
+        ai_analysis: Optional[Dict[str, Any]] = None,
+        fingerprint: Optional[Fingerprint] = None,
+        version_of: Optional[KnowledgeBase] = None
     ) -> KnowledgeBase:
         """从文档分析结果创建知识条目"""
-        # 生成摘要（取分析结果的前200字符）
-        summary = analysis[:200] + "..." if len(analysis) > 200 else analysis
+        # 入库时一次性解析为结构化结果，之后的导出、列表、筛选直接读取字段
+        if ai_analysis is None:
+            ai_analysis = parse_analysis_result(analysis)
+        
+        summary = KnowledgeService._build_summary(analysis, ai_analysis)
         
         # 自动提取标签
         if not tags:
-            tags = KnowledgeService._extract_tags_from_content(content, analysis)
+            tags = KnowledgeService._extract_tags_from_content(content, analysis, db)
         
         knowledge_data = KnowledgeBaseCreate(
             title=title,
@@ -63,30 +110,153 @@ class KnowledgeService:
             summary=summary,
             source_file=source_file,
             source_type="document_analysis",
-            tags=tags
+            tags=tags,
+            ai_analysis=ai_analysis
         )
         
-        return KnowledgeService.create_knowledge_item(db, knowledge_data, user_id)
+        return KnowledgeService.create_knowledge_item(
+            db, knowledge_data, user_id, fingerprint=fingerprint, version_of=version_of
+        )
     
     @staticmethod
-    def _extract_tags_from_content(content: str, analysis: str) -> str:
-        """从内容和分析中提取标签"""
-        # 简单的关键词提取逻辑
-        keywords = []
-        
-        # 常见企业相关关键词
-        business_keywords = [
-            "管理", "团队", "项目", "战略", "营销", "销售", "财务", "人力资源",
-            "技术", "创新", "客户", "市场", "产品", "服务", "质量", "效率",
-            "培训", "绩效", "流程", "制度", "文化", "领导力", "沟通", "协作"
-        ]
-        
-        text = content + " " + analysis
-        for keyword in business_keywords:
-            if keyword in text:
-                keywords.append(keyword)
+    def update_knowledge_analysis(
+        db: Session,
+        knowledge_id: int,
+        analysis: str,
+        ai_analysis: Optional[Dict[str, Any]] = None
+    ) -> Optional[KnowledgeBase]:
+        """用新的分析结果替换知识条目的摘要和结构化分析"""
+        knowledge = db.query(KnowledgeBase).filter(KnowledgeBase.id == knowledge_id).first()
+        if not knowledge:
+            return None
+        
+        if ai_analysis is None:
+            ai_analysis = parse_analysis_result(analysis)
+        knowledge.summary = KnowledgeService._build_summary(analysis, ai_analysis)
+        knowledge.ai_analysis = ai_analysis
+        db.commit()
+        db.refresh(knowledge)
+        answer_cache.invalidate(knowledge.id)
+        preset_answers.invalidate(knowledge.id)
+        return knowledge
+    
+    @staticmethod
+    def soft_delete_knowledge(db: Session, knowledge: KnowledgeBase) -> KnowledgeBase:
+        """软删除知识条目，并从语料统计中扣除"""
+        if knowledge.is_active:
+            knowledge.is_active = False
+            KnowledgeService._release_tags(db, knowledge.id)
+            corpus_stats.remove_document(db, knowledge)
+            knowledge_stats.increment(db, TOTAL_KNOWLEDGE, -1)
+            if knowledge.view_count:
+                knowledge_stats.increment(db, ACTIVE_KNOWLEDGE, -1)
+            db.commit()
+            answer_cache.invalidate(knowledge.id)
+            preset_answers.invalidate(knowledge.id)
+        return knowledge
+    
+    @staticmethod
+    def parse_tags(tags: Optional[str]) -> List[str]:
+        """拆分逗号分隔的标签字符串（去重、保持顺序）"""
+        names: List[str] = []
+        for name in (tags or "").replace("，", ",").split(","):
+            name = name.strip()[:50]
+            if name and name not in names:
+                names.append(name)
+        return names
+    
+    @staticmethod
+    def _attach_tags(db: Session, knowledge_id: int, tags: Optional[str]) -> None:
+        """为条目建立标签关联并累加标签使用次数（不提交）"""
+        names = KnowledgeService.parse_tags(tags)
+        if not names:
+            return
         
-        return ",".join(keywords[:5])  # 最多5个标签
+        insert = dialect_insert(db)
+        if insert is not None:
+            db.execute(
+                insert(KnowledgeTag.__table__).on_conflict_do_nothing(index_elements=["name"]),
+                [{"name": name, "usage_count": 0} for name in names]
+            )
+        else:
+            existing = {name for (name,) in db.query(KnowledgeTag.name).filter(KnowledgeTag.name.in_(names))}
+            db.add_all(KnowledgeTag(name=name, usage_count=0) for name in names if name not in existing)
+            db.flush()
+        
+        tag_ids = [tag_id for (tag_id,) in db.query(KnowledgeTag.id).filter(KnowledgeTag.name.in_(names))]
+        db.add_all(KnowledgeBaseTag(knowledge_id=knowledge_id, tag_id=tag_id) for tag_id in tag_ids)
+        db.query(KnowledgeTag).filter(KnowledgeTag.id.in_(tag_ids)).update(
+            {KnowledgeTag.usage_count: KnowledgeTag.usage_count + 1},
+            synchronize_session=False
+        )
+    
+    @staticmethod
+    def _release_tags(db: Session, knowledge_id: int) -> None:
+        """条目失效时扣减其标签的使用次数（关联保留，不提交）"""
+        tag_ids = db.query(KnowledgeBaseTag.tag_id).filter(KnowledgeBaseTag.knowledge_id == knowledge_id)
+        db.query(KnowledgeTag).filter(
+            KnowledgeTag.id.in_(tag_ids.scalar_subquery()),
+            KnowledgeTag.usage_count > 0
+        ).update(
+            {KnowledgeTag.usage_count: KnowledgeTag.usage_count - 1},
+            synchronize_session=False
+        )
+    
+    @staticmethod
+    def _sync_tags(db: Session, knowledge_id: int, old_tags: Optional[str], new_tags: Optional[str]) -> None:
+        """条目标签变化时只增删差集部分的关联并调整使用次数（不提交）"""
+        old_names = KnowledgeService.parse_tags(old_tags)
+        new_names = KnowledgeService.parse_tags(new_tags)
+        removed = [name for name in old_names if name not in new_names]
+        if removed:
+            tag_ids = [tag_id for (tag_id,) in db.query(KnowledgeTag.id).filter(KnowledgeTag.name.in_(removed))]
+            db.query(KnowledgeBaseTag).filter(
+                KnowledgeBaseTag.knowledge_id == knowledge_id,
+                KnowledgeBaseTag.tag_id.in_(tag_ids)
+            ).delete(synchronize_session=False)
+            db.query(KnowledgeTag).filter(
+                KnowledgeTag.id.in_(tag_ids),
+                KnowledgeTag.usage_count > 0
+            ).update(
+                {KnowledgeTag.usage_count: KnowledgeTag.usage_count - 1},
+                synchronize_session=False
+            )
+        KnowledgeService._attach_tags(db, knowledge_id, ",".join(name for name in new_names if name not in old_names))
+    
+    @staticmethod
+    def _tag_filter(name: str):
+        """标签筛选条件：按标签名唯一索引和关联表索引查找"""
+        return exists().where(
+            KnowledgeBaseTag.knowledge_id == KnowledgeBase.id,
+            KnowledgeBaseTag.tag_id == KnowledgeTag.id,
+            KnowledgeTag.name == name
+        )
+    
+    @staticmethod
+    def get_popular_tags(db: Session, limit: int = 5) -> List[str]:
+        """按使用次数获取热门标签"""
+        return knowledge_stats.popular_tags(db, limit)
+    
+    @staticmethod
+    def get_trending_terms(db: Session, limit: int = 20, min_document_frequency: int = 2) -> List[Dict[str, Any]]:
+        """获取语料热门词项"""
+        return corpus_stats.trending_terms(db, limit=limit, min_document_frequency=min_document_frequency)
+    
+    @staticmethod
+    def _build_summary(analysis: str, ai_analysis: Optional[Dict[str, Any]]) -> str:
+        """生成摘要：优先使用结构化字段，否则取分析结果的前200字符"""
+        if ai_analysis and ai_analysis.get("main_business"):
+            company_name = ai_analysis.get("company_name") or "未知"
+            summary = f"{company_name}：{ai_analysis['main_business']}"
+        else:
+            summary = analysis.strip()
+        return summary[:200] + "..." if len(summary) > 200 else summary
+    
+    @staticmethod
+    def _extract_tags_from_content(content: str, analysis: str, db: Optional[Session] = None) -> str:
+        """从内容和分析中提取标签（词典匹配，按出现次数和位置排序）"""
+        extractor = tag_dictionary.get_extractor(db)
+        return ",".join(extractor.extract(content, analysis, limit=config.MAX_AUTO_TAGS))
     
     @staticmethod
     def get_knowledge_by_id(db: Session, knowledge_id: int) -> Optional[KnowledgeBase]:
@@ -97,8 +267,10 @@ class KnowledgeService:
         ).first()
         
         if knowledge:
-            # 增加查看次数
-            knowledge.view_count += 1
+            # 增加查看次数，首次被查看时计入活跃知识数
+            if not knowledge.view_count:
+                knowledge_stats.increment(db, ACTIVE_KNOWLEDGE)
+            knowledge.view_count = (knowledge.view_count or 0) + 1
             db.commit()
         
         return knowledge
@@ -108,16 +280,19 @@ class KnowledgeService:
         db: Session, 
         search_request: KnowledgeSearchRequest
     ) -> Dict[str, Any]:
-        """搜索知识库"""
-        query = db.query(KnowledgeBase).filter(KnowledgeBase.is_active == True)
+        """搜索知识库（只加载元数据列和请求的字段）"""
+        query = db.query(KnowledgeBase).options(
+            *KnowledgeService._search_load_options(search_request.fields)
+        ).filter(KnowledgeBase.is_active == True)
         
-        # 关键词搜索
+        # 关键词搜索（正文匹配完整正文，不只是主表中的前缀）
+        search_term = None
         if search_request.query and search_request.query.strip():
             search_term = f"%{search_request.query.strip()}%"
             query = query.filter(
                 or_(
                     KnowledgeBase.title.ilike(search_term),
-                    KnowledgeBase.content.ilike(search_term),
+                    KnowledgeBase.body.has(KnowledgeContent.search_text.ilike(search_term)),
                     KnowledgeBase.summary.ilike(search_term),
                     KnowledgeBase.tags.ilike(search_term)
                 )
@@ -126,43 +301,363 @@ class KnowledgeService:
         # 标签筛选
         if search_request.tags:
             for tag in search_request.tags:
-                query = query.filter(KnowledgeBase.tags.ilike(f"%{tag}%"))
+                if tag.strip():
+                    query = query.filter(KnowledgeService._tag_filter(tag.strip()))
         
         # 来源类型筛选
         if search_request.source_type:
             query = query.filter(KnowledgeBase.source_type == search_request.source_type)
         
-        # 按相关性和创建时间排序
-        query = query.order_by(desc(KnowledgeBase.view_count), desc(KnowledgeBase.created_at))
+        # 结构化分析字段筛选
+        if search_request.company_name:
+            query = query.filter(
+                KnowledgeBase.ai_analysis["company_name"].as_string().ilike(
+                    f"%{search_request.company_name.strip()}%"
+                )
+            )
+        
+        if search_request.service:
+            query = query.filter(
+                KnowledgeBase.ai_analysis["services"].as_string().ilike(
+                    f"%{search_request.service.strip()}%"
+                )
+            )
+        
+        # 总数在应用游标之前统计（同一次搜索的各页总数一致）
+        total, total_is_exact = None, True
+        if search_request.count == "exact":
+            total = query.count()
+        elif search_request.count == "capped":
+            total, total_is_exact = capped_count(query, SEARCH_COUNT_CAP)
+        
+        # 分页键只用不会变化的值：查看次数随浏览变化，会让条目在页间移动；id与创建顺序一致，
+        # 不需要比较时间（SQLite按文本存储时间，与绑定参数的格式不一致）。
+        # relevance 标题命中关键词的在前，其余按创建顺序；recent 只按创建顺序
+        sort_columns, sort_keys = [KnowledgeBase.id], ["id"]
+        title_match = None
+        if search_request.sort == "relevance" and search_term:
+            title_match = case((KnowledgeBase.title.ilike(search_term), 1), else_=0)
+            sort_columns, sort_keys = [title_match, KnowledgeBase.id], ["title_match", "id"]
+            query = query.add_columns(title_match.label("title_match"))
+        
+        if search_request.cursor:
+            position = decode_cursor(search_request.cursor)
+            if set(position) != set(sort_keys):
+                raise ValueError("分页游标与排序方式不匹配")
+            query = query.filter(keyset_filter(sort_columns, [position[key] for key in sort_keys]))
+        
+        query = query.order_by(*[desc(column) for column in sort_columns])
+        rows, has_more = split_page(query.limit(search_request.limit + 1).all(), search_request.limit)
+        if title_match is not None:
+            positions = [{"title_match": match, "id": item.id} for item, match in rows]
+            items = [item for item, _ in rows]
+        else:
+            positions = [{"id": item.id} for item in rows]
+            items = rows
+        
+        # 游标取自合并前的最后一条，被合并的命中不会出现在后续页中
+        next_cursor = encode_cursor(positions[-1]) if has_more else None
         
-        total = query.count()
-        items = query.limit(search_request.limit).all()
+        duplicates = {}
+        if search_request.collapse_duplicates:
+            items, duplicates = near_duplicates.collapse(db, items)
         
         return {
             "knowledge_items": items,
+            "duplicates": duplicates,
             "total": total,
-            "query": search_request.query or ""
+            "total_is_exact": total_is_exact,
+            "query": search_request.query or "",
+            "next_cursor": next_cursor,
+            "has_more": has_more
         }
     
     @staticmethod
-    def ask_question(
+    def _search_load_options(fields: Optional[List[str]]) -> list:
+        """搜索结果的列投影：默认不读取结构化分析和正文"""
+        fields = set(fields or [])
+        columns = [
+            KnowledgeBase.id, KnowledgeBase.title, KnowledgeBase.summary,
+            KnowledgeBase.source_file, KnowledgeBase.source_type, KnowledgeBase.tags,
+            KnowledgeBase.view_count, KnowledgeBase.created_at,
+            KnowledgeBase.content_prefix, KnowledgeBase.content_length,
+            KnowledgeBase.version_of_id, KnowledgeBase.version_number
+        ]
+        for name in SEARCH_OPTIONAL_FIELDS & fields:
+            if name != "content":
+                columns.append(getattr(KnowledgeBase, name))
+        options = [load_only(*columns)]
+        if "content" in fields:
+            options.append(selectinload(KnowledgeBase.body))
+        return options
+    
+    @staticmethod
+    def build_search_hits(
+        db: Session,
+        items: List[KnowledgeBase],
+        query: Optional[str],
+        fields: Optional[List[str]] = None,
+        snippet_count: int = 2,
+        snippet_length: int = 160,
+        duplicates: Optional[Dict[int, List[int]]] = None
+    ) -> List[Dict[str, Any]]:
+        """把搜索命中转换为精简结果：元数据 + 正文摘录和高亮，完整正文等按需返回"""
+        terms = query_terms(query)
+        duplicates = duplicates or {}
+        fields = SEARCH_OPTIONAL_FIELDS & set(fields or [])
+        # 正文超过前缀的命中从完整的搜索正文中取摘录（只读取本页命中的条目）
+        long_ids = [item.id for item in items if (item.content_length or 0) > CONTENT_PREFIX_LENGTH]
+        full_texts = dict(db.query(KnowledgeContent.knowledge_id, KnowledgeContent.search_text).filter(
+            KnowledgeContent.knowledge_id.in_(long_ids)
+        ).all()) if terms and long_ids else {}
+        hits = []
+        for item in items:
+            hit = {
+                "id": item.id,
+                "title": item.title,
+                "title_highlights": highlight_ranges(item.title, terms),
+                "summary": item.summary,
+                "source_file": item.source_file,
+                "source_type": item.source_type,
+                "tags": item.tags,
+                "view_count": item.view_count or 0,
+                "created_at": item.created_at,
+                "content_length": item.content_length,
+                "snippets": build_snippets(
+                    full_texts.get(item.id) or item.content_prefix or "", terms, snippet_count, snippet_length
+                ),
+                "version_number": item.version_number,
+                "duplicate_ids": duplicates.get(item.id)
+            }
+            for name in fields:
+                hit[name] = getattr(item, name)
+            hits.append(hit)
+        return hits
+    
+    @staticmethod
+    def record_qa(
+        db: Session,
+        question: str,
+        answer: str,
+        used_knowledge_ids: List[int],
+        user_id: Optional[int],
+        session_id: str,
+        is_guest: bool,
+        response_time: int
+    ) -> KnowledgeQA:
+        """写入一条问答记录并计入问答总数（会话淘汰后从这些记录恢复对话历史）"""
+        qa_record = KnowledgeQA(
+            knowledge_id=used_knowledge_ids[0] if used_knowledge_ids else None,
+            question=question,
+            answer=answer,
+            user_id=user_id,
+            session_id=session_id,
+            is_guest=is_guest,
+            response_time=response_time
+        )
+        
+        db.add(qa_record)
+        knowledge_stats.increment(db, TOTAL_QA)
+        db.commit()
+        db.refresh(qa_record)
+        return qa_record
+    
+    @staticmethod
+    async def ask_question(
         db: Session,
         question: str,
         user_id: Optional[int] = None,
         session_id: Optional[str] = None,
         is_guest: bool = False,
-        knowledge_ids: Optional[List[int]] = None
+        knowledge_ids: Optional[List[int]] = None,
+        mode: str = "search"
     ) -> Dict[str, Any]:
-        """基于知识库回答问题"""
+        """基于知识库回答问题（同一会话中的问题带上之前的问答）"""
         start_time = time.time()
+        session_id = session_id or str(uuid.uuid4())
+        history = await conversation_memory.history(db, user_id, session_id)
+        
+        # 预设问题直接使用后台预先生成的答案（会话中的追问除外）
+        preset = preset_answers.lookup(question) \
+            if not knowledge_ids and mode == "search" and not history else None
+        cached = None
+        if preset is not None:
+            answer = preset.answer
+            used_knowledge_ids = preset.knowledge_ids
+            context_count = len(used_knowledge_ids)
+        else:
+            context_items, used_knowledge_ids, mode = KnowledgeService.build_qa_context(
+                db, question, knowledge_ids, mode
+            )
+            context = "\n\n=== 分隔符 ===\n\n".join(context_items)
+            context_count = len(context_items)
+            
+            # 上下文未变时直接使用缓存的答案，否则使用OpenAI生成回答；
+            # 会话中的追问依赖之前的问答，不读写答案缓存
+            fingerprint = KnowledgeService.qa_context_fingerprint(db, used_knowledge_ids, context)
+            cached = answer_cache.get(question, fingerprint) if not history else None
+            if cached is not None:
+                answer = cached.answer
+            else:
+                try:
+                    answer = await KnowledgeService._generate_answer_with_openai(
+                        question, context, context_count, history=history, timeout=config.REQUEST_LLM_BUDGET
+                    )
+                    if not history:
+                        answer_cache.put(question, fingerprint, answer, used_knowledge_ids)
+                except Exception as e:
+                    answer = f"抱歉，我暂时无法回答这个问题。错误信息：{str(e)}"
+        
+        conversation_memory.remember(db, user_id, session_id, question, answer)
+        
+        # 记录问答
+        response_time = int((time.time() - start_time) * 1000)
+        
+        qa_record = KnowledgeService.record_qa(
+            db, question, answer, used_knowledge_ids, user_id, session_id, is_guest, response_time
+        )
+        
+        return {
+            "qa_id": qa_record.id,
+            "session_id": session_id,
+            "question": question,
+            "answer": answer,
+            "related_knowledge": used_knowledge_ids,
+            "response_time": response_time,
+            "context_count": context_count,
+            "mode": mode,
+            "cached": cached is not None or preset is not None,
+            "preset_question_id": preset.preset_question_id if preset is not None else None
+        }
+    
+    @staticmethod
+    async def ask_questions_bulk(
+        db: Session,
+        questions: List[str],
+        user_id: Optional[int] = None,
+        knowledge_ids: Optional[List[int]] = None,
+        mode: str = "search",
+        concurrency: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """批量问答：按完成顺序逐条产出结果，最后产出汇总，问答记录在一个事务中批量写入
+        
+        归一化后相同的问题只回答一次；指定上下文文档时所有问题共用一次构建的上下文；
+        预设答案和答案缓存照常命中，其余问题以 BATCH 优先级并发生成，并发数受 concurrency 限制。
+        """
+        start_time = time.time()
+        session_id = str(uuid.uuid4())
+        semaphore = asyncio.Semaphore(concurrency or config.BULK_QA_CONCURRENCY)
+        
+        groups: Dict[str, List[int]] = {}
+        for index, question in enumerate(questions):
+            groups.setdefault(normalize_question(question), []).append(index)
+        
+        shared = None
+        if knowledge_ids:
+            context_items, used_knowledge_ids, _ = KnowledgeService.build_qa_context(db, questions[0], knowledge_ids, mode)
+            # 指定的文档都无效时退回每个问题各自检索
+            if used_knowledge_ids and set(used_knowledge_ids) <= set(knowledge_ids):
+                context = "\n\n=== 分隔符 ===\n\n".join(context_items)
+                fingerprint = KnowledgeService.qa_context_fingerprint(db, used_knowledge_ids, context)
+                shared = (context, len(context_items), used_knowledge_ids, fingerprint)
+        
+        async def answer_group(indices: List[int]) -> Tuple[List[int], Dict[str, Any]]:
+            question = questions[indices[0]]
+            item_started = time.time()
+            result: Dict[str, Any] = {"related_knowledge": [], "cached": False}
+            try:
+                preset = preset_answers.lookup(question) if not knowledge_ids and mode == "search" else None
+                if preset is not None:
+                    result.update(answer=preset.answer, related_knowledge=preset.knowledge_ids, cached=True)
+                    return indices, result
+                
+                if shared is not None:
+                    context, context_count, used_knowledge_ids, fingerprint = shared
+                else:
+                    context_items, used_knowledge_ids, _ = KnowledgeService.build_qa_context(db, question, knowledge_ids, mode)
+                    context = "\n\n=== 分隔符 ===\n\n".join(context_items)
+                    context_count = len(context_items)
+                    fingerprint = KnowledgeService.qa_context_fingerprint(db, used_knowledge_ids, context)
+                result["related_knowledge"] = used_knowledge_ids
+                
+                cached = answer_cache.get(question, fingerprint)
+                if cached is not None:
+                    result.update(answer=cached.answer, cached=True)
+                    return indices, result
+                
+                async with semaphore:
+                    answer = await KnowledgeService._generate_answer_with_openai(
+                        question, context, context_count, priority=Priority.BATCH
+                    )
+                answer_cache.put(question, fingerprint, answer, used_knowledge_ids)
+                result["answer"] = answer
+            except Exception as e:
+                result["error"] = str(e)
+            finally:
+                result["response_time"] = int((time.time() - item_started) * 1000)
+            return indices, result
+        
+        tasks = [asyncio.create_task(answer_group(indices)) for indices in groups.values()]
+        records = []
+        answered = failed = cached_count = 0
+        try:
+            for finished in asyncio.as_completed(tasks):
+                indices, result = await finished
+                for index in indices:
+                    if "error" in result:
+                        failed += 1
+                    else:
+                        answered += 1
+                        cached_count += result["cached"]
+                        # 问答记录需要关联知识条目，没有检索到上下文的问题只返回结果不记录
+                        if result["related_knowledge"]:
+                            records.append(KnowledgeQA(
+                                knowledge_id=result["related_knowledge"][0],
+                                question=questions[index],
+                                answer=result["answer"],
+                                user_id=user_id,
+                                session_id=session_id,
+                                is_guest=False,
+                                response_time=result["response_time"]
+                            ))
+                    yield {"type": "result", "index": index, "question": questions[index], **result}
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        if records:
+            db.add_all(records)
+            knowledge_stats.increment(db, TOTAL_QA, len(records))
+            db.commit()
         
-        # 构建上下文
+        yield {
+            "type": "summary",
+            "session_id": session_id,
+            "total": len(questions),
+            "unique": len(groups),
+            "answered": answered,
+            "cached": cached_count,
+            "failed": failed,
+            "recorded": len(records),
+            "elapsed": round(time.time() - start_time, 3)
+        }
+    
+    @staticmethod
+    def build_qa_context(
+        db: Session,
+        question: str,
+        knowledge_ids: Optional[List[int]] = None,
+        mode: str = "search"
+    ) -> Tuple[List[str], List[int], str]:
+        """构建问答上下文，返回 (上下文片段, 使用的知识ID, 实际使用的模式)"""
         context_items = []
         used_knowledge_ids = []
         
         if knowledge_ids and len(knowledge_ids) > 0:
             # 使用指定的知识文档作为上下文
-            specified_knowledge = db.query(KnowledgeBase).filter(
+            specified_knowledge = db.query(KnowledgeBase).options(
+                selectinload(KnowledgeBase.body)
+            ).filter(
                 KnowledgeBase.id.in_(knowledge_ids),
                 KnowledgeBase.is_active == True
             ).all()
@@ -175,62 +670,57 @@ class KnowledgeService:
                 # 如果指定的文档都无效，则进行搜索
                 search_request = KnowledgeSearchRequest(
                     query=question,
-                    limit=3
+                    limit=3,
+                    count="none"
                 )
                 search_result = KnowledgeService.search_knowledge(db, search_request)
                 
                 for item in search_result["knowledge_items"]:
-                    context_items.append(f"文档标题: {item.title}\n文档内容: {item.content[:800]}...")
+                    context_items.append(f"文档标题: {item.title}\n文档内容: {item.content_head(800)}...")
                     used_knowledge_ids.append(item.id)
         else:
-            # 搜索相关知识
-            search_request = KnowledgeSearchRequest(
-                query=question,
-                limit=5
-            )
-            search_result = KnowledgeService.search_knowledge(db, search_request)
-            
-            for item in search_result["knowledge_items"]:
-                context_items.append(f"文档标题: {item.title}\n文档内容: {item.content[:800]}...")
-                used_knowledge_ids.append(item.id)
-        
-        context = "\n\n=== 分隔符 ===\n\n".join(context_items)
-        
-        # 使用OpenAI生成回答
-        try:
-            answer = KnowledgeService._generate_answer_with_openai(question, context, len(context_items))
-        except Exception as e:
-            answer = f"抱歉，我暂时无法回答这个问题。错误信息：{str(e)}"
-        
-        # 记录问答
-        response_time = int((time.time() - start_time) * 1000)
-        
-        qa_record = KnowledgeQA(
-            knowledge_id=used_knowledge_ids[0] if used_knowledge_ids else None,
-            question=question,
-            answer=answer,
-            user_id=user_id,
-            session_id=session_id or str(uuid.uuid4()),
-            is_guest=is_guest,
-            response_time=response_time
-        )
-        
-        db.add(qa_record)
-        db.commit()
-        db.refresh(qa_record)
+            if mode == "tree":
+                # 遍历层次摘要树，摘要树尚未构建时退回检索
+                context_items, used_knowledge_ids = summary_tree.build_context(db, question)
+                if not context_items:
+                    mode = "search"
+
+            if mode == "search":
+                # 搜索相关知识
+                search_request = KnowledgeSearchRequest(
+                    query=question,
+                    limit=5,
+                    count="none"
+                )
+                search_result = KnowledgeService.search_knowledge(db, search_request)
+                
+                for item in search_result["knowledge_items"]:
+                    context_items.append(f"文档标题: {item.title}\n文档内容: {item.content_head(800)}...")
+                    used_knowledge_ids.append(item.id)
         
-        return {
-            "qa_id": qa_record.id,
-            "question": question,
-            "answer": answer,
-            "related_knowledge": used_knowledge_ids,
-            "response_time": response_time,
-            "context_count": len(context_items)
-        }
+        return context_items, used_knowledge_ids, mode
     
     @staticmethod
-    def _generate_answer_with_openai(question: str, context: str, context_count: int = 1) -> str:
-        """使用OpenAI生成回答"""
+    def qa_context_versions(db: Session, knowledge_ids: List[int]) -> List[Tuple[int, int]]:
+        """上下文文档的 (ID, 修订号)，保持上下文中的顺序"""
+        versions = dict(db.query(KnowledgeBase.id, KnowledgeBase.revision).filter(
+            KnowledgeBase.id.in_(knowledge_ids)
+        ).all()) if knowledge_ids else {}
+        return [(knowledge_id, versions.get(knowledge_id, 0)) for knowledge_id in knowledge_ids]
+    
+    @staticmethod
+    def qa_context_fingerprint(db: Session, knowledge_ids: List[int], context: str) -> str:
+        """问答上下文指纹（答案缓存键的一部分）：上下文文档的ID和修订号 + 上下文文本"""
+        return context_fingerprint(KnowledgeService.qa_context_versions(db, knowledge_ids), context)
+    
+    @staticmethod
+    def _build_qa_messages(
+        question: str,
+        context: str,
+        context_count: int = 1,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> List[Dict[str, str]]:
+        """构建问答的prompt消息（history 为同一会话之前的问答）"""
         if context_count > 1:
             system_prompt = f"""你是一个企业知识库助手。基于提供的{context_count}个相关文档内容回答用户问题。
 
@@ -258,90 +748,67 @@ class KnowledgeService:
 
 请基于上述知识库内容回答用户问题。"""
 
+        return [
+            {"role": "system", "content": system_prompt},
+            *(history or []),
+            {"role": "user", "content": user_prompt}
+        ]
+    
+    @staticmethod
+    async def _generate_answer_with_openai(
+        question: str,
+        context: str,
+        context_count: int = 1,
+        priority: Priority = Priority.INTERACTIVE,
+        history: Optional[List[Dict[str, str]]] = None,
+        timeout: Optional[float] = None
+    ) -> str:
+        """使用OpenAI生成回答（相同的进行中请求会被合并；只有交互请求会对冲）
+
+        timeout 为排队和调用的总等待时长，请求内的问答用它在中间件超时之前返回
+        """
+        messages = KnowledgeService._build_qa_messages(question, context, context_count, history)
+        
         try:
-            # 获取API密钥
-            api_key = os.getenv('OPENAI_API_KEY')
-            if not api_key:
-                raise Exception("请设置 OPENAI_API_KEY 环境变量")
-            
-            # 创建OpenAI客户端
-            client = openai.OpenAI(
-                api_key=api_key,
-                timeout=OPENAI_TIMEOUT
-            )
-            
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=MAX_TOKENS,
-                temperature=0.3
+            response = await asyncio.wait_for(
+                llm_gateway.complete(
+                    messages,
+                    model=QA_MODEL,
+                    priority=priority,
+                    hedge=priority == Priority.INTERACTIVE,
+                    max_tokens=MAX_TOKENS,
+                    temperature=0.3,
+                    timeout=OPENAI_TIMEOUT
+                ),
+                timeout=timeout
             )
             return response.choices[0].message.content.strip()
+        except asyncio.TimeoutError:
+            raise Exception(f"OpenAI API调用超时（{timeout}秒）")
         except Exception as e:
             raise Exception(f"OpenAI API调用失败: {str(e)}")
     
     @staticmethod
-    def ask_question_stream(question: str, context: str, context_count: int = 1):
-        """使用OpenAI进行流式问答"""
-        if context_count > 1:
-            system_prompt = f"""你是一个企业知识库助手。基于提供的{context_count}个相关文档内容回答用户问题。
-
-规则：
-1. 综合分析多个文档的信息，给出全面准确的回答
-2. 如果多个文档有相关信息，请整合这些信息
-3. 如果文档间有冲突信息，请指出并分别说明
-4. 回答要条理清晰、重点突出
-5. 使用中文回答
-6. 在回答中可以适当注明信息来源（如"根据第一个文档"、"另一份资料显示"等）"""
-        else:
-            system_prompt = """你是一个企业知识库助手。基于提供的知识库内容回答用户问题。
-
-规则：
-1. 优先使用知识库中的信息回答
-2. 如果知识库中没有相关信息，诚实地说明
-3. 回答要简洁、准确、有帮助
-4. 使用中文回答
-5. 可以适当引用知识库中的具体内容"""
-
-        user_prompt = f"""知识库内容：
-{context}
-
-用户问题：{question}
-
-请基于上述知识库内容回答用户问题。"""
-
+    async def ask_question_stream(
+        question: str,
+        context: str,
+        context_count: int = 1,
+        history: Optional[List[Dict[str, str]]] = None
+    ):
+        """使用OpenAI进行流式问答（相同问题的并发订阅者共享一个上游流）"""
+        messages = KnowledgeService._build_qa_messages(question, context, context_count, history)
+        
         try:
-            # 获取API密钥
-            api_key = os.getenv('OPENAI_API_KEY')
-            if not api_key:
-                raise Exception("请设置 OPENAI_API_KEY 环境变量")
-            
-            # 创建OpenAI客户端
-            client = openai.OpenAI(
-                api_key=api_key,
-                timeout=OPENAI_TIMEOUT
-            )
-            
-            # 流式调用OpenAI API
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
+            async for content in llm_gateway.stream(
+                messages,
+                model=QA_MODEL,
+                priority=Priority.INTERACTIVE,
+                hedge=True,
                 max_tokens=MAX_TOKENS,
                 temperature=0.3,
-                stream=True  # 启用流式输出
-            )
-            
-            # 生成流式响应
-            for chunk in response:
-                if chunk.choices[0].delta.content is not None:
-                    yield chunk.choices[0].delta.content
-                    
+                timeout=OPENAI_TIMEOUT
+            ):
+                yield content
         except Exception as e:
             raise Exception(f"OpenAI API流式调用失败: {str(e)}")
     
@@ -396,58 +863,18 @@ class KnowledgeService:
     
     @staticmethod
     def get_knowledge_stats(db: Session) -> Dict[str, Any]:
-        """获取知识库统计信息"""
-        total_knowledge = db.query(KnowledgeBase).filter(
-            KnowledgeBase.is_active == True
-        ).count()
-        
-        total_qa = db.query(KnowledgeQA).count()
-        
-        active_knowledge = db.query(KnowledgeBase).filter(
-            KnowledgeBase.is_active == True,
-            KnowledgeBase.view_count > 0
-        ).count()
-        
-        # 获取热门标签
-        popular_tags = []
-        knowledge_items = db.query(KnowledgeBase.tags).filter(
-            KnowledgeBase.is_active == True,
-            KnowledgeBase.tags.isnot(None)
-        ).all()
-        
-        tag_count = {}
-        for item in knowledge_items:
-            if item.tags:
-                for tag in item.tags.split(','):
-                    tag = tag.strip()
-                    if tag:
-                        tag_count[tag] = tag_count.get(tag, 0) + 1
-        
-        popular_tags = sorted(tag_count.items(), key=lambda x: x[1], reverse=True)[:5]
-        popular_tags = [tag[0] for tag in popular_tags]
-        
-        # 获取最近问题
-        recent_questions = db.query(KnowledgeQA.question).order_by(
-            desc(KnowledgeQA.created_at)
-        ).limit(5).all()
-        recent_questions = [q.question for q in recent_questions]
-        
-        return {
-            "total_knowledge": total_knowledge,
-            "total_qa": total_qa,
-            "active_knowledge": active_knowledge,
-            "popular_tags": popular_tags,
-            "recent_questions": recent_questions
-        }
+        """获取知识库统计信息（写入时维护的计数器 + 短TTL缓存）"""
+        return knowledge_stats.get_stats(db)
     
     @staticmethod
     def get_user_qa_history(
         db: Session,
         user_id: Optional[int] = None,
         session_id: Optional[str] = None,
-        limit: int = 20
-    ) -> List[KnowledgeQA]:
-        """获取用户问答历史"""
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[KnowledgeQA], Optional[str]]:
+        """获取用户问答历史（按时间倒序的键集分页），返回 (本页记录, 下一页游标)"""
         query = db.query(KnowledgeQA)
         
         if user_id:
@@ -455,9 +882,19 @@ class KnowledgeService:
         elif session_id:
             query = query.filter(KnowledgeQA.session_id == session_id)
         else:
-            return []
-        
-        return query.order_by(desc(KnowledgeQA.created_at)).limit(limit).all()
+            return [], None
+        
+        # id与记录时间顺序一致且不会变化，分页只按id
+        if cursor:
+            position = decode_cursor(cursor)
+            if set(position) != {"id"}:
+                raise ValueError("无效的分页游标")
+            query = query.filter(KnowledgeQA.id < position["id"])
+        
+        rows = query.order_by(desc(KnowledgeQA.id)).limit(limit + 1).all()
+        records, has_more = split_page(rows, limit)
+        next_cursor = encode_cursor({"id": records[-1].id}) if has_more else None
+        return records, next_cursor
     
     @staticmethod
     def init_preset_questions(db: Session) -> None:
@@ -0,0 +1,135 @@
+"""
+知识库统计计数器
+
+总数类统计（有效知识数、问答数、被查看过的知识数）保存在 knowledge_stats_counters 表中，
+在写入知识条目、软删除、首次查看、记录问答时与业务数据在同一事务中增减；
+后台任务定期用 COUNT 重新校准，修正异常路径造成的偏差。
+/api/knowledge/stats 的完整结果在进程内缓存若干秒，缓存未命中时也只需读取计数器行
+和两个走索引的 LIMIT 查询，耗时与语料规模无关。
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import desc, func
+from sqlalchemy.orm import Session
+
+from app.config.anti_blocking_config import config
+from app.models.database import dialect_insert
+from app.models.knowledge_base import KnowledgeBase, KnowledgeQA, KnowledgeStatCounter, KnowledgeTag
+
+logger = logging.getLogger(__name__)
+
+# 计数器名称
+TOTAL_KNOWLEDGE = "total_knowledge"
+TOTAL_QA = "total_qa"
+ACTIVE_KNOWLEDGE = "active_knowledge"
+
+COUNTER_NAMES = (TOTAL_KNOWLEDGE, TOTAL_QA, ACTIVE_KNOWLEDGE)
+
+class KnowledgeStatsService:
+    """知识库统计：写入时维护计数器，读取时走短TTL缓存"""
+
+    def __init__(self, cache_ttl: float = 10.0):
+        self.cache_ttl = cache_ttl
+        self._cache: Optional[Dict[str, Any]] = None
+        self._cached_at = 0.0
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.last_reconciled_at: Optional[float] = None
+        self.last_drift: Dict[str, int] = {}
+
+    def increment(self, db: Session, name: str, delta: int = 1):
+        """在当前事务中调整计数器（不提交）"""
+        insert = dialect_insert(db)
+        if insert is not None:
+            table = KnowledgeStatCounter.__table__
+            statement = insert(table).values(name=name, value=delta)
+            db.execute(statement.on_conflict_do_update(
+                index_elements=[table.c.name],
+                set_={"value": table.c.value + statement.excluded.value, "updated_at": func.now()}
+            ))
+            return
+
+        counter = db.get(KnowledgeStatCounter, name)
+        if counter is None:
+            db.add(KnowledgeStatCounter(name=name, value=delta))
+        else:
+            counter.value += delta
+
+    def get_counters(self, db: Session) -> Dict[str, int]:
+        values = dict(db.query(KnowledgeStatCounter.name, KnowledgeStatCounter.value).all())
+        return {name: max(int(values.get(name, 0)), 0) for name in COUNTER_NAMES}
+
+    @staticmethod
+    def popular_tags(db: Session, limit: int = 5) -> List[str]:
+        """按使用次数获取热门标签（走 usage_count 索引）"""
+        rows = db.query(KnowledgeTag.name).filter(
+            KnowledgeTag.usage_count > 0
+        ).order_by(desc(KnowledgeTag.usage_count), KnowledgeTag.id).limit(limit).all()
+        return [name for (name,) in rows]
+
+    def get_stats(self, db: Session) -> Dict[str, Any]:
+        """获取知识库统计（带缓存）"""
+        cached = self._cache
+        if cached is not None and time.monotonic() - self._cached_at < self.cache_ttl:
+            self.cache_hits += 1
+            return cached
+
+        with self._lock:
+            if self._cache is not cached and self._cache is not None:
+                self.cache_hits += 1
+                return self._cache
+            self.cache_misses += 1
+
+            stats: Dict[str, Any] = self.get_counters(db)
+            stats["popular_tags"] = self.popular_tags(db, limit=5)
+            stats["recent_questions"] = [
+                question for (question,) in db.query(KnowledgeQA.question)
+                .order_by(desc(KnowledgeQA.created_at))
+                .limit(5)
+            ]
+
+            self._cache = stats
+            self._cached_at = time.monotonic()
+            return stats
+
+    def reconcile(self, db: Session) -> Dict[str, int]:
+        """用COUNT重新计算计数器并写回，返回各计数器的偏差"""
+        actual = {
+            TOTAL_KNOWLEDGE: db.query(KnowledgeBase).filter(KnowledgeBase.is_active == True).count(),
+            TOTAL_QA: db.query(KnowledgeQA).count(),
+            ACTIVE_KNOWLEDGE: db.query(KnowledgeBase).filter(
+                KnowledgeBase.is_active == True,
+                KnowledgeBase.view_count > 0
+            ).count()
+        }
+        current = dict(db.query(KnowledgeStatCounter.name, KnowledgeStatCounter.value).all())
+
+        drift = {}
+        for name, value in actual.items():
+            drift[name] = value - int(current.get(name, 0))
+            if drift[name]:
+                self.increment(db, name, drift[name])
+        db.commit()
+
+        if any(drift.values()):
+            logger.warning(f"知识库统计计数器已校准，偏差: {drift}")
+        self.last_reconciled_at = time.time()
+        self.last_drift = drift
+        self._cache = None
+        return drift
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        return {
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "last_reconciled_at": self.last_reconciled_at,
+            "last_drift": self.last_drift
+        }
+
+# 全局知识库统计
+knowledge_stats = KnowledgeStatsService(cache_ttl=config.KNOWLEDGE_STATS_CACHE_TTL)
@@ -0,0 +1,416 @@
+"""
+LLM网关
+
+统一持有长生命周期的OpenAI客户端（共享httpx连接池，启用keep-alive，可用时启用HTTP/2），
+在FastAPI lifespan中创建和关闭。所有服务通过 complete()/stream() 调用LLM：
+- 相同的进行中请求合并（llm_singleflight）
+- 按优先级和速率限制放行（llm_governor）
+- 可选的请求对冲：超过近期延迟分位数仍未响应时补发一次，取先完成者
+- 记录每次调用的模型、延迟和token用量
+"""
+
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+import httpx
+import openai
+
+from app.config.anti_blocking_config import config
+from app.services.llm_governor import Priority, llm_governor
+from app.services.llm_singleflight import llm_singleflight, make_request_key
+from app.utils.token_utils import estimate_messages_tokens, estimate_tokens
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+T = TypeVar("T")
+
+# 可重试的上游错误：限流、连接失败、服务端错误
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+class _ModelStats:
+    """单个模型的调用统计"""
+
+    def __init__(self, window: int = 256):
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        # 非流式调用的完整响应延迟 / 流式调用的首token延迟
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.first_token_latencies: Deque[float] = deque(maxlen=window)
+
+    def record(self, latency: float, prompt_tokens: int, completion_tokens: int, streamed: bool = False):
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        (self.first_token_latencies if streamed else self.latencies).append(latency)
+
+    @staticmethod
+    def percentile(samples: Deque[float], q: float) -> Optional[float]:
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def to_dict(self) -> Dict[str, Any]:
+        def _rounded(value: Optional[float]) -> Optional[float]:
+            return round(value, 3) if value is not None else None
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency_p50": _rounded(self.percentile(self.latencies, 0.5)),
+            "latency_p95": _rounded(self.percentile(self.latencies, 0.95)),
+            "first_token_p50": _rounded(self.percentile(self.first_token_latencies, 0.5)),
+            "first_token_p95": _rounded(self.percentile(self.first_token_latencies, 0.95))
+        }
+
+class _HedgeStats:
+    """对冲请求统计"""
+
+    def __init__(self):
+        self.eligible = 0          # 开启对冲的调用次数
+        self.sent = 0              # 实际发出的对冲请求数
+        self.hedge_wins = 0        # 对冲请求先完成的次数
+        self.primary_wins = 0      # 发出对冲后原请求仍先完成的次数
+        self.budget_exhausted = 0  # 因预算不足未能对冲的次数
+
+    def budget_available(self) -> bool:
+        return self.sent < max(1.0, self.eligible * config.LLM_HEDGE_BUDGET)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "eligible": self.eligible,
+            "sent": self.sent,
+            "hedge_wins": self.hedge_wins,
+            "primary_wins": self.primary_wins,
+            "budget_exhausted": self.budget_exhausted,
+            "win_rate": round(self.hedge_wins / self.sent, 3) if self.sent else None
+        }
+
+class LLMGateway:
+    """OpenAI调用的统一入口"""
+
+    def __init__(self):
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._client: Optional[openai.AsyncOpenAI] = None
+        self._models: Dict[str, _ModelStats] = {}
+        self.retries = 0
+        self.hedging = _HedgeStats()
+
+    @property
+    def is_configured(self) -> bool:
+        return bool(os.getenv("OPENAI_API_KEY"))
+
+    async def startup(self):
+        """创建共享连接池和OpenAI客户端"""
+        if self._client is not None or not self.is_configured:
+            if not self.is_configured:
+                logger.warning("未设置 OPENAI_API_KEY，LLM网关未启动")
+            return
+
+        self._http_client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=config.MAX_CONNECTIONS,
+                max_keepalive_connections=config.MAX_CONNECTIONS,
+                keepalive_expiry=config.KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(config.OPENAI_TIMEOUT, connect=config.CONNECTION_TIMEOUT)
+        )
+        # 重试由网关负责：每次重试都重新向调度器申请许可，429能及时反馈给调度器
+        self._client = openai.AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_API_BASE") or None,
+            organization=os.getenv("OPENAI_ORGANIZATION") or None,
+            http_client=self._http_client,
+            max_retries=0
+        )
+        logger.info(f"LLM网关已启动（HTTP/2: {'开启' if HTTP2_AVAILABLE else '关闭'}）")
+
+    async def shutdown(self):
+        """关闭OpenAI客户端和连接池"""
+        if self._client is not None:
+            await self._client.close()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        self._client = None
+        self._http_client = None
+
+    async def _get_client(self) -> openai.AsyncOpenAI:
+        if self._client is None:
+            # 未经lifespan启动（如脚本中直接调用）时按需创建
+            await self.startup()
+        if self._client is None:
+            raise Exception("请设置 OPENAI_API_KEY 环境变量")
+        return self._client
+
+    def _model_stats(self, model: str) -> _ModelStats:
+        if model not in self._models:
+            self._models[model] = _ModelStats()
+        return self._models[model]
+
+    async def complete(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str = DEFAULT_MODEL,
+        priority: Priority = Priority.INTERACTIVE,
+        hedge: bool = False,
+        **params
+    ):
+        """聊天补全；返回OpenAI的ChatCompletion响应
+
+        hedge=True 时，若超过近期延迟分位数仍未返回，会补发一个相同请求，取先完成者
+        """
+        key = make_request_key(model, messages, **params)
+        return await llm_singleflight.do(
+            key, lambda: self._complete(messages, model, priority, hedge, params)
+        )
+
+    async def _complete(self, messages, model: str, priority: Priority, hedge: bool, params: Dict[str, Any]):
+        client = await self._get_client()
+        stats = self._model_stats(model)
+        estimated_tokens = estimate_messages_tokens(messages) + params.get("max_tokens", 0)
+
+        async def attempt():
+            async with llm_governor.acquire(
+                priority, estimated_tokens, timeout=config.OPENAI_QUEUE_TIMEOUT
+            ) as permit:
+                response = await client.chat.completions.create(
+                    model=model, messages=messages, **params
+                )
+                permit.observe_latency()
+                usage = getattr(response, "usage", None)
+                permit.record_usage(getattr(usage, "total_tokens", None))
+
+            stats.record(
+                permit.latency,
+                getattr(usage, "prompt_tokens", 0) or 0,
+                getattr(usage, "completion_tokens", 0) or 0
+            )
+            return response
+
+        for retry in range(config.MAX_RETRIES + 1):
+            try:
+                if hedge:
+                    return await self._run_hedged(attempt, self._hedge_delay(stats.latencies))
+                return await attempt()
+            except RETRYABLE_ERRORS as e:
+                stats.errors += 1
+                if retry >= config.MAX_RETRIES:
+                    raise
+                self.retries += 1
+                logger.warning(f"LLM调用失败（{type(e).__name__}），第 {retry + 1} 次重试")
+                # 限流的等待由调度器的暂停控制，其余错误按间隔退避
+                if not isinstance(e, openai.RateLimitError):
+                    await asyncio.sleep(config.RETRY_DELAY * (retry + 1))
+            except Exception:
+                stats.errors += 1
+                raise
+
+    async def stream(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str = DEFAULT_MODEL,
+        priority: Priority = Priority.INTERACTIVE,
+        hedge: bool = False,
+        **params
+    ) -> AsyncIterator[str]:
+        """流式聊天补全，逐段产出文本；相同请求的并发订阅者共享一个上游流
+
+        hedge=True 时按首token延迟对冲，先产出首个分片的流胜出
+        """
+        key = make_request_key(model, messages, stream=True, **params)
+        async for content in llm_singleflight.stream(
+            key, lambda: self._stream(messages, model, priority, hedge, params)
+        ):
+            yield content
+
+    async def _stream(
+        self, messages, model: str, priority: Priority, hedge: bool, params: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        client = await self._get_client()
+        stats = self._model_stats(model)
+
+        async def open_attempt() -> Tuple[AsyncIterator[str], Optional[str]]:
+            # 打开一个上游流并等到首个分片，返回 (流, 首个分片)
+            chunks = self._stream_attempt(client, messages, model, priority, params, stats)
+            try:
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                return chunks, None
+            except BaseException:
+                await chunks.aclose()
+                raise
+            return chunks, first
+
+        async def discard(opened: Tuple[AsyncIterator[str], Optional[str]]):
+            await opened[0].aclose()
+
+        for retry in range(config.MAX_RETRIES + 1):
+            try:
+                if hedge:
+                    chunks, first = await self._run_hedged(
+                        open_attempt, self._hedge_delay(stats.first_token_latencies), discard
+                    )
+                else:
+                    chunks, first = await open_attempt()
+            except RETRYABLE_ERRORS as e:
+                stats.errors += 1
+                if retry >= config.MAX_RETRIES:
+                    raise
+                self.retries += 1
+                logger.warning(f"LLM流式调用失败（{type(e).__name__}），第 {retry + 1} 次重试")
+                if not isinstance(e, openai.RateLimitError):
+                    await asyncio.sleep(config.RETRY_DELAY * (retry + 1))
+                continue
+            except Exception:
+                stats.errors += 1
+                raise
+
+            # 已经输出过内容的流无法透明重试
+            try:
+                if first is not None:
+                    yield first
+                    async for content in chunks:
+                        yield content
+                return
+            except Exception:
+                stats.errors += 1
+                raise
+            finally:
+                await chunks.aclose()
+
+    async def _stream_attempt(
+        self,
+        client: openai.AsyncOpenAI,
+        messages: List[Dict[str, Any]],
+        model: str,
+        priority: Priority,
+        params: Dict[str, Any],
+        stats: _ModelStats
+    ) -> AsyncIterator[str]:
+        prompt_tokens = estimate_messages_tokens(messages)
+        estimated_tokens = prompt_tokens + params.get("max_tokens", 0)
+
+        async with llm_governor.acquire(
+            priority, estimated_tokens, timeout=config.OPENAI_QUEUE_TIMEOUT
+        ) as permit:
+            response = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                **params
+            )
+            completion_tokens = 0
+            usage = None
+            async for chunk in response:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content is not None:
+                    # 流式调用以首个分片的到达时间作为延迟信号
+                    permit.observe_latency()
+                    content = chunk.choices[0].delta.content
+                    completion_tokens += estimate_tokens(content)
+                    yield content
+
+            if usage is not None:
+                prompt_tokens = usage.prompt_tokens
+                completion_tokens = usage.completion_tokens
+            permit.record_usage(prompt_tokens + completion_tokens)
+
+        stats.record(permit.latency or 0.0, prompt_tokens, completion_tokens, streamed=True)
+
+    def _hedge_delay(self, samples: Deque[float]) -> Optional[float]:
+        """对冲等待时间：近期延迟的分位数；样本不足时不对冲"""
+        if len(samples) < config.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        delay = _ModelStats.percentile(samples, config.LLM_HEDGE_PERCENTILE)
+        return max(config.LLM_HEDGE_MIN_DELAY, delay)
+
+    async def _run_hedged(
+        self,
+        launch: Callable[[], Awaitable[T]],
+        delay: Optional[float],
+        discard: Optional[Callable[[T], Awaitable[None]]] = None
+    ) -> T:
+        """执行launch()；超过delay秒未完成且预算允许时补发一次，取先成功者并取消另一个"""
+        self.hedging.eligible += 1
+        primary = asyncio.ensure_future(launch())
+        if delay is None:
+            return await primary
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+        if not self.hedging.budget_available():
+            self.hedging.budget_exhausted += 1
+            return await primary
+
+        self.hedging.sent += 1
+        hedged = asyncio.ensure_future(launch())
+        pending = {primary, hedged}
+        winner: Optional[asyncio.Future] = None
+        error: Optional[BaseException] = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
+                        continue
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+        finally:
+            # 取消落败的请求；若两者同时完成，释放落败者的结果
+            for task in (primary, hedged):
+                if task is winner:
+                    continue
+                if not task.done():
+                    task.cancel()
+                elif discard is not None and not task.cancelled() and task.exception() is None:
+                    await discard(task.result())
+
+        if winner is None:
+            raise error
+        if winner is hedged:
+            self.hedging.hedge_wins += 1
+        else:
+            self.hedging.primary_wins += 1
+        return winner.result()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取网关统计"""
+        return {
+            "started": self._client is not None,
+            "http2": HTTP2_AVAILABLE,
+            "retries": self.retries,
+            "hedging": self.hedging.to_dict(),
+            "models": {model: stats.to_dict() for model, stats in self._models.items()}
+        }
+
+# 全局LLM网关
+llm_gateway = LLMGateway()
@@ -0,0 +1,286 @@
+"""
+OpenAI请求调度器（governor）
+
+所有LLM调用在发出前都要向调度器申请许可：
+- 发送前估算token数，同时受每分钟请求数（RPM）和每分钟token数（TPM）两个令牌桶约束
+- 按优先级排队：交互问答 > 单文件上传 > 批量上传 > 索引构建
+- 并发上限按AIMD方式自适应：成功时线性增加，遇到429减半，延迟超标时小幅收缩
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.config.anti_blocking_config import config
+
+logger = logging.getLogger(__name__)
+
+class Priority(IntEnum):
+    """调度优先级，数值越小越优先"""
+    INTERACTIVE = 0  # 交互问答
+    UPLOAD = 1       # 单文件上传分析
+    BATCH = 2        # 批量上传分析
+    INDEXING = 3     # 索引构建等后台任务
+
+class TokenBucket:
+    """按秒连续补充的令牌桶，容量为每分钟额度"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.refill_per_second = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+    def time_until(self, amount: float) -> float:
+        """距离桶内令牌足够支付amount还需等待的秒数"""
+        self._refill()
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_second
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+    def adjust(self, delta: float):
+        """按实际用量修正：delta为正表示退还，为负表示补扣（允许透支）"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + delta)
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    sequence: int
+    tokens: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False, default_factory=time.monotonic)
+
+class LLMPermit:
+    """一次已获批的LLM调用"""
+
+    def __init__(self, governor: "LLMGovernor", priority: Priority, estimated_tokens: int):
+        self.governor = governor
+        self.priority = priority
+        self.estimated_tokens = estimated_tokens
+        self.started_at = time.monotonic()
+        self.latency: Optional[float] = None
+
+    def observe_latency(self):
+        """记录响应延迟；流式调用在收到首个分片时调用，否则以整个调用耗时为准"""
+        if self.latency is None:
+            self.latency = time.monotonic() - self.started_at
+
+    def record_usage(self, actual_tokens: Optional[int]):
+        """用响应中的实际token用量修正TPM令牌桶"""
+        if actual_tokens is None:
+            return
+        self.governor._tokens.adjust(self.estimated_tokens - actual_tokens)
+        self.estimated_tokens = actual_tokens
+
+class LLMGovernor:
+    """OpenAI全局请求调度器"""
+
+    def __init__(
+        self,
+        name: str,
+        rpm: int,
+        tpm: int,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+        latency_target: float = 15.0
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.latency_target = latency_target
+
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._limit = float(max_concurrency)
+        self._active = 0
+        self._queue: List[_Waiter] = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.granted: Dict[str, int] = {p.name.lower(): 0 for p in Priority}
+        self.total_wait: Dict[str, float] = {p.name.lower(): 0.0 for p in Priority}
+        self.rate_limited = 0
+        self.queue_timeouts = 0
+        self.slow_responses = 0
+        self.latency_ewma: Optional[float] = None
+
+    @property
+    def concurrency_limit(self) -> int:
+        return max(self.min_concurrency, int(self._limit))
+
+    @asynccontextmanager
+    async def acquire(
+        self,
+        priority: Priority = Priority.INTERACTIVE,
+        estimated_tokens: int = 0,
+        timeout: Optional[float] = None,
+        adaptive: bool = True
+    ) -> AsyncIterator[LLMPermit]:
+        """申请一次LLM调用许可，退出上下文时释放并根据结果调整并发上限
+
+        排队超过timeout秒仍未获批时抛出 asyncio.TimeoutError；
+        adaptive=False 时本次耗时不参与并发自适应（用于包含多次调用的长任务）
+        """
+        # 单次请求的估算量不超过桶容量，否则永远无法获批
+        estimated_tokens = int(min(max(estimated_tokens, 0), self._tokens.capacity))
+        try:
+            await asyncio.wait_for(self._wait_for_turn(priority, estimated_tokens), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.queue_timeouts += 1
+            logger.warning(f"[{self.name}] {priority.name} 请求排队超时 ({timeout}s)")
+            raise
+
+        permit = LLMPermit(self, priority, estimated_tokens)
+        try:
+            yield permit
+        except Exception as e:
+            if getattr(e, "status_code", None) == 429:
+                self._on_rate_limited(e)
+            raise
+        else:
+            if adaptive:
+                permit.observe_latency()
+                self._on_success(permit.latency)
+        finally:
+            self._active -= 1
+            self._dispatch()
+
+    async def _wait_for_turn(self, priority: Priority, estimated_tokens: int):
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(int(priority), next(self._sequence), estimated_tokens, loop.create_future())
+        heapq.heappush(self._queue, waiter)
+        self._dispatch()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 许可已发放但调用方被取消，归还并发名额
+                self._active -= 1
+                self._dispatch()
+            else:
+                waiter.future.cancel()
+            raise
+
+        key = priority.name.lower()
+        self.granted[key] += 1
+        self.total_wait[key] += time.monotonic() - waiter.enqueued_at
+
+    def _dispatch(self):
+        """按优先级依次发放许可，直到并发或令牌不足"""
+        while self._queue:
+            head = self._queue[0]
+            if head.future.done():
+                heapq.heappop(self._queue)
+                continue
+            if self._active >= self.concurrency_limit:
+                return
+
+            # 严格按优先级：队首等待令牌时，低优先级请求也不能插队
+            wait = max(
+                self._paused_until - time.monotonic(),
+                self._requests.time_until(1),
+                self._tokens.time_until(head.tokens)
+            )
+            if wait > 0:
+                self._schedule(wait)
+                return
+
+            heapq.heappop(self._queue)
+            self._requests.consume(1)
+            self._tokens.consume(head.tokens)
+            self._active += 1
+            head.future.set_result(None)
+
+    def _schedule(self, delay: float):
+        if self._timer is not None:
+            self._timer.cancel()
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def _on_rate_limited(self, error: Exception):
+        """429：并发上限减半，并按Retry-After暂停发放"""
+        self.rate_limited += 1
+        self._limit = max(float(self.min_concurrency), self._limit / 2)
+
+        retry_after = 1.0
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        try:
+            retry_after = float(headers.get("retry-after", retry_after))
+        except (TypeError, ValueError):
+            pass
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        logger.warning(
+            f"[{self.name}] 触发限流，并发上限降至 {self.concurrency_limit}，暂停 {retry_after:.1f}s"
+        )
+
+    def _on_success(self, latency: float):
+        self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+        if latency > self.latency_target:
+            self.slow_responses += 1
+            self._limit = max(float(self.min_concurrency), self._limit * 0.75)
+        else:
+            # 每完成约一轮并发量的请求，上限加一
+            self._limit = min(float(self.max_concurrency), self._limit + 1.0 / max(self._limit, 1.0))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取调度统计"""
+        queued = {p.name.lower(): 0 for p in Priority}
+        for waiter in self._queue:
+            if not waiter.future.done():
+                queued[Priority(waiter.priority).name.lower()] += 1
+
+        return {
+            "concurrency_limit": self.concurrency_limit,
+            "max_concurrency": self.max_concurrency,
+            "active": self._active,
+            "queued": queued,
+            "granted": dict(self.granted),
+            "avg_wait_seconds": {
+                key: round(self.total_wait[key] / count, 3) if count else 0.0
+                for key, count in self.granted.items()
+            },
+            "requests_available": int(self._requests.available()),
+            "tokens_available": int(self._tokens.available()),
+            "rate_limited": self.rate_limited,
+            "queue_timeouts": self.queue_timeouts,
+            "slow_responses": self.slow_responses,
+            "latency_ewma": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            "paused": self._paused_until > time.monotonic()
+        }
+
+# 全局OpenAI调度器
+llm_governor = LLMGovernor(
+    "openai",
+    rpm=config.OPENAI_RPM,
+    tpm=config.OPENAI_TPM,
+    max_concurrency=config.OPENAI_MAX_CONCURRENCY,
+    min_concurrency=config.OPENAI_MIN_CONCURRENCY,
+    latency_target=config.OPENAI_LATENCY_TARGET
+)
@@ -0,0 +1,150 @@
+"""
+LLM请求合并（single-flight）
+
+同一时刻发起的完全相同的LLM请求（模型、消息、参数均相同）只向OpenAI发送一次：
+- 普通请求：后到者等待同一个共享任务的结果
+- 流式请求：上游只建立一个流，所有订阅者从同一份分片缓冲中扇出读取，
+  中途加入的订阅者会先补齐已生成的分片
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+def make_request_key(model: str, messages: List[Dict[str, Any]], **params) -> str:
+    """根据模型、消息和参数生成请求指纹"""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class _StreamBroadcast:
+    """一个上游流的分片缓冲，供多个订阅者读取"""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def publish(self, chunk: Any):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self):
+        # 唤醒当前所有等待者，并为下一轮等待换一个新的事件
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        index = 0
+        while True:
+            changed = self._changed
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+class SingleFlight:
+    """相同请求合并执行器"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._streams: Dict[str, _StreamBroadcast] = {}
+        self.total_requests = 0
+        self.coalesced_requests = 0
+        self.total_streams = 0
+        self.coalesced_streams = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """执行请求；若已有相同请求在进行中，则等待其结果"""
+        self.total_requests += 1
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced_requests += 1
+            logger.debug(f"[{self.name}] 合并相同的进行中请求 {key[:12]}")
+        else:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda finished: self._release(self._inflight, key, finished))
+
+        # shield：某个调用方被取消时不影响共享任务和其他等待者
+        return await asyncio.shield(task)
+
+    async def stream(
+        self,
+        key: str,
+        factory: Callable[[], AsyncIterator[Any]]
+    ) -> AsyncIterator[Any]:
+        """订阅流式请求；相同请求共享同一个上游流"""
+        self.total_streams += 1
+        broadcast = self._streams.get(key)
+        if broadcast is not None:
+            self.coalesced_streams += 1
+            logger.debug(f"[{self.name}] 订阅进行中的相同流 {key[:12]}")
+        else:
+            broadcast = _StreamBroadcast()
+            self._streams[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._pump(factory, broadcast))
+            broadcast.task.add_done_callback(
+                lambda finished: self._release(self._streams, key, broadcast)
+            )
+
+        broadcast.subscribers += 1
+        try:
+            async for chunk in broadcast.subscribe():
+                yield chunk
+        finally:
+            broadcast.subscribers -= 1
+            # 所有订阅者都已断开时取消上游流，避免继续消耗token
+            if broadcast.subscribers == 0 and not broadcast.done:
+                broadcast.task.cancel()
+
+    async def _pump(self, factory: Callable[[], AsyncIterator[Any]], broadcast: _StreamBroadcast):
+        try:
+            async for chunk in factory():
+                broadcast.publish(chunk)
+            broadcast.finish()
+        except asyncio.CancelledError:
+            broadcast.finish(asyncio.CancelledError())
+            raise
+        except Exception as e:
+            broadcast.finish(e)
+
+    @staticmethod
+    def _release(registry: Dict[str, Any], key: str, value: Any):
+        if registry.get(key) is value:
+            registry.pop(key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取合并统计"""
+        return {
+            "inflight_requests": len(self._inflight),
+            "inflight_streams": len(self._streams),
+            "total_requests": self.total_requests,
+            "coalesced_requests": self.coalesced_requests,
+            "total_streams": self.total_streams,
+            "coalesced_streams": self.coalesced_streams
+        }
+
+# 全局OpenAI请求合并器
+llm_singleflight = SingleFlight("openai")
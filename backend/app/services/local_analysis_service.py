@@ -0,0 +1,255 @@
+"""
+本地文档分析引擎（降级模式）
+
+OpenAI不可用（超时、熔断、配额耗尽）时，在本地毫秒级生成有内容的分析结果：
+- 关键句：句子TF-IDF向量 + 余弦相似度图上的TextRank（NumPy）
+- 关键词：句子级TF-IDF打分的二元组，按共现频率扩展为完整短语
+- 公司名称、成立信息、服务内容、目标客户：正则 + 词典识别
+结果与AI分析使用同一 EnterpriseInfo 结构，可渲染为纯文本或 <enterprise_info> 格式
+"""
+
+import re
+import math
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.models.analysis_schemas import EnterpriseInfo
+from app.utils.text_tokenizer import tokenize, split_sentences
+
+LOCAL_ANALYSIS_NOTE = "本地分析（AI服务暂时不可用，结果由关键句和关键词抽取生成）"
+
+# 参与分析的最大文本长度，保证毫秒级返回
+MAX_ANALYSIS_CHARS = 20000
+MAX_SENTENCES = 300
+
+_COMPANY_PATTERN = re.compile(
+    r"([\u4e00-\u9fa5A-Za-z0-9（）()·]{2,30}?"
+    r"(?:股份有限公司|有限责任公司|有限公司|集团公司|集团|研究院|事务所|工作室|公司))"
+)
+_COMPANY_EN_PATTERN = re.compile(
+    r"\b([A-Z][A-Za-z0-9&\-]*(?:\s+[A-Z][A-Za-z0-9&\-]*){0,5},?\s+"
+    r"(?:Co\.,?\s*Ltd\.?|Ltd\.?|Inc\.?|LLC|Corp\.?|Corporation|Group|GmbH))"
+)
+# 公司名称前常见的非名称成分
+_COMPANY_PREFIX_PATTERN = re.compile(
+    r"^(?:关于|欢迎|来到|我们是|我们|本|由|与|和|及|是|在|为|于|对|向|将|把|从|该|贵|本次)+"
+)
+_ESTABLISHMENT_PATTERN = re.compile(
+    r"((?:成立|创立|创建|始建|注册)于\s*\d{4}\s*年(?:\s*\d{1,2}\s*月)?(?:\s*\d{1,2}\s*日)?"
+    r"|成立时间\s*[:：]?\s*\d{4}[年\-/.]\d{0,2}[月\-/.]?\d{0,2}日?"
+    r"|(?:founded|established)\s+in\s+\d{4})",
+    re.IGNORECASE
+)
+_SERVICE_PATTERN = re.compile(
+    r"(?:提供|从事|专注于|致力于|主营)([\u4e00-\u9fa5A-Za-z0-9、，,和及与]{2,40}?)(?:服务|解决方案|业务|产品)"
+)
+_CUSTOMER_PATTERN = re.compile(
+    r"(?:面向|服务于|服务对象为|客户包括|客户主要为|为)([\u4e00-\u9fa5A-Za-z0-9、，,和及与]{2,30}?)"
+    r"(?:提供|等客户|客户|用户|群体)"
+)
+_LIST_SEPARATOR_PATTERN = re.compile(r"[、，,和及与]+")
+
+# 常见服务/业务领域词典
+SERVICE_TERMS = [
+    "软件开发", "系统集成", "技术咨询", "技术服务", "云计算", "大数据", "数据分析", "人工智能",
+    "物联网", "网络安全", "信息安全", "运维服务", "IT外包", "电子商务", "跨境电商", "供应链管理",
+    "物流配送", "仓储", "金融服务", "财务咨询", "税务咨询", "法律咨询", "管理咨询", "人力资源",
+    "招聘", "培训", "教育培训", "市场营销", "品牌策划", "广告设计", "平面设计", "工业设计",
+    "建筑设计", "工程施工", "装修", "房地产", "物业管理", "医疗器械", "医疗服务", "健康管理",
+    "生物医药", "新能源", "环保", "检测认证", "智能制造", "自动化", "机械加工", "贸易",
+    "进出口", "餐饮", "酒店", "旅游", "文化传媒", "影视制作", "游戏开发", "移动应用",
+    "小程序开发", "网站建设", "SaaS", "CRM", "ERP",
+]
+
+# 企业文档中普遍出现、不适合作为关键词的词项
+GENERIC_TERMS = {"公司", "企业", "服务", "客户", "业务", "产品", "用户", "行业", "发展", "管理"}
+
+def extract_key_sentences(sentences: List[str], top_k: int = 5) -> List[int]:
+    """TextRank：返回最重要的top_k个句子的下标（按原文顺序）"""
+    if not sentences:
+        return []
+    if len(sentences) <= top_k:
+        return list(range(len(sentences)))
+
+    vectors = _tfidf_matrix([tokenize(sentence) for sentence in sentences])
+    norms = np.linalg.norm(vectors, axis=1)
+    norms[norms == 0] = 1.0
+    normalized = vectors / norms[:, None]
+    similarity = normalized @ normalized.T
+    np.fill_diagonal(similarity, 0.0)
+
+    row_sums = similarity.sum(axis=1)
+    row_sums[row_sums == 0] = 1.0
+    transition = similarity / row_sums[:, None]
+
+    # 幂迭代求解PageRank，阻尼系数0.85
+    count = len(sentences)
+    scores = np.full(count, 1.0 / count)
+    for _ in range(50):
+        updated = 0.15 / count + 0.85 * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < 1e-6:
+            scores = updated
+            break
+        scores = updated
+
+    # 轻微偏向靠前的句子（文档开头通常是概述）
+    scores = scores * (1.0 + 0.3 / (1.0 + np.arange(count) / 5.0))
+    top = np.argsort(-scores)[:top_k]
+    return sorted(int(index) for index in top)
+
+def _tfidf_matrix(tokenized: List[List[str]]) -> np.ndarray:
+    """句子 × 词项 的TF-IDF矩阵（以句子为文档计算IDF）"""
+    vocabulary: Dict[str, int] = {}
+    for tokens in tokenized:
+        for token in tokens:
+            vocabulary.setdefault(token, len(vocabulary))
+
+    matrix = np.zeros((len(tokenized), max(len(vocabulary), 1)))
+    for row, tokens in enumerate(tokenized):
+        for token, count in Counter(tokens).items():
+            matrix[row, vocabulary[token]] = count
+
+    document_frequency = (matrix > 0).sum(axis=0)
+    idf = np.log((1 + len(tokenized)) / (1 + document_frequency)) + 1.0
+    return matrix * idf
+
+def extract_keywords(text: str, sentences: Optional[List[str]] = None, top_k: int = 10) -> List[str]:
+    """抽取关键词短语"""
+    sentences = sentences if sentences is not None else split_sentences(text)
+    if not sentences:
+        sentences = [text]
+
+    term_frequency: Counter = Counter()
+    sentence_frequency: Counter = Counter()
+    for sentence in sentences:
+        tokens = tokenize(sentence)
+        term_frequency.update(tokens)
+        sentence_frequency.update(set(tokens))
+
+    total = len(sentences)
+    scored = []
+    for term, frequency in term_frequency.items():
+        if term in GENERIC_TERMS or (frequency < 2 and total > 3):
+            continue
+        idf = math.log((1 + total) / (1 + sentence_frequency[term])) + 1.0
+        scored.append(((1 + math.log(frequency)) * idf * min(len(term), 6), term))
+    scored.sort(reverse=True)
+
+    keywords: List[str] = []
+    for _, term in scored:
+        phrase = _expand_phrase(text, term, term_frequency[term]) if _is_cjk(term) else term
+        if any(phrase in keyword or keyword in phrase for keyword in keywords):
+            continue
+        keywords.append(phrase)
+        if len(keywords) >= top_k:
+            break
+    return keywords
+
+def _is_cjk(term: str) -> bool:
+    return "\u4e00" <= term[0] <= "\u9fff"
+
+def _expand_phrase(text: str, bigram: str, frequency: int, max_length: int = 8) -> str:
+    """向左右扩展二元组：扩展后的短语出现次数不低于原频率的七成时接受扩展"""
+    phrase = bigram
+    threshold = max(2, math.ceil(frequency * 0.7))
+    while len(phrase) < max_length:
+        candidates = Counter()
+        for match in re.finditer(re.escape(phrase), text):
+            start, end = match.start(), match.end()
+            if start > 0 and _is_cjk(text[start - 1]):
+                candidates[text[start - 1] + phrase] += 1
+            if end < len(text) and _is_cjk(text[end]):
+                candidates[phrase + text[end]] += 1
+        if not candidates:
+            break
+        best, count = candidates.most_common(1)[0]
+        if count < threshold:
+            break
+        phrase = best
+    return phrase
+
+def detect_company_name(text: str) -> Optional[str]:
+    """识别出现最多的公司名称"""
+    names: Counter = Counter()
+    for match in _COMPANY_PATTERN.finditer(text):
+        name = _COMPANY_PREFIX_PATTERN.sub("", match.group(1))
+        if len(name) >= 4 and name not in ("有限公司", "集团公司", "股份有限公司"):
+            names[name] += 1
+    for match in _COMPANY_EN_PATTERN.finditer(text):
+        names[match.group(1).strip()] += 1
+    if not names:
+        return None
+    # 频率相同时取较长（更完整）的名称
+    return max(names.items(), key=lambda item: (item[1], len(item[0])))[0]
+
+def detect_establishment(text: str) -> Optional[str]:
+    match = _ESTABLISHMENT_PATTERN.search(text)
+    return re.sub(r"\s+", "", match.group(1)) if match else None
+
+def detect_services(text: str, limit: int = 6) -> List[str]:
+    """识别服务内容：句式抽取优先，其次匹配服务词典"""
+    services: List[str] = []
+
+    def _add(item: str):
+        item = item.strip()
+        if 2 <= len(item) <= 20 and not any(item in existing or existing in item for existing in services):
+            services.append(item)
+
+    for match in _SERVICE_PATTERN.finditer(text):
+        # “致力于为XX提供YY服务”只保留“提供”之后的部分
+        for item in _LIST_SEPARATOR_PATTERN.split(match.group(1).split("提供")[-1]):
+            _add(item)
+    lowered = text.lower()
+    for term in SERVICE_TERMS:
+        if term.lower() in lowered:
+            _add(term)
+    return services[:limit]
+
+def detect_target_customers(text: str, sentences: List[str]) -> Optional[str]:
+    match = _CUSTOMER_PATTERN.search(text)
+    if match:
+        return match.group(1).strip("，,、 ")
+    for sentence in sentences:
+        if "客户" in sentence or "用户" in sentence:
+            return _truncate(sentence, 80)
+    return None
+
+def _truncate(text: str, length: int) -> str:
+    text = re.sub(r"\s+", " ", text).strip()
+    return text if len(text) <= length else text[:length] + "…"
+
+def is_local_analysis(analysis: Optional[str]) -> bool:
+    """判断分析结果是否由本地分析引擎生成（AI未参与）"""
+    return LOCAL_ANALYSIS_NOTE in (analysis or "")
+
+def analyze_text_locally(text: str) -> EnterpriseInfo:
+    """不依赖网络的文档分析"""
+    text = (text or "")[:MAX_ANALYSIS_CHARS]
+    sentences = split_sentences(text)[:MAX_SENTENCES]
+    key_indexes = extract_key_sentences(sentences, top_k=5)
+    key_sentences = [_truncate(sentences[index], 120) for index in key_indexes]
+    keywords = extract_keywords(text, sentences)
+
+    if key_sentences:
+        main_business = "".join(key_sentences[:2])
+    elif text.strip():
+        main_business = _truncate(text, 200)
+    else:
+        main_business = "文档内容较少，无法提取业务描述"
+
+    key_features = key_sentences[2:5]
+    if keywords:
+        key_features.append("关键词：" + "、".join(keywords[:8]))
+
+    return EnterpriseInfo(
+        company_name=detect_company_name(text),
+        main_business=main_business,
+        establishment_info=detect_establishment(text),
+        key_features=key_features,
+        target_customers=detect_target_customers(text, sentences),
+        services=detect_services(text),
+        additional_info=f"文档字数约 {len(text)} 字符",
+        analysis_note=LOCAL_ANALYSIS_NOTE
+    )
@@ -0,0 +1,283 @@
+"""
+近似重复文档检测（MinHash + LSH）
+
+文档规范化（转小写、去掉空白和标点）后切成字符5-gram，用128个哈希函数计算MinHash签名：
+两份文档签名中相同分量的比例是其shingle集合Jaccard相似度的无偏估计。
+
+签名按16个band（每个8行）分段哈希后写入 knowledge_lsh_buckets 表，查询时只比较至少有一个
+band落在同一桶中的条目，开销与候选数成正比而与知识库规模无关；相似度0.8的文档成为候选的
+概率约为94%，0.9以上几乎必然成为候选。
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from app.config.anti_blocking_config import config
+from app.models.database import SessionLocal
+from app.models.knowledge_base import KnowledgeBase, KnowledgeContent, KnowledgeFingerprint, KnowledgeLSHBucket
+from app.utils.background_job import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+
+# 每次参与矩阵运算的shingle数（内存约 CHUNK_SIZE × NUM_PERMUTATIONS × 8 字节）
+CHUNK_SIZE = 4096
+
+# 单次查询最多精确比较的候选条目数（按共享band数优先）
+MAX_CANDIDATES = 50
+
+_NON_WORD_PATTERN = re.compile(r"[\W_]+")
+_SHINGLE_BASE = np.uint64(1099511628211)
+
+# 固定种子，保证不同进程、不同时间计算的签名可以互相比较
+_rng = np.random.default_rng(20261019)
+_HASH_A = _rng.integers(0, 2 ** 64, NUM_PERMUTATIONS, dtype=np.uint64, endpoint=False) | np.uint64(1)
+_HASH_B = _rng.integers(0, 2 ** 64, NUM_PERMUTATIONS, dtype=np.uint64, endpoint=False)
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """规范化文本的字符5-gram哈希（去重后）"""
+    normalized = _NON_WORD_PATTERN.sub("", (text or "").lower())[:config.DEDUP_MAX_CHARS]
+    if len(normalized) < SHINGLE_SIZE:
+        return np.empty(0, dtype=np.uint64)
+    codes = np.frombuffer(normalized.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    count = len(codes) - SHINGLE_SIZE + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    # 多项式滚动哈希，按 2^64 自然溢出取模
+    for offset in range(SHINGLE_SIZE):
+        hashes = hashes * _SHINGLE_BASE + codes[offset:offset + count]
+    return np.unique(hashes)
+
+def minhash_signature(hashes: np.ndarray) -> np.ndarray:
+    """用 (a·x + b) >> 32 乘移哈希族模拟随机排列，取每个哈希函数下的最小值"""
+    signature = np.full(NUM_PERMUTATIONS, np.iinfo(np.uint32).max, dtype=np.uint32)
+    for start in range(0, len(hashes), CHUNK_SIZE):
+        chunk = hashes[start:start + CHUNK_SIZE]
+        permuted = (chunk[:, None] * _HASH_A + _HASH_B) >> np.uint64(32)
+        signature = np.minimum(signature, permuted.min(axis=0).astype(np.uint32))
+    return signature
+
+@dataclass
+class Fingerprint:
+    signature: np.ndarray
+    shingle_count: int
+
+    def buckets(self) -> List[int]:
+        """每个band的桶编号（有符号64位，适配BIGINT列）"""
+        buckets = []
+        for band in range(LSH_BANDS):
+            rows = self.signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+            digest = hashlib.blake2b(rows.tobytes(), digest_size=8).digest()
+            buckets.append(int.from_bytes(digest, "little", signed=True))
+        return buckets
+
+    def similarity(self, other: np.ndarray) -> float:
+        return float(np.mean(self.signature == other))
+
+    def to_bytes(self) -> bytes:
+        return self.signature.astype("<u4").tobytes()
+
+def signature_from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype="<u4").astype(np.uint32)
+
+@dataclass
+class DuplicateMatch:
+    knowledge: KnowledgeBase
+    similarity: float
+
+    def to_dict(self, action: str) -> Dict[str, object]:
+        return {
+            "knowledge_id": self.knowledge.id,
+            "title": self.knowledge.title,
+            "similarity": round(self.similarity, 3),
+            "version_number": self.knowledge.version_number,
+            "action": action
+        }
+
+class NearDuplicateIndex:
+    """基于数据库分桶表的MinHash LSH索引"""
+
+    def __init__(self):
+        self.backfill_job = BackgroundJob("近似重复签名补算")
+
+    def fingerprint(self, text: str) -> Optional[Fingerprint]:
+        """计算文本签名；规范化后不足一个shingle的文本不参与去重"""
+        hashes = shingle_hashes(text)
+        if len(hashes) == 0:
+            return None
+        return Fingerprint(minhash_signature(hashes), len(hashes))
+
+    def add(self, db: Session, knowledge_id: int, fingerprint: Optional[Fingerprint]) -> None:
+        """写入签名和分桶（不提交，随知识条目在同一事务中写入）"""
+        if fingerprint is None:
+            return
+        db.add(KnowledgeFingerprint(
+            knowledge_id=knowledge_id,
+            signature=fingerprint.to_bytes(),
+            shingle_count=fingerprint.shingle_count
+        ))
+        db.add_all([
+            KnowledgeLSHBucket(band=band, bucket=bucket, knowledge_id=knowledge_id)
+            for band, bucket in enumerate(fingerprint.buckets())
+        ])
+
+    def replace(self, db: Session, knowledge_id: int, fingerprint: Optional[Fingerprint]) -> None:
+        """正文修订后替换签名和分桶（不提交）"""
+        db.query(KnowledgeLSHBucket).filter(KnowledgeLSHBucket.knowledge_id == knowledge_id).delete(synchronize_session=False)
+        db.query(KnowledgeFingerprint).filter(KnowledgeFingerprint.knowledge_id == knowledge_id).delete(synchronize_session=False)
+        self.add(db, knowledge_id, fingerprint)
+
+    def find(
+        self,
+        db: Session,
+        fingerprint: Optional[Fingerprint],
+        threshold: float,
+        limit: int = 5
+    ) -> List[DuplicateMatch]:
+        """查找相似度不低于threshold的有效条目，按相似度降序"""
+        if fingerprint is None:
+            return []
+
+        conditions = [
+            and_(KnowledgeLSHBucket.band == band, KnowledgeLSHBucket.bucket == bucket)
+            for band, bucket in enumerate(fingerprint.buckets())
+        ]
+        shared_bands = func.count(KnowledgeLSHBucket.band)
+        candidate_ids = [
+            row[0] for row in db.query(KnowledgeLSHBucket.knowledge_id)
+            .filter(or_(*conditions))
+            .group_by(KnowledgeLSHBucket.knowledge_id)
+            .order_by(shared_bands.desc())
+            .limit(MAX_CANDIDATES)
+            .all()
+        ]
+        if not candidate_ids:
+            return []
+
+        matches = []
+        rows = db.query(KnowledgeBase, KnowledgeFingerprint.signature).join(
+            KnowledgeFingerprint, KnowledgeFingerprint.knowledge_id == KnowledgeBase.id
+        ).filter(
+            KnowledgeBase.id.in_(candidate_ids),
+            KnowledgeBase.is_active == True
+        ).all()
+        for knowledge, signature in rows:
+            similarity = fingerprint.similarity(signature_from_bytes(signature))
+            if similarity >= threshold:
+                matches.append(DuplicateMatch(knowledge, similarity))
+        matches.sort(key=lambda match: (-match.similarity, -match.knowledge.id))
+        return matches[:limit]
+
+    def find_best(self, db: Session, fingerprint: Optional[Fingerprint], threshold: float) -> Optional[DuplicateMatch]:
+        matches = self.find(db, fingerprint, threshold, limit=1)
+        return matches[0] if matches else None
+
+    @staticmethod
+    def next_version(db: Session, knowledge: KnowledgeBase) -> Tuple[int, int]:
+        """把新条目挂到knowledge所在的版本链上，返回 (首个版本ID, 新版本号)"""
+        root_id = knowledge.version_of_id or knowledge.id
+        latest = db.query(func.max(KnowledgeBase.version_number)).filter(
+            or_(KnowledgeBase.id == root_id, KnowledgeBase.version_of_id == root_id)
+        ).scalar()
+        return root_id, (latest or 1) + 1
+
+    def collapse(
+        self,
+        db: Session,
+        items: List[KnowledgeBase],
+        threshold: Optional[float] = None
+    ) -> Tuple[List[KnowledgeBase], Dict[int, List[int]]]:
+        """合并检索结果中的近似重复命中
+
+        同一版本链上的命中只保留最新版本（占据其中排名最前的位置）；其余命中签名相似度
+        不低于threshold时只保留排名靠前的一条。返回 (保留的条目, {保留ID: [被合并ID]})
+        """
+        if len(items) < 2:
+            return items, {}
+        if threshold is None:
+            threshold = config.DEDUP_HIT_THRESHOLD
+
+        signatures = {
+            knowledge_id: signature_from_bytes(signature)
+            for knowledge_id, signature in db.query(
+                KnowledgeFingerprint.knowledge_id, KnowledgeFingerprint.signature
+            ).filter(KnowledgeFingerprint.knowledge_id.in_([item.id for item in items])).all()
+        }
+
+        kept: List[KnowledgeBase] = []
+        merged: Dict[int, List[int]] = {}
+        for item in items:
+            root_id = item.version_of_id or item.id
+            signature = signatures.get(item.id)
+            for index, keeper in enumerate(kept):
+                same_chain = root_id == (keeper.version_of_id or keeper.id)
+                keeper_signature = signatures.get(keeper.id)
+                near_identical = (
+                    signature is not None and keeper_signature is not None
+                    and float(np.mean(signature == keeper_signature)) >= threshold
+                )
+                if not (same_chain or near_identical):
+                    continue
+                if same_chain and (item.version_number or 1) > (keeper.version_number or 1):
+                    # 新版本替换旧版本，沿用旧版本的排名位置
+                    kept[index] = item
+                    merged[item.id] = merged.pop(keeper.id, []) + [keeper.id]
+                else:
+                    merged.setdefault(keeper.id, []).append(item.id)
+                break
+            else:
+                kept.append(item)
+        return kept, merged
+
+    def backfill(self, db: Session, batch_size: int = 100) -> int:
+        """为还没有签名的有效条目补算签名，返回处理的条目数"""
+        processed = 0
+        last_id = 0
+        while True:
+            # 直接读取未压缩的搜索正文，不必逐条解压
+            batch = db.query(KnowledgeContent.knowledge_id, KnowledgeContent.search_text).join(
+                KnowledgeBase, KnowledgeBase.id == KnowledgeContent.knowledge_id
+            ).outerjoin(
+                KnowledgeFingerprint, KnowledgeFingerprint.knowledge_id == KnowledgeContent.knowledge_id
+            ).filter(
+                KnowledgeFingerprint.knowledge_id.is_(None),
+                KnowledgeBase.is_active == True,
+                KnowledgeContent.knowledge_id > last_id
+            ).order_by(KnowledgeContent.knowledge_id).limit(batch_size).all()
+            if not batch:
+                break
+            for knowledge_id, text in batch:
+                self.add(db, knowledge_id, self.fingerprint(text))
+            db.commit()
+            processed += len(batch)
+            last_id = batch[-1][0]
+        logger.info(f"近似重复签名补算完成: {processed} 条")
+        return processed
+
+    def start_backfill(self) -> Tuple[Dict[str, Any], bool]:
+        """在后台线程中补算签名，返回 (任务状态, 是否新启动)"""
+        return self.backfill_job.start(lambda: asyncio.to_thread(self._backfill_in_new_session))
+
+    def _backfill_in_new_session(self) -> Dict[str, Any]:
+        db = SessionLocal()
+        try:
+            return {"processed": self.backfill(db)}
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+# 全局近似重复索引实例
+near_duplicates = NearDuplicateIndex()
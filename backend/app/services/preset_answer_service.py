@@ -0,0 +1,225 @@
+"""
+预设问题答案预生成
+
+启用的预设问题由后台任务预先检索并生成答案，存入 preset_answers：
+- 每轮按点击次数从高到低检查所有启用的预设问题：重新检索（开销小），
+  与生成答案时的上下文文档（ID和修订号）比较，变化比例达到 PRESET_ANSWER_CHANGE_THRESHOLD、
+  上下文文档被删除、问题被修改或答案超过 PRESET_ANSWER_MAX_AGE 时需要重新生成；
+- 每轮最多重新生成 PRESET_ANSWER_BATCH 个，以 BATCH 优先级调用模型，点击多的优先；
+- /ask 和 /ask-stream 的问题与预设问题（归一化后）相同且未指定上下文时直接返回预生成的答案。
+上下文文档被修改或删除时，引用它的答案立即停止使用，直到下一轮刷新。
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config.anti_blocking_config import config
+from app.models.database import SessionLocal
+from app.models.knowledge_base import KnowledgeBase, PresetAnswer, PresetQuestion
+from app.services.answer_cache_service import context_fingerprint, normalize_question
+from app.services.llm_governor import Priority
+from app.utils.background_job import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class PresetAnswerHit:
+    preset_question_id: int
+    answer: str
+    knowledge_ids: List[int]
+
+def context_change_ratio(old: List[Tuple[int, int]], new: List[Tuple[int, int]]) -> float:
+    """上下文文档 (ID, 修订号) 集合的变化比例：1 - Jaccard"""
+    old_set = {tuple(pair) for pair in old or []}
+    new_set = {tuple(pair) for pair in new or []}
+    union = old_set | new_set
+    return 1.0 - len(old_set & new_set) / len(union) if union else 0.0
+
+class PresetAnswerService:
+    """预设问题答案的预生成、刷新和查找"""
+
+    def __init__(self):
+        # 归一化问题 -> 预生成答案（进程内索引，每轮刷新后从数据库重新加载）
+        self._answers: Dict[str, PresetAnswerHit] = {}
+        # invalidate 也会在线程池中调用（渐进式分析写回），读写索引时持有线程锁
+        self._answers_lock = threading.Lock()
+        # 加载期间被失效的文档ID（加载完成前为集合，否则为None），避免加载完成时恢复已失效的答案
+        self._invalidated_while_loading: Optional[Set[int]] = None
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.generated = 0
+        self.failures = 0
+        self.last_refresh: Optional[Dict[str, Any]] = None
+        # 通过接口手动触发的刷新（后台运行）及其状态
+        self.manual_job = BackgroundJob("预设问题答案手动刷新")
+
+    def lookup(self, question: str) -> Optional[PresetAnswerHit]:
+        key = normalize_question(question)
+        with self._answers_lock:
+            hit = self._answers.get(key)
+        if hit is not None:
+            self.hits += 1
+        return hit
+
+    def invalidate(self, knowledge_id: int):
+        """上下文文档变化后停止使用引用它的答案"""
+        with self._answers_lock:
+            stale = [key for key, hit in self._answers.items() if knowledge_id in hit.knowledge_ids]
+            for key in stale:
+                self._answers.pop(key, None)
+            if self._invalidated_while_loading is not None:
+                self._invalidated_while_loading.add(knowledge_id)
+
+    def load(self, db: Session, exclude: Optional[Set[int]] = None):
+        """从数据库加载可用的答案（跳过 exclude 中待重新生成的预设问题）"""
+        with self._answers_lock:
+            self._invalidated_while_loading = set()
+        rows = db.query(PresetAnswer, PresetQuestion.question).join(
+            PresetQuestion, PresetQuestion.id == PresetAnswer.preset_question_id
+        ).filter(PresetQuestion.is_active == True).all()
+        answers = {
+            normalize_question(question): PresetAnswerHit(
+                answer.preset_question_id,
+                answer.answer,
+                [knowledge_id for knowledge_id, _ in answer.context_versions or []]
+            )
+            for answer, question in rows
+            if answer.question == question and answer.preset_question_id not in (exclude or ())
+        }
+        with self._answers_lock:
+            invalidated, self._invalidated_while_loading = self._invalidated_while_loading, None
+            self._answers = {
+                key: hit for key, hit in answers.items()
+                if not invalidated.intersection(hit.knowledge_ids)
+            }
+
+    @staticmethod
+    def _refresh_reason(
+        db: Session,
+        preset: PresetQuestion,
+        row: Optional[PresetAnswer],
+        versions: List[Tuple[int, int]],
+        now: float
+    ) -> Optional[str]:
+        if row is None:
+            return "missing"
+        if row.question != preset.question:
+            return "question_changed"
+        old_ids = [knowledge_id for knowledge_id, _ in row.context_versions or []]
+        if old_ids and db.query(KnowledgeBase.id).filter(
+            KnowledgeBase.id.in_(old_ids),
+            KnowledgeBase.is_active == True
+        ).count() < len(old_ids):
+            return "context_removed"
+        if context_change_ratio(row.context_versions, versions) >= config.PRESET_ANSWER_CHANGE_THRESHOLD:
+            return "context_changed"
+        generated_at = row.generated_at
+        if generated_at is not None:
+            if generated_at.tzinfo is None:
+                generated_at = generated_at.replace(tzinfo=timezone.utc)
+            if now - generated_at.timestamp() > config.PRESET_ANSWER_MAX_AGE:
+                return "expired"
+        return None
+
+    async def refresh(self, db: Session, limit: Optional[int] = None) -> Dict[str, Any]:
+        """检查所有启用的预设问题，按点击次数优先重新生成需要刷新的答案"""
+        # 避免循环导入（KnowledgeService 在问答时查找预生成答案）
+        from app.services.knowledge_service import KnowledgeService
+
+        async with self._lock:
+            started = time.monotonic()
+            presets = db.query(PresetQuestion).filter(PresetQuestion.is_active == True).order_by(
+                PresetQuestion.click_count.desc(), PresetQuestion.order_index, PresetQuestion.id
+            ).all()
+            rows = {row.preset_question_id: row for row in db.query(PresetAnswer)}
+            budget = limit or config.PRESET_ANSWER_BATCH
+            now = time.time()
+            reasons: Dict[str, int] = {}
+            regenerated = 0
+
+            pending = set()
+
+            for preset in presets:
+                context_items, knowledge_ids, _ = KnowledgeService.build_qa_context(db, preset.question)
+                versions = KnowledgeService.qa_context_versions(db, knowledge_ids)
+                row = rows.get(preset.id)
+                reason = self._refresh_reason(db, preset, row, versions, now)
+                if reason is None:
+                    continue
+                if regenerated >= budget:
+                    # 本轮额度已用完，下一轮再生成；过期答案在此之前不再使用
+                    pending.add(preset.id)
+                    continue
+
+                context = "\n\n=== 分隔符 ===\n\n".join(context_items)
+                generation_started = time.monotonic()
+                try:
+                    answer = await KnowledgeService._generate_answer_with_openai(
+                        preset.question, context, len(context_items), priority=Priority.BATCH
+                    )
+                except Exception as e:
+                    self.failures += 1
+                    logger.warning(f"预设问题 {preset.id} 答案生成失败: {e}")
+                    pending.add(preset.id)
+                    continue
+
+                if row is None:
+                    row = PresetAnswer(preset_question_id=preset.id)
+                    db.add(row)
+                row.question = preset.question
+                row.answer = answer
+                row.context_versions = [list(pair) for pair in versions]
+                row.context_fingerprint = context_fingerprint(versions, context)
+                row.generation_time = int((time.monotonic() - generation_started) * 1000)
+                row.generated_at = datetime.now(timezone.utc)
+                db.commit()
+                regenerated += 1
+                self.generated += 1
+                reasons[reason] = reasons.get(reason, 0) + 1
+
+            self.load(db, exclude=pending)
+            result = {
+                "presets": len(presets),
+                "regenerated": regenerated,
+                "pending": len(pending),
+                "reasons": reasons,
+                "elapsed": round(time.monotonic() - started, 3)
+            }
+            if regenerated:
+                self.last_refresh = {**result, "finished_at": now}
+                logger.info(f"预设问题答案刷新完成: {result}")
+            return result
+
+    def start_refresh(self, limit: Optional[int] = None) -> Tuple[Dict[str, Any], bool]:
+        """在后台执行一轮刷新，返回 (刷新状态, 是否新启动)；已有手动刷新在运行时不重复启动"""
+        return self.manual_job.start(lambda: self._run_manual_refresh(limit), limit=limit)
+
+    async def _run_manual_refresh(self, limit: Optional[int]) -> Dict[str, Any]:
+        db = SessionLocal()
+        try:
+            return await self.refresh(db, limit)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "answers": len(self._answers),
+            "hits": self.hits,
+            "generated": self.generated,
+            "failures": self.failures,
+            "last_refresh": self.last_refresh,
+            "manual_refresh": self.manual_job.state
+        }
+
+# 全局预设问题答案实例
+preset_answers = PresetAnswerService()
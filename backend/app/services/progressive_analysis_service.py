@@ -0,0 +1,163 @@
+"""
+渐进式文档分析
+
+上传时先返回本地分析引擎生成的初步结果，LLM分析在后台进行，
+完成后替换结果文件和知识库条目。客户端可以轮询或订阅（SSE）升级后的结果。
+
+任务状态：
+- preliminary：仅有本地初步结果
+- upgrading：LLM分析进行中
+- completed：已替换为LLM分析结果
+- degraded：LLM不可用，保留本地结果
+- failed：后台分析出错，保留本地结果
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from app.services.local_analysis_service import is_local_analysis
+
+logger = logging.getLogger(__name__)
+
+# 已结束的任务保留时间（秒）与最多保留的任务数
+JOB_TTL_SECONDS = 3600
+MAX_JOBS = 1000
+
+FINISHED_STATUSES = {"completed", "degraded", "failed"}
+
+@dataclass
+class AnalysisJob:
+    """一次渐进式分析任务"""
+    id: str
+    kind: str  # plain 或 xml，对应 analysis 字段的格式
+    analysis: str
+    structured_analysis: Optional[Dict[str, Any]]
+    knowledge_id: Optional[int] = None
+    result_file: Optional[str] = None
+    status: str = "preliminary"
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def update(self, **changes):
+        for name, value in changes.items():
+            setattr(self, name, value)
+        self.updated_at = time.time()
+        # 唤醒当前所有订阅者，并为下一轮等待换一个新的事件
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "analysis_id": self.id,
+            "status": self.status,
+            "kind": self.kind,
+            "analysis": self.analysis,
+            "structured_analysis": self.structured_analysis,
+            "knowledge_id": self.knowledge_id,
+            "result_file": self.result_file,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+
+class ProgressiveAnalysisRegistry:
+    """渐进式分析任务登记（进程内）"""
+
+    def __init__(self):
+        self._jobs: Dict[str, AnalysisJob] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def create(
+        self,
+        kind: str,
+        analysis: str,
+        structured_analysis: Optional[Dict[str, Any]],
+        knowledge_id: Optional[int] = None,
+        result_file: Optional[str] = None
+    ) -> AnalysisJob:
+        self._evict()
+        job = AnalysisJob(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            analysis=analysis,
+            structured_analysis=structured_analysis,
+            knowledge_id=knowledge_id,
+            result_file=result_file
+        )
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        return self._jobs.get(job_id)
+
+    def start_upgrade(
+        self,
+        job: AnalysisJob,
+        analyze: Callable[[], Awaitable[Tuple[str, Optional[Dict[str, Any]]]]],
+        on_upgraded: Callable[[str, Optional[Dict[str, Any]]], None]
+    ):
+        """在后台运行LLM分析；on_upgraded在线程池中执行（写文件、更新数据库）"""
+        task = asyncio.create_task(self._upgrade(job, analyze, on_upgraded))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _upgrade(self, job: AnalysisJob, analyze, on_upgraded):
+        job.update(status="upgrading")
+        try:
+            analysis, structured_analysis = await analyze()
+            if is_local_analysis(analysis):
+                job.update(status="degraded")
+                return
+
+            await asyncio.to_thread(on_upgraded, analysis, structured_analysis)
+            job.update(status="completed", analysis=analysis, structured_analysis=structured_analysis)
+            logger.info(f"渐进式分析 {job.id} 已升级为LLM结果")
+        except Exception as e:
+            logger.error(f"渐进式分析 {job.id} 升级失败: {e}")
+            job.update(status="failed", error=str(e))
+
+    async def watch(self, job: AnalysisJob) -> AsyncIterator[AnalysisJob]:
+        """先产出当前状态，之后每次状态变化产出一次，任务结束后停止"""
+        while True:
+            changed = job._changed
+            yield job
+            if job.finished:
+                return
+            await changed.wait()
+
+    def _evict(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and now - job.updated_at > JOB_TTL_SECONDS
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+        # 超出上限时优先淘汰最早的已结束任务
+        if len(self._jobs) >= MAX_JOBS:
+            finished = sorted(
+                (job for job in self._jobs.values() if job.finished),
+                key=lambda job: job.updated_at
+            )
+            for job in finished[:len(self._jobs) - MAX_JOBS + 1]:
+                del self._jobs[job.id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        statuses: Dict[str, int] = {}
+        for job in self._jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {"jobs": len(self._jobs), "running": len(self._tasks), "statuses": statuses}
+
+# 全局渐进式分析任务登记
+progressive_analysis = ProgressiveAnalysisRegistry()
@@ -0,0 +1,193 @@
+"""
+检索质量与延迟离线评测
+
+给定标注集（问题 -> 相关知识ID），用问答实际使用的上下文构建方式（KnowledgeService.build_qa_context
+的各个模式）逐题检索，并排比较：
+- recall@k：前k个上下文文档覆盖的相关文档比例（按题平均）；
+- MRR：第一个相关文档排名的倒数（按题平均）；
+- prompt tokens：按上下文拼出的问答prompt的估算token数（按题平均），不调用模型；
+- 检索延迟 p50 / p95（毫秒）；
+- 回退次数：请求的模式不可用（如摘要树尚未构建）而退回检索的题数。
+标注集可以从 JSON 文件读取，也可以用 knowledge_qa 中标记为有帮助（is_helpful=True）的问答记录生成。
+"""
+
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.models.knowledge_base import KnowledgeBase, KnowledgeQA
+from app.services.answer_cache_service import normalize_question
+from app.utils.token_utils import estimate_messages_tokens
+
+logger = logging.getLogger(__name__)
+
+# 参与评测的上下文构建模式（与 KnowledgeQACreate.mode 一致）
+STRATEGIES = ["search", "tree"]
+
+DEFAULT_KS = (1, 3, 5)
+
+@dataclass
+class EvalCase:
+    question: str
+    relevant_ids: List[int]
+
+@dataclass
+class StrategyResult:
+    strategy: str
+    recall: Dict[int, float] = field(default_factory=dict)
+    mrr: float = 0.0
+    prompt_tokens: float = 0.0
+    latency_p50: Optional[float] = None
+    latency_p95: Optional[float] = None
+    empty: int = 0
+    fallbacks: int = 0
+
+def percentile(samples: Sequence[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def recall_at_k(retrieved: List[int], relevant: Sequence[int], k: int) -> float:
+    relevant_set = set(relevant)
+    if not relevant_set:
+        return 0.0
+    return len(relevant_set & set(retrieved[:k])) / len(relevant_set)
+
+def reciprocal_rank(retrieved: List[int], relevant: Sequence[int]) -> float:
+    relevant_set = set(relevant)
+    for rank, knowledge_id in enumerate(retrieved, start=1):
+        if knowledge_id in relevant_set:
+            return 1.0 / rank
+    return 0.0
+
+def load_cases(path: str) -> List[EvalCase]:
+    """读取标注集：JSON 数组或每行一个 JSON 对象，字段为 question 和 relevant_ids"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        rows = json.loads(text)
+    else:
+        rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+    cases = []
+    for row in rows:
+        relevant_ids = [int(knowledge_id) for knowledge_id in row.get("relevant_ids") or []]
+        if row.get("question") and relevant_ids:
+            cases.append(EvalCase(row["question"], relevant_ids))
+    return cases
+
+def save_cases(cases: List[EvalCase], path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([asdict(case) for case in cases], f, ensure_ascii=False, indent=2)
+
+def seed_cases_from_feedback(db: Session, limit: Optional[int] = None) -> List[EvalCase]:
+    """用标记为有帮助的问答记录生成标注集：同一问题（归一化后）的记录合并，相关文档取其关联的知识ID"""
+    query = db.query(KnowledgeQA.question, KnowledgeQA.knowledge_id).join(
+        KnowledgeBase, KnowledgeBase.id == KnowledgeQA.knowledge_id
+    ).filter(
+        KnowledgeQA.is_helpful == True,
+        KnowledgeBase.is_active == True
+    ).order_by(KnowledgeQA.created_at.desc(), KnowledgeQA.id.desc())
+
+    grouped: "OrderedDict[str, EvalCase]" = OrderedDict()
+    for question, knowledge_id in query:
+        key = normalize_question(question)
+        if not key:
+            continue
+        case = grouped.get(key)
+        if case is None:
+            if limit is not None and len(grouped) >= limit:
+                continue
+            case = grouped[key] = EvalCase(question, [])
+        if knowledge_id not in case.relevant_ids:
+            case.relevant_ids.append(knowledge_id)
+    return list(grouped.values())
+
+def evaluate(
+    db: Session,
+    cases: List[EvalCase],
+    strategies: Optional[List[str]] = None,
+    ks: Sequence[int] = DEFAULT_KS,
+    repeat: int = 1
+) -> Dict[str, Any]:
+    """逐题运行各模式的上下文构建并计算指标；repeat>1 时每题重复检索，只影响延迟统计"""
+    # 避免循环导入（KnowledgeService 依赖的服务较多，评测只在离线脚本中使用）
+    from app.services.knowledge_service import KnowledgeService
+
+    results = []
+    for strategy in strategies or STRATEGIES:
+        if strategy not in STRATEGIES:
+            raise ValueError(f"未知的检索模式: {strategy}")
+        result = StrategyResult(strategy, recall={k: 0.0 for k in ks})
+        latencies: List[float] = []
+        reciprocal_ranks = 0.0
+        prompt_tokens = 0
+
+        for case in cases:
+            for _ in range(max(1, repeat)):
+                started = time.perf_counter()
+                context_items, knowledge_ids, used_mode = KnowledgeService.build_qa_context(
+                    db, case.question, mode=strategy
+                )
+                latencies.append((time.perf_counter() - started) * 1000)
+
+            if used_mode != strategy:
+                result.fallbacks += 1
+            if not context_items:
+                result.empty += 1
+            # 同一文档可能出现在多个上下文片段中，排名按首次出现计算
+            ranked = list(dict.fromkeys(knowledge_ids))
+            for k in ks:
+                result.recall[k] += recall_at_k(ranked, case.relevant_ids, k)
+            reciprocal_ranks += reciprocal_rank(ranked, case.relevant_ids)
+            context = "\n\n=== 分隔符 ===\n\n".join(context_items)
+            prompt_tokens += estimate_messages_tokens(
+                KnowledgeService._build_qa_messages(case.question, context, len(context_items))
+            )
+
+        count = len(cases)
+        if count:
+            result.recall = {k: round(total / count, 4) for k, total in result.recall.items()}
+            result.mrr = round(reciprocal_ranks / count, 4)
+            result.prompt_tokens = round(prompt_tokens / count, 1)
+        p50, p95 = percentile(latencies, 0.5), percentile(latencies, 0.95)
+        result.latency_p50 = round(p50, 2) if p50 is not None else None
+        result.latency_p95 = round(p95, 2) if p95 is not None else None
+        results.append(result)
+        logger.info(f"检索模式 {strategy} 评测完成: MRR={result.mrr}")
+
+    return {
+        "cases": len(cases),
+        "ks": list(ks),
+        "repeat": max(1, repeat),
+        "strategies": [asdict(result) for result in results]
+    }
+
+def format_report(report: Dict[str, Any]) -> str:
+    """把评测结果排成并列比较的表格"""
+    ks = report["ks"]
+    headers = ["模式"] + [f"recall@{k}" for k in ks] + ["MRR", "prompt tokens", "p50(ms)", "p95(ms)", "无上下文", "回退"]
+    rows = []
+    for result in report["strategies"]:
+        rows.append(
+            [result["strategy"]]
+            + [f"{result['recall'][k]:.3f}" for k in ks]
+            + [
+                f"{result['mrr']:.3f}",
+                f"{result['prompt_tokens']:.1f}",
+                "-" if result["latency_p50"] is None else f"{result['latency_p50']:.2f}",
+                "-" if result["latency_p95"] is None else f"{result['latency_p95']:.2f}",
+                str(result["empty"]),
+                str(result["fallbacks"])
+            ]
+        )
+    widths = [max(len(str(row[index])) for row in [headers] + rows) for index in range(len(headers))]
+    lines = [f"标注问题数: {report['cases']}（每题检索 {report['repeat']} 次）"]
+    for row in [headers] + rows:
+        lines.append("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)))
+    return "\n".join(lines)
@@ -0,0 +1,489 @@
+"""
+知识库层次摘要树
+
+分块 → 文档 → 主题簇 → 语料 四层摘要，由后台任务增量构建：
+- 新增或修订过（修订号变化）的文档重新生成分块摘要和文档摘要，已失效条目的节点被删除；
+- 文档按关键词向量（语料TF-IDF关键词）与各簇关键词中心的余弦相似度归入主题簇，
+  都不够相似或簇已满时新建簇；
+- 只有成员变化的簇以及语料根节点重新生成摘要。
+摘要由模型以 INDEXING 优先级生成，未配置或调用失败时使用本地TextRank摘录。
+
+问答的 tree 模式自顶向下遍历：语料摘要 → 与问题相关的簇 → 簇内相关文档 → 文档内相关分块，
+每层只展开得分最高的几个节点，上下文token数有上限，与语料规模无关。
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session, aliased, selectinload
+
+from app.config.anti_blocking_config import config
+from app.models.database import SessionLocal
+from app.models.knowledge_base import KnowledgeBase, KnowledgeSummaryNode
+from app.services.llm_gateway import llm_gateway
+from app.services.llm_governor import Priority
+from app.services.local_analysis_service import extract_key_sentences
+from app.utils.background_job import BackgroundJob
+from app.utils.section_diff import split_sections
+from app.utils.text_tokenizer import split_sentences, tokenize
+from app.utils.token_utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+LEVEL_CHUNK = "chunk"
+LEVEL_DOCUMENT = "document"
+LEVEL_CLUSTER = "cluster"
+LEVEL_CORPUS = "corpus"
+
+SUMMARY_MODEL = "gpt-4o-mini"
+
+# 单次摘要调用的输入字符上限（超过时先用TextRank压缩）
+SUMMARY_INPUT_CHARS = 4000
+
+# 簇摘要中每个文档摘要保留的字符数
+CLUSTER_MEMBER_CHARS = 300
+
+# 分块和簇保存的关键词数
+CHUNK_KEYWORDS = 10
+CLUSTER_KEYWORDS = 30
+
+# tree模式下每个文档展开的分块数
+CHUNKS_PER_DOCUMENT = 2
+
+PROMPTS = {
+    LEVEL_CHUNK: "请用3-5句话概括以下企业文档片段的要点，保留具体的名称、数据和做法。",
+    LEVEL_DOCUMENT: "以下是一份企业文档各部分的要点，请概括为一段不超过200字的文档摘要，说明文档的主题和关键信息。",
+    LEVEL_CLUSTER: "以下是同一主题下多份企业文档的摘要，请概括这些文档的共同主题、常见做法和主要差异，不超过300字。",
+    LEVEL_CORPUS: "以下是知识库中各主题的摘要，请概括整个知识库涵盖的主题和共性内容，不超过300字。",
+}
+
+def keyword_vector(keywords: Optional[List[Dict[str, Any]]]) -> Dict[str, float]:
+    return {keyword["term"]: float(keyword["weight"]) for keyword in keywords or []}
+
+def cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if not a or not b:
+        return 0.0
+    dot = sum(weight * b[term] for term, weight in a.items() if term in b)
+    norm = math.sqrt(sum(w * w for w in a.values())) * math.sqrt(sum(w * w for w in b.values()))
+    return dot / norm if norm else 0.0
+
+def top_keywords(vector: Dict[str, float], limit: int) -> List[Dict[str, Any]]:
+    ranked = sorted(vector.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [{"term": term, "weight": round(weight, 6)} for term, weight in ranked]
+
+def centroid(vectors: List[Dict[str, float]]) -> Dict[str, float]:
+    total: Counter = Counter()
+    for vector in vectors:
+        total.update(vector)
+    return {term: weight / len(vectors) for term, weight in total.items()} if vectors else {}
+
+def text_keywords(text: str, limit: int = CHUNK_KEYWORDS) -> List[Dict[str, Any]]:
+    """按词频取文本关键词（分块没有语料级TF-IDF，使用归一化词频）"""
+    counts = Counter(tokenize(text))
+    total = sum(counts.values()) or 1
+    return [{"term": term, "weight": round(count / total, 6)} for term, count in counts.most_common(limit)]
+
+def chunk_document(text: str) -> List[str]:
+    """按段落边界切分文档，分块数不超过 SUMMARY_MAX_CHUNKS"""
+    sections = split_sections(text)
+    total = sum(len(section) for section in sections)
+    target = max(config.SUMMARY_CHUNK_CHARS, math.ceil(total / config.SUMMARY_MAX_CHUNKS))
+    chunks: List[str] = []
+    current = ""
+    for section in sections:
+        if current and len(current) + len(section) > target:
+            chunks.append(current)
+            current = ""
+        current += section
+    if current:
+        chunks.append(current)
+    return [chunk for chunk in chunks if chunk.strip()]
+
+def condense(text: str, limit: int) -> str:
+    """超过limit字符的文本用TextRank挑选关键句（保持原文顺序）压缩"""
+    if len(text) <= limit:
+        return text
+    sentences = split_sentences(text)
+    if not sentences:
+        return text[:limit]
+    average = sum(len(sentence) for sentence in sentences) / len(sentences)
+    indices = extract_key_sentences(sentences, top_k=max(3, int(limit / max(average, 1))))
+    return "".join(sentences[index] for index in indices)[:limit]
+
+def local_summary(text: str, length: int = 300) -> str:
+    """本地摘录：TextRank前几句"""
+    sentences = split_sentences(text)
+    if not sentences:
+        return text.strip()[:length]
+    return "".join(sentences[index] for index in extract_key_sentences(sentences, top_k=3))[:length]
+
+class SummaryTree:
+    """层次摘要树的构建和遍历"""
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self.last_build: Optional[Dict[str, Any]] = None
+        # 通过接口手动触发的构建（后台运行）及其状态
+        self.manual_job = BackgroundJob("摘要树手动构建")
+
+    async def summarize(self, text: str, level: str) -> str:
+        text = condense(text, SUMMARY_INPUT_CHARS)
+        if not text.strip():
+            return ""
+        if not llm_gateway.is_configured:
+            return local_summary(text)
+        try:
+            response = await asyncio.wait_for(
+                llm_gateway.complete(
+                    [
+                        {"role": "system", "content": PROMPTS[level]},
+                        {"role": "user", "content": text}
+                    ],
+                    model=SUMMARY_MODEL,
+                    priority=Priority.INDEXING,
+                    max_tokens=400,
+                    temperature=0.2
+                ),
+                timeout=config.OPENAI_QUEUE_TIMEOUT + config.OPENAI_TIMEOUT
+            )
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            logger.warning(f"摘要生成失败，使用本地摘录: {type(e).__name__}: {e}")
+            return local_summary(text)
+
+    # ---- 增量构建 ----
+
+    async def build(self, db: Session, limit: Optional[int] = None) -> Dict[str, Any]:
+        """执行一轮增量构建，返回本轮的处理数量"""
+        async with self._lock:
+            started = time.monotonic()
+            removed = self._remove_inactive_documents(db)
+            pending = self._pending_documents(db, limit or config.SUMMARY_TREE_BATCH)
+            for knowledge in pending:
+                await self._build_document(db, knowledge)
+            clusters = await self._refresh_clusters(db)
+            root_rebuilt = False
+            if removed or pending or clusters or self._root(db) is None:
+                root_rebuilt = await self._refresh_root(db)
+
+            result = {
+                "documents_removed": removed,
+                "documents_built": len(pending),
+                "clusters_refreshed": clusters,
+                "root_rebuilt": root_rebuilt,
+                "elapsed": round(time.monotonic() - started, 3)
+            }
+            if removed or pending or clusters:
+                self.last_build = {**result, "finished_at": time.time()}
+                logger.info(f"摘要树增量构建完成: {result}")
+            return result
+
+    def start_build(self, limit: Optional[int] = None) -> Tuple[Dict[str, Any], bool]:
+        """在后台执行一轮增量构建，返回 (构建状态, 是否新启动)；已有手动构建在运行时不重复启动"""
+        return self.manual_job.start(lambda: self._run_manual_build(limit), limit=limit)
+
+    async def _run_manual_build(self, limit: Optional[int]) -> Dict[str, Any]:
+        db = SessionLocal()
+        try:
+            return await self.build(db, limit)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _remove_inactive_documents(self, db: Session) -> int:
+        """删除已失效或已删除条目的文档节点，并标记所在簇需要更新"""
+        stale = db.query(KnowledgeSummaryNode).outerjoin(
+            KnowledgeBase, KnowledgeBase.id == KnowledgeSummaryNode.knowledge_id
+        ).filter(
+            KnowledgeSummaryNode.level == LEVEL_DOCUMENT,
+            or_(KnowledgeBase.id.is_(None), KnowledgeBase.is_active == False)
+        ).all()
+        for node in stale:
+            self._mark_stale(db, node.parent_id)
+            db.query(KnowledgeSummaryNode).filter(
+                KnowledgeSummaryNode.parent_id == node.id
+            ).delete(synchronize_session=False)
+            db.delete(node)
+        if stale:
+            db.commit()
+        return len(stale)
+
+    @staticmethod
+    def _pending_documents(db: Session, limit: int) -> List[KnowledgeBase]:
+        """还没有文档节点，或节点生成后条目又被修订过的有效条目"""
+        document = aliased(KnowledgeSummaryNode)
+        return db.query(KnowledgeBase).options(selectinload(KnowledgeBase.body)).outerjoin(
+            document,
+            and_(document.knowledge_id == KnowledgeBase.id, document.level == LEVEL_DOCUMENT)
+        ).filter(
+            KnowledgeBase.is_active == True,
+            or_(document.id.is_(None), document.source_version != KnowledgeBase.revision)
+        ).order_by(KnowledgeBase.id).limit(limit).all()
+
+    async def _build_document(self, db: Session, knowledge: KnowledgeBase):
+        chunks = chunk_document(knowledge.content)
+        chunk_summaries = list(await asyncio.gather(*[
+            self.summarize(chunk, LEVEL_CHUNK) for chunk in chunks
+        ]))
+        if len(chunk_summaries) == 1:
+            document_summary = chunk_summaries[0]
+        else:
+            document_summary = await self.summarize(
+                f"文档标题：{knowledge.title}\n" + "\n".join(f"- {summary}" for summary in chunk_summaries),
+                LEVEL_DOCUMENT
+            )
+        keywords = knowledge.ai_keywords or text_keywords(knowledge.content)
+
+        node = db.query(KnowledgeSummaryNode).filter(
+            KnowledgeSummaryNode.level == LEVEL_DOCUMENT,
+            KnowledgeSummaryNode.knowledge_id == knowledge.id
+        ).first()
+        if node is None:
+            node = KnowledgeSummaryNode(level=LEVEL_DOCUMENT, knowledge_id=knowledge.id)
+            node.parent_id = self._assign_cluster(db, keyword_vector(keywords))
+            db.add(node)
+        else:
+            # 修订过的文档保留所在的簇，分块重新生成
+            db.query(KnowledgeSummaryNode).filter(
+                KnowledgeSummaryNode.parent_id == node.id
+            ).delete(synchronize_session=False)
+        self._mark_stale(db, node.parent_id)
+
+        node.summary = document_summary
+        node.keywords = keywords
+        node.child_count = len(chunks)
+        node.source_version = knowledge.revision
+        db.flush()
+        db.add_all(
+            KnowledgeSummaryNode(
+                level=LEVEL_CHUNK,
+                parent_id=node.id,
+                knowledge_id=knowledge.id,
+                position=position,
+                summary=summary,
+                keywords=text_keywords(chunk)
+            )
+            for position, (chunk, summary) in enumerate(zip(chunks, chunk_summaries))
+        )
+        db.commit()
+
+    @staticmethod
+    def _assign_cluster(db: Session, vector: Dict[str, float]) -> int:
+        """归入关键词最相似且未满的簇（簇关键词按成员数滑动平均），否则新建簇"""
+        best, best_similarity = None, config.SUMMARY_CLUSTER_SIMILARITY
+        for cluster in db.query(KnowledgeSummaryNode).filter(
+            KnowledgeSummaryNode.level == LEVEL_CLUSTER,
+            KnowledgeSummaryNode.child_count < config.SUMMARY_CLUSTER_SIZE
+        ):
+            similarity = cosine(vector, keyword_vector(cluster.keywords))
+            if similarity >= best_similarity:
+                best, best_similarity = cluster, similarity
+
+        if best is None:
+            best = KnowledgeSummaryNode(level=LEVEL_CLUSTER, child_count=0, keywords=[])
+            db.add(best)
+        members = best.child_count or 0
+        merged = Counter({term: weight * members for term, weight in keyword_vector(best.keywords).items()})
+        merged.update(vector)
+        best.keywords = top_keywords({term: weight / (members + 1) for term, weight in merged.items()}, CLUSTER_KEYWORDS)
+        best.child_count = members + 1
+        best.is_stale = True
+        db.flush()
+        return best.id
+
+    @staticmethod
+    def _mark_stale(db: Session, node_id: Optional[int]):
+        if node_id is not None:
+            db.query(KnowledgeSummaryNode).filter(KnowledgeSummaryNode.id == node_id).update(
+                {KnowledgeSummaryNode.is_stale: True}, synchronize_session=False
+            )
+
+    async def _refresh_clusters(self, db: Session) -> int:
+        """重新生成成员变化过的簇的摘要和关键词，删除空簇"""
+        stale = db.query(KnowledgeSummaryNode).filter(
+            KnowledgeSummaryNode.level == LEVEL_CLUSTER,
+            KnowledgeSummaryNode.is_stale == True
+        ).all()
+        for cluster in stale:
+            members = db.query(KnowledgeSummaryNode, KnowledgeBase.title).join(
+                KnowledgeBase, KnowledgeBase.id == KnowledgeSummaryNode.knowledge_id
+            ).filter(
+                KnowledgeSummaryNode.parent_id == cluster.id,
+                KnowledgeSummaryNode.level == LEVEL_DOCUMENT
+            ).all()
+            if not members:
+                db.delete(cluster)
+                continue
+            cluster.summary = await self.summarize(
+                "\n".join(f"《{title}》{node.summary[:CLUSTER_MEMBER_CHARS]}" for node, title in members),
+                LEVEL_CLUSTER
+            )
+            cluster.keywords = top_keywords(
+                centroid([keyword_vector(node.keywords) for node, _ in members]), CLUSTER_KEYWORDS
+            )
+            cluster.child_count = len(members)
+            cluster.is_stale = False
+        if stale:
+            db.commit()
+        return len(stale)
+
+    @staticmethod
+    def _root(db: Session) -> Optional[KnowledgeSummaryNode]:
+        return db.query(KnowledgeSummaryNode).filter(KnowledgeSummaryNode.level == LEVEL_CORPUS).first()
+
+    async def _refresh_root(self, db: Session) -> bool:
+        clusters = db.query(KnowledgeSummaryNode).filter(
+            KnowledgeSummaryNode.level == LEVEL_CLUSTER
+        ).order_by(KnowledgeSummaryNode.child_count.desc()).all()
+        root = self._root(db)
+        if not clusters:
+            if root is not None:
+                db.delete(root)
+                db.commit()
+            return False
+
+        if root is None:
+            root = KnowledgeSummaryNode(level=LEVEL_CORPUS)
+            db.add(root)
+        root.summary = await self.summarize(
+            "\n".join(f"主题（{cluster.child_count}个文档）：{cluster.summary}" for cluster in clusters),
+            LEVEL_CORPUS
+        )
+        root.keywords = top_keywords(
+            centroid([keyword_vector(cluster.keywords) for cluster in clusters]), CLUSTER_KEYWORDS
+        )
+        root.child_count = len(clusters)
+        root.is_stale = False
+        db.commit()
+        return True
+
+    # ---- 问答遍历 ----
+
+    @staticmethod
+    def _score(node: KnowledgeSummaryNode, terms: Set[str]) -> float:
+        """相关性 = 命中的关键词权重占比 + 摘要中出现的查询词占比"""
+        if not terms:
+            return 0.0
+        vector = keyword_vector(node.keywords)
+        total = sum(vector.values()) or 1.0
+        keyword_score = sum(weight for term, weight in vector.items() if term in terms) / total
+        summary_terms = set(tokenize(node.summary))
+        return keyword_score + len(terms & summary_terms) / len(terms)
+
+    def _rank(self, nodes: List[Any], terms: Set[str], key=lambda item: item) -> List[Any]:
+        scored = [(self._score(key(item), terms), index, item) for index, item in enumerate(nodes)]
+        return [item for score, _, item in sorted(scored, key=lambda entry: (-entry[0], entry[1])) if score > 0]
+
+    def build_context(
+        self,
+        db: Session,
+        question: str,
+        token_budget: Optional[int] = None
+    ) -> Tuple[List[str], List[int]]:
+        """自顶向下选取问答上下文，返回 (上下文片段, 涉及的知识ID)；树尚未构建时返回空列表"""
+        root = self._root(db)
+        if root is None:
+            return [], []
+
+        budget = token_budget or config.SUMMARY_TREE_CONTEXT_TOKENS
+        beam = config.SUMMARY_TREE_BEAM
+        terms = set(tokenize(question))
+        parts: List[str] = []
+        knowledge_ids: List[int] = []
+        spent = 0
+
+        def add(text: str) -> bool:
+            nonlocal spent
+            cost = estimate_tokens(text)
+            if spent + cost > budget:
+                return False
+            parts.append(text)
+            spent += cost
+            return True
+
+        add(f"知识库整体概况（{root.child_count}个主题）：\n{root.summary}")
+        clusters = db.query(KnowledgeSummaryNode).filter(
+            KnowledgeSummaryNode.level == LEVEL_CLUSTER
+        ).order_by(KnowledgeSummaryNode.child_count.desc()).all()
+
+        relevant_clusters = self._rank(clusters, terms)[:beam]
+        if not relevant_clusters:
+            # 没有明显相关的主题（宽泛问题）：按规模列出主题摘要，不再向下展开；
+            # 涉及的知识ID为这些摘要覆盖的簇成员
+            listed = []
+            for cluster in clusters:
+                if not add(f"主题（{cluster.child_count}个文档）：\n{cluster.summary}"):
+                    break
+                listed.append(cluster)
+            return parts, self._cluster_members(db, listed)
+
+        for cluster in relevant_clusters:
+            add(f"主题（{cluster.child_count}个文档）：\n{cluster.summary}")
+
+        documents = db.query(KnowledgeSummaryNode, KnowledgeBase.title).join(
+            KnowledgeBase, KnowledgeBase.id == KnowledgeSummaryNode.knowledge_id
+        ).filter(
+            KnowledgeSummaryNode.parent_id.in_([cluster.id for cluster in relevant_clusters]),
+            KnowledgeSummaryNode.level == LEVEL_DOCUMENT,
+            KnowledgeBase.is_active == True
+        ).all()
+        relevant_documents = []
+        for cluster in relevant_clusters:
+            members = [row for row in documents if row[0].parent_id == cluster.id]
+            relevant_documents.extend(self._rank(members, terms, key=lambda row: row[0])[:beam])
+
+        for node, title in relevant_documents:
+            if add(f"文档标题: {title}\n文档摘要: {node.summary}"):
+                knowledge_ids.append(node.knowledge_id)
+
+        chunks = db.query(KnowledgeSummaryNode).filter(
+            KnowledgeSummaryNode.parent_id.in_([node.id for node, _ in relevant_documents]),
+            KnowledgeSummaryNode.level == LEVEL_CHUNK
+        ).all() if relevant_documents else []
+        for node, title in relevant_documents:
+            members = [chunk for chunk in chunks if chunk.parent_id == node.id]
+            for chunk in self._rank(members, terms)[:CHUNKS_PER_DOCUMENT]:
+                add(f"文档标题: {title}（第{chunk.position + 1}部分）\n要点: {chunk.summary}")
+
+        if not knowledge_ids:
+            # 簇内没有相关文档（或预算不足以放入文档摘要）时，上下文只有簇摘要
+            knowledge_ids = self._cluster_members(db, relevant_clusters)
+        return parts, knowledge_ids
+
+    @staticmethod
+    def _cluster_members(db: Session, clusters: List[KnowledgeSummaryNode]) -> List[int]:
+        """簇内仍有效的文档的知识ID，按簇的顺序"""
+        if not clusters:
+            return []
+        rows = db.query(KnowledgeSummaryNode.parent_id, KnowledgeSummaryNode.knowledge_id).join(
+            KnowledgeBase, KnowledgeBase.id == KnowledgeSummaryNode.knowledge_id
+        ).filter(
+            KnowledgeSummaryNode.parent_id.in_([cluster.id for cluster in clusters]),
+            KnowledgeSummaryNode.level == LEVEL_DOCUMENT,
+            KnowledgeBase.is_active == True
+        ).order_by(KnowledgeSummaryNode.knowledge_id).all()
+        order = {cluster.id: index for index, cluster in enumerate(clusters)}
+        return [knowledge_id for _, knowledge_id in sorted(rows, key=lambda row: order[row[0]])]
+
+    def get_stats(self, db: Session) -> Dict[str, Any]:
+        counts = dict(
+            db.query(KnowledgeSummaryNode.level, func.count(KnowledgeSummaryNode.id))
+            .group_by(KnowledgeSummaryNode.level).all()
+        )
+        root = self._root(db)
+        return {
+            "nodes": {level: counts.get(level, 0) for level in (LEVEL_CORPUS, LEVEL_CLUSTER, LEVEL_DOCUMENT, LEVEL_CHUNK)},
+            "corpus_summary": root.summary if root else None,
+            "last_build": self.last_build,
+            "manual_build": self.manual_job.state
+        }
+
+# 全局摘要树实例
+summary_tree = SummaryTree()
@@ -0,0 +1,208 @@
+"""
+自动标签提取
+
+标签词典由三部分合并而成：内置的企业常用词、TAG_DICTIONARY_PATH 指向的词典文件、
+knowledge_tags 表中的全部标签名。词典编译为一个 Aho–Corasick 自动机，
+对每段文本只扫描一遍即可找出所有词典词，不需要拼接内容和分析结果。
+命中的标签按出现次数和首次出现位置综合排序。
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config.anti_blocking_config import config
+from app.models.knowledge_base import KnowledgeTag
+
+logger = logging.getLogger(__name__)
+
+# 内置的企业常用标签词
+DEFAULT_TAG_TERMS = [
+    "管理", "团队", "项目", "战略", "营销", "销售", "财务", "人力资源",
+    "技术", "创新", "客户", "市场", "产品", "服务", "质量", "效率",
+    "培训", "绩效", "流程", "制度", "文化", "领导力", "沟通", "协作"
+]
+
+# 首次出现位置的加权：出现在文本开头的标签得分最多提高一半
+POSITION_WEIGHT = 0.5
+
+class AhoCorasickAutomaton:
+    """多模式串匹配自动机（英文按小写匹配）"""
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 每个状态可输出的模式串（含沿失败链继承的），存为 (模式串, 长度)
+        self._output: List[List[Tuple[str, int]]] = [[]]
+        self.size = 0
+        for pattern in patterns:
+            self.add(pattern)
+        self.build()
+
+    def add(self, pattern: str):
+        pattern = pattern.strip()
+        if not pattern:
+            return
+        state = 0
+        for char in pattern.lower():
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        if not any(existing == pattern for existing, _ in self._output[state]):
+            self._output[state].append((pattern, len(pattern)))
+            self.size += 1
+
+    def build(self):
+        """广度优先计算失败指针，并合并失败链上的输出"""
+        queue = deque(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """单遍扫描，产出 (起始位置, 模式串)"""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for index, char in enumerate(text.lower()):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern, length in output[state]:
+                yield index - length + 1, pattern
+
+@dataclass
+class TagMatch:
+    """一个标签在文本中的命中情况"""
+    tag: str
+    count: int
+    first_position: int
+
+class TagExtractor:
+    """基于编译后词典的标签提取器"""
+
+    def __init__(self, terms: Iterable[str]):
+        self.automaton = AhoCorasickAutomaton(terms)
+
+    def match(self, *texts: Optional[str]) -> List[TagMatch]:
+        """依次扫描各段文本（位置按各段长度累加），返回按得分排序的命中标签
+
+        同一位置重叠的词只保留最长的（如“人力资源”不再计为“资源”）
+        """
+        matches: Dict[str, TagMatch] = {}
+        offset = 0
+        for text in texts:
+            if not text:
+                continue
+            covered_until = -1
+            for start, end, tag in self._longest_matches(text):
+                if start < covered_until:
+                    continue
+                covered_until = end
+                position = offset + start
+                found = matches.get(tag)
+                if found:
+                    found.count += 1
+                else:
+                    matches[tag] = TagMatch(tag, 1, position)
+            offset += len(text)
+
+        total_length = max(offset, 1)
+
+        def score(match: TagMatch) -> float:
+            return match.count * (1.0 + POSITION_WEIGHT * (1.0 - match.first_position / total_length))
+
+        return sorted(matches.values(), key=lambda match: (-score(match), match.first_position))
+
+    def extract(self, *texts: Optional[str], limit: int = 5) -> List[str]:
+        return [match.tag for match in self.match(*texts)[:limit]]
+
+    def _longest_matches(self, text: str) -> List[Tuple[int, int, str]]:
+        """自动机按结束位置产出命中，这里转为按起始位置排序、同起点长词优先"""
+        found = [(start, start + len(tag), tag) for start, tag in self.automaton.iter_matches(text)]
+        found.sort(key=lambda item: (item[0], -item[1]))
+        return found
+
+class TagDictionary:
+    """标签词典：定期从数据库重新加载并重新编译自动机"""
+
+    def __init__(self, refresh_interval: float, dictionary_path: str = ""):
+        self.refresh_interval = refresh_interval
+        self.dictionary_path = dictionary_path
+        # 数据库中的标签在首次提取时加载
+        self._extractor = TagExtractor(DEFAULT_TAG_TERMS + self._load_file_terms())
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def extractor(self) -> TagExtractor:
+        return self._extractor
+
+    def get_extractor(self, db: Optional[Session] = None) -> TagExtractor:
+        """返回当前的提取器；距上次加载超过刷新间隔时先从数据库重新加载"""
+        if db is not None and time.monotonic() - self._loaded_at > self.refresh_interval:
+            self.reload(db)
+        return self._extractor
+
+    def reload(self, db: Optional[Session] = None):
+        """重新编译词典（编译完成后整体替换，扫描中的请求不受影响）"""
+        with self._lock:
+            terms = list(DEFAULT_TAG_TERMS)
+            terms.extend(self._load_file_terms())
+            if db is not None:
+                terms.extend(self._load_db_terms(db))
+            self._extractor = TagExtractor(terms)
+            self._loaded_at = time.monotonic()
+        logger.info(f"标签词典已加载，共 {self._extractor.automaton.size} 个词")
+
+    def _load_file_terms(self) -> List[str]:
+        if not self.dictionary_path or not os.path.exists(self.dictionary_path):
+            return []
+        try:
+            with open(self.dictionary_path, "r", encoding="utf-8") as f:
+                return [
+                    line.strip() for line in f
+                    if line.strip() and not line.lstrip().startswith("#")
+                ]
+        except OSError as e:
+            logger.warning(f"读取标签词典文件失败: {e}")
+            return []
+
+    def _load_db_terms(self, db: Session) -> List[str]:
+        try:
+            return [name for (name,) in db.query(KnowledgeTag.name).all() if name]
+        except Exception as e:
+            logger.warning(f"从knowledge_tags加载标签失败: {e}")
+            return []
+
+    def get_stats(self) -> Dict[str, object]:
+        return {
+            "terms": self._extractor.automaton.size,
+            "loaded_seconds_ago": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+            "dictionary_path": self.dictionary_path or None
+        }
+
+# 全局标签词典
+tag_dictionary = TagDictionary(
+    refresh_interval=config.TAG_DICTIONARY_REFRESH,
+    dictionary_path=config.TAG_DICTIONARY_PATH
+)
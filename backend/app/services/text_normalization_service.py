@@ -0,0 +1,161 @@
+"""
+文本规范化服务
+
+在文本提取之后、写入知识库和构建prompt之前运行：
+- 按出现频率识别每页首尾跨页重复的页眉、页脚、水印行并删除
+- 删除每页首尾的独立页码行
+- 合并英文断词连字符
+- 压缩行内空格（保留制表符，表格列依赖它分隔）
+
+页面正文中的行不做删除，避免误删正文里重复出现的短句或表格中的数值行。
+"""
+
+import re
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from app.utils.token_utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# 文本提取时使用的分页符
+PAGE_BREAK = "\f"
+
+# 行在多少比例的页面中出现即视为页眉/页脚/水印
+REPEAT_LINE_RATIO = 0.5
+# 至少需要多少页才进行重复行检测
+MIN_PAGES_FOR_REPEAT_DETECTION = 3
+# 超过该长度的行不会被视为页眉页脚
+MAX_BOILERPLATE_LINE_LENGTH = 100
+# 每页首尾各多少个非空行视为页眉页脚区域
+EDGE_LINES_PER_PAGE = 2
+
+_PAGE_NUMBER_PATTERN = re.compile(
+    r"^\s*("
+    r"第\s*\d+\s*页(\s*[,，/]?\s*共\s*\d+\s*页)?"
+    r"|[-–—]?\s*\d{1,4}\s*[-–—]?"
+    r"|page\s+\d+(\s+of\s+\d+)?"
+    r"|\d+\s*/\s*\d+"
+    r")\s*$",
+    re.IGNORECASE
+)
+_DIGITS_PATTERN = re.compile(r"\d+")
+_INLINE_SPACE_PATTERN = re.compile(r"[ \u00a0\u3000]+")
+_HYPHENATION_PATTERN = re.compile(r"([A-Za-z])-\n[ \t]*([a-z])")
+_BLANK_LINES_PATTERN = re.compile(r"\n{3,}")
+
+@dataclass
+class NormalizationResult:
+    """规范化结果及节省统计"""
+    text: str
+    original_chars: int
+    normalized_chars: int
+    original_tokens: int
+    normalized_tokens: int
+    removed_lines: int
+
+    @property
+    def saved_chars(self) -> int:
+        return self.original_chars - self.normalized_chars
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.normalized_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "original_chars": self.original_chars,
+            "normalized_chars": self.normalized_chars,
+            "saved_chars": self.saved_chars,
+            "original_tokens": self.original_tokens,
+            "normalized_tokens": self.normalized_tokens,
+            "saved_tokens": self.saved_tokens,
+            "removed_lines": self.removed_lines
+        }
+
+def _line_signature(line: str) -> str:
+    """页眉页脚区域的行签名：忽略空白和数字差异（如“第3页”与“第4页”）"""
+    return _DIGITS_PATTERN.sub("#", _INLINE_SPACE_PATTERN.sub(" ", line.strip()))
+
+def _edge_line_indexes(lines: List[str]) -> set:
+    """返回页面首尾若干非空行（页眉页脚区域）的行号"""
+    non_empty = [index for index, line in enumerate(lines) if line.strip()]
+    return set(non_empty[:EDGE_LINES_PER_PAGE] + non_empty[-EDGE_LINES_PER_PAGE:])
+
+def _find_repeated_lines(pages: List[List[str]]) -> set:
+    """找出在大多数页面的页眉页脚区域重复出现的短行，返回其签名"""
+    if len(pages) < MIN_PAGES_FOR_REPEAT_DETECTION:
+        return set()
+
+    frequency = Counter()
+    for lines in pages:
+        frequency.update({
+            _line_signature(lines[index])
+            for index in _edge_line_indexes(lines)
+            if len(lines[index].strip()) <= MAX_BOILERPLATE_LINE_LENGTH
+        })
+
+    threshold = max(2, int(len(pages) * REPEAT_LINE_RATIO + 0.5))
+    return {signature for signature, count in frequency.items() if count >= threshold}
+
+def normalize_document_text(text: str) -> NormalizationResult:
+    """规范化提取出的文档文本，并统计节省的字符与token"""
+    original_tokens = estimate_tokens(text)
+
+    pages = [page.split("\n") for page in text.split(PAGE_BREAK)]
+    repeated = _find_repeated_lines(pages)
+    # 只有分页文档（PDF、PPTX）才删除页码行
+    strip_page_numbers = len(pages) > 1
+
+    removed_lines = 0
+    kept_pages = []
+    for lines in pages:
+        edge_indexes = _edge_line_indexes(lines)
+        kept = []
+        for index, line in enumerate(lines):
+            # 只在页面首尾（页眉页脚区域）删除页码和重复行
+            if index in edge_indexes and (
+                (strip_page_numbers and _PAGE_NUMBER_PATTERN.match(line))
+                or _line_signature(line) in repeated
+            ):
+                removed_lines += 1
+                continue
+            kept.append(line)
+        kept_pages.append("\n".join(kept))
+
+    normalized = "\n\n".join(kept_pages)
+    normalized = _HYPHENATION_PATTERN.sub(r"\1\2", normalized)
+    normalized = "\n".join(
+        _INLINE_SPACE_PATTERN.sub(" ", line).strip() for line in normalized.split("\n")
+    )
+    normalized = _BLANK_LINES_PATTERN.sub("\n\n", normalized).strip()
+
+    result = NormalizationResult(
+        text=normalized,
+        original_chars=len(text),
+        normalized_chars=len(normalized),
+        original_tokens=original_tokens,
+        normalized_tokens=estimate_tokens(normalized),
+        removed_lines=removed_lines
+    )
+
+    if result.saved_chars > 0:
+        logger.info(
+            f"文本规范化完成：节省 {result.saved_chars} 字符 / 约 {result.saved_tokens} tokens，"
+            f"删除重复行 {removed_lines} 行"
+        )
+    return result
+
+def summarize_normalization(results: List[NormalizationResult]) -> Dict[str, Any]:
+    """汇总多个文档的规范化统计（批量上传使用）"""
+    keys = [
+        "original_chars", "normalized_chars", "saved_chars",
+        "original_tokens", "normalized_tokens", "saved_tokens", "removed_lines"
+    ]
+    summary = {key: 0 for key in keys}
+    for result in results:
+        for key, value in result.to_dict().items():
+            summary[key] += value
+    return summary
@@ -0,0 +1,44 @@
+"""
+后台管理任务
+
+管理接口触发的长时间任务（语料重建、签名补算等）在后台运行，接口立即返回任务状态，
+之后通过查询接口获取进度和结果；同一任务同一时间只运行一个。
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class BackgroundJob:
+    """单实例后台任务及其最近一次运行的状态"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._task: Optional[asyncio.Task] = None
+        self.state: Optional[Dict[str, Any]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, run: Callable[[], Awaitable[Dict[str, Any]]], **params) -> Tuple[Dict[str, Any], bool]:
+        """启动任务，返回 (状态, 是否新启动)；任务已在运行时不重复启动，返回其状态
+
+        run 的返回值（字典）在完成后合并到状态中
+        """
+        if self.running:
+            return dict(self.state), False
+        self.state = {"status": "running", **params, "started_at": time.time()}
+        self._task = asyncio.create_task(self._run(run))
+        return dict(self.state), True
+
+    async def _run(self, run: Callable[[], Awaitable[Dict[str, Any]]]):
+        try:
+            result = await run()
+            self.state.update(status="completed", finished_at=time.time(), **(result or {}))
+        except Exception as e:
+            logger.error(f"{self.name}失败: {e}")
+            self.state.update(status="failed", finished_at=time.time(), error=str(e))
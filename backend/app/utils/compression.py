@@ -0,0 +1,43 @@
+"""
+文本压缩工具
+
+优先使用 zstandard（压缩率和速度更好）；未安装时使用标准库 zlib。
+压缩结果附带编码名称，读取时按记录的编码解压，两种编码的数据可以共存。
+"""
+
+import zlib
+from typing import Tuple
+
+try:
+    import zstandard
+    _ZSTD_COMPRESSOR = zstandard.ZstdCompressor(level=10)
+    _ZSTD_DECOMPRESSOR = zstandard.ZstdDecompressor()
+    ZSTD_AVAILABLE = True
+except ImportError:
+    _ZSTD_COMPRESSOR = None
+    _ZSTD_DECOMPRESSOR = None
+    ZSTD_AVAILABLE = False
+
+CODEC_ZSTD = "zstd"
+CODEC_ZLIB = "zlib"
+
+DEFAULT_CODEC = CODEC_ZSTD if ZSTD_AVAILABLE else CODEC_ZLIB
+
+def compress_text(text: str) -> Tuple[str, bytes]:
+    """压缩文本，返回 (编码名称, 压缩数据)"""
+    data = (text or "").encode("utf-8")
+    if _ZSTD_COMPRESSOR is not None:
+        return CODEC_ZSTD, _ZSTD_COMPRESSOR.compress(data)
+    return CODEC_ZLIB, zlib.compress(data, 6)
+
+def decompress_text(codec: str, data: bytes) -> str:
+    """按编码名称解压文本"""
+    if not data:
+        return ""
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data).decode("utf-8")
+    if codec == CODEC_ZSTD:
+        if _ZSTD_DECOMPRESSOR is None:
+            raise RuntimeError("内容使用zstd压缩，但未安装zstandard")
+        return _ZSTD_DECOMPRESSOR.decompress(data).decode("utf-8")
+    raise ValueError(f"未知的压缩编码: {codec}")
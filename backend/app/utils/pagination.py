@@ -0,0 +1,56 @@
+"""
+键集分页（keyset pagination）工具
+
+游标是上一页最后一条记录排序键的编码（URL安全的base64 JSON），
+下一页查询“排序键严格小于游标”的记录，每页开销只与页大小有关，与翻页深度无关。
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Sequence, Tuple
+
+from sqlalchemy import and_, func, or_
+
+def encode_cursor(values: Dict[str, Any]) -> str:
+    payload = {
+        key: {"$dt": value.isoformat()} if isinstance(value, datetime) else value
+        for key, value in values.items()
+    }
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """解析游标，格式错误时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw.decode("utf-8"))
+    except Exception:
+        raise ValueError("无效的分页游标")
+    if not isinstance(payload, dict):
+        raise ValueError("无效的分页游标")
+    return {
+        key: datetime.fromisoformat(value["$dt"]) if isinstance(value, dict) and "$dt" in value else value
+        for key, value in payload.items()
+    }
+
+def keyset_filter(columns: Sequence[Any], values: Sequence[Any]):
+    """降序排序下“位于游标之后”的条件：(c1, c2, ...) < (v1, v2, ...)
+
+    展开为 c1 < v1 OR (c1 = v1 AND c2 < v2) OR ...，兼容不支持行值比较的数据库
+    """
+    clauses = []
+    for index, (column, value) in enumerate(zip(columns, values)):
+        equals = [columns[i] == values[i] for i in range(index)]
+        clauses.append(and_(*equals, column < value))
+    return or_(*clauses)
+
+def split_page(rows: List[Any], limit: int) -> Tuple[List[Any], bool]:
+    """查询时多取一条判断是否还有下一页"""
+    return rows[:limit], len(rows) > limit
+
+def capped_count(query, cap: int) -> Tuple[int, bool]:
+    """最多数到cap条，返回 (数量, 是否精确)；过滤条件只需匹配cap+1行即可停止"""
+    subquery = query.order_by(None).limit(cap + 1).subquery()
+    count = query.session.query(func.count()).select_from(subquery).scalar() or 0
+    return min(count, cap), count <= cap
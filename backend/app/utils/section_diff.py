@@ -0,0 +1,111 @@
+"""
+文档分段与段落级差异
+
+正文按行切分为段落（超长的行再按句末标点切分），段落保留结尾换行，按顺序拼接即为原文。
+差异在段落哈希序列上计算；delta 只记录从基准文本复用的段落区间和基准中没有的段落文本。
+"""
+
+import hashlib
+import re
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import List, Tuple
+
+# 单个段落的长度上限（超过时在句末标点处切开）
+MAX_SECTION_CHARS = 2000
+
+_SENTENCE_END = re.compile(r"(?<=[。！？!?；;])")
+
+def split_sections(text: str) -> List[str]:
+    sections: List[str] = []
+    for line in (text or "").splitlines(keepends=True):
+        if len(line) <= MAX_SECTION_CHARS:
+            sections.append(line)
+            continue
+        current = ""
+        for piece in _SENTENCE_END.split(line):
+            if current and len(current) + len(piece) > MAX_SECTION_CHARS:
+                sections.append(current)
+                current = ""
+            current += piece
+        if current:
+            sections.append(current)
+    return sections
+
+def section_hash(section: str) -> bytes:
+    return hashlib.blake2b(section.encode("utf-8"), digest_size=8).digest()
+
+@dataclass
+class SectionDiff:
+    old_sections: List[str]
+    new_sections: List[str]
+    opcodes: List[Tuple[str, int, int, int, int]]
+
+    @property
+    def unchanged(self) -> bool:
+        return all(tag == "equal" for tag, *_ in self.opcodes)
+
+    @property
+    def added_sections(self) -> List[str]:
+        """新版本中新增或改写的段落"""
+        return [
+            section
+            for tag, _, _, j1, j2 in self.opcodes if tag in ("replace", "insert")
+            for section in self.new_sections[j1:j2]
+        ]
+
+    @property
+    def removed_sections(self) -> List[str]:
+        """旧版本中被删除或改写的段落"""
+        return [
+            section
+            for tag, i1, i2, _, _ in self.opcodes if tag in ("replace", "delete")
+            for section in self.old_sections[i1:i2]
+        ]
+
+    @property
+    def changed_sections(self) -> int:
+        return len(self.added_sections) + len(self.removed_sections)
+
+    @property
+    def changed_chars(self) -> int:
+        return sum(len(section) for section in self.added_sections + self.removed_sections)
+
+    @property
+    def change_ratio(self) -> float:
+        """变更字符数占新旧版本中较长者的比例"""
+        longest = max(sum(map(len, self.old_sections)), sum(map(len, self.new_sections)), 1)
+        return min(1.0, self.changed_chars / longest)
+
+    def reverse_delta(self) -> List[list]:
+        """以新版本为基准还原旧版本的 delta：["copy", 起, 止] 复用新版本段落，["insert", [段落...]] 补回旧段落"""
+        delta: List[list] = []
+        for tag, i1, i2, j1, j2 in self.opcodes:
+            if tag == "equal":
+                delta.append(["copy", j1, j2])
+            elif i2 > i1:
+                delta.append(["insert", self.old_sections[i1:i2]])
+        return delta
+
+def diff_sections(old_text: str, new_text: str) -> SectionDiff:
+    old_sections = split_sections(old_text)
+    new_sections = split_sections(new_text)
+    matcher = SequenceMatcher(
+        None,
+        [section_hash(section) for section in old_sections],
+        [section_hash(section) for section in new_sections],
+        autojunk=False
+    )
+    return SectionDiff(old_sections, new_sections, matcher.get_opcodes())
+
+def apply_delta(base_sections: List[str], delta: List[list]) -> str:
+    """按 delta 从基准段落还原文本"""
+    parts: List[str] = []
+    for op in delta:
+        if op[0] == "copy":
+            parts.extend(base_sections[op[1]:op[2]])
+        elif op[0] == "insert":
+            parts.extend(op[1])
+        else:
+            raise ValueError(f"未知的delta操作: {op[0]}")
+    return "".join(parts)
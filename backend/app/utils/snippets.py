@@ -0,0 +1,103 @@
+"""
+搜索结果摘录与高亮
+
+从文本中挑选覆盖查询词最多的若干窗口作为摘录，并给出摘录内的高亮区间（字符偏移，左闭右开）。
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+from app.utils.text_tokenizer import tokenize
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# 参与窗口打分的命中数上限
+MAX_ANCHORS = 200
+
+def query_terms(query: Optional[str]) -> List[str]:
+    """查询词：整个查询、空白分隔的各个词，以及较长中文词的二元组（长词在前）"""
+    query = (query or "").strip()
+    if not query:
+        return []
+
+    terms = [query]
+    for word in _WHITESPACE_PATTERN.split(query):
+        if word and word not in terms:
+            terms.append(word)
+        if len(word) > 2:
+            for token in tokenize(word):
+                if token not in terms:
+                    terms.append(token)
+    return sorted(terms, key=len, reverse=True)
+
+def find_matches(text: str, terms: List[str]) -> List[Tuple[int, int, str]]:
+    """查找所有不重叠的命中 (起始, 结束, 词)，同一位置优先长词，不区分大小写"""
+    if not text or not terms:
+        return []
+    lowered = text.lower()
+    found = []
+    for term in terms:
+        needle = term.lower()
+        start = lowered.find(needle)
+        while start != -1:
+            found.append((start, start + len(needle), term))
+            start = lowered.find(needle, start + 1)
+    found.sort(key=lambda match: (match[0], -(match[1] - match[0])))
+
+    matches = []
+    covered_until = -1
+    for start, end, term in found:
+        if start >= covered_until:
+            matches.append((start, end, term))
+            covered_until = end
+    return matches
+
+def highlight_ranges(text: str, terms: List[str]) -> List[List[int]]:
+    return [[start, end] for start, end, _ in find_matches(text, terms)]
+
+def build_snippets(
+    text: str,
+    terms: List[str],
+    count: int = 2,
+    length: int = 160
+) -> List[Dict[str, object]]:
+    """挑选最多count个互不重叠的摘录窗口
+
+    窗口得分 = 覆盖的不同查询词数 × 10 + 命中次数；没有命中时返回文本开头
+    """
+    if not text or count <= 0:
+        return []
+
+    matches = find_matches(text, terms)
+    if not matches:
+        return [_snippet(text, 0, min(len(text), length), [])]
+
+    # 以每个命中为锚点构造窗口，锚点放在窗口前三分之一处
+    candidates = []
+    for anchor, _, _ in matches[:MAX_ANCHORS]:
+        start = max(0, min(anchor - length // 3, len(text) - length))
+        end = min(len(text), start + length)
+        inside = [match for match in matches if match[0] >= start and match[1] <= end]
+        score = len({term.lower() for _, _, term in inside}) * 10 + len(inside)
+        candidates.append((score, -start, start, end, inside))
+    candidates.sort(reverse=True)
+
+    chosen: List[Tuple[int, int, list]] = []
+    for _, _, start, end, inside in candidates:
+        if any(start < chosen_end and end > chosen_start for chosen_start, chosen_end, _ in chosen):
+            continue
+        chosen.append((start, end, inside))
+        if len(chosen) >= count:
+            break
+
+    chosen.sort(key=lambda window: window[0])
+    return [_snippet(text, start, end, inside) for start, end, inside in chosen]
+
+def _snippet(text: str, start: int, end: int, inside: list) -> Dict[str, object]:
+    return {
+        "text": text[start:end],
+        "offset": start,
+        "highlights": [[match_start - start, match_end - start] for match_start, match_end, _ in inside],
+        "truncated_before": start > 0,
+        "truncated_after": end < len(text)
+    }
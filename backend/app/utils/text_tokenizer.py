@@ -0,0 +1,55 @@
+"""
+轻量分词工具（无外部依赖）
+
+- 中文：连续汉字按二元组（bigram）切分
+- 英文/数字：按单词切分并转小写
+- 过滤常见停用词
+"""
+
+import re
+from typing import List
+
+_TOKEN_PATTERN = re.compile(r"[\u4e00-\u9fff]+|[A-Za-z][A-Za-z0-9\-\+\.]*[A-Za-z0-9\+]|[A-Za-z]")
+_SENTENCE_PATTERN = re.compile(r"[^。！？!?；;\n]+[。！？!?；;]?")
+
+# 中文二元组停用词（由常见虚词组成，几乎不携带信息）
+CJK_STOPWORDS = {
+    "我们", "你们", "他们", "这个", "那个", "这些", "那些", "以及", "或者", "但是",
+    "因为", "所以", "如果", "可以", "进行", "通过", "对于", "其中", "并且", "而且",
+    "已经", "还是", "就是", "一个", "没有", "不是", "什么", "这样", "为了", "以上",
+    "以下", "之一", "等等", "相关", "有关", "方面", "主要", "包括", "具有", "提供",
+}
+
+EN_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "are", "was", "were", "our",
+    "you", "your", "has", "have", "had", "not", "but", "all", "any", "can", "will",
+    "its", "into", "about", "also", "more", "than", "which", "their", "they", "been",
+    "a", "an", "of", "to", "in", "on", "at", "by", "or", "as", "is", "be", "it", "we",
+}
+
+def tokenize(text: str) -> List[str]:
+    """将文本切分为检索/统计用的词项"""
+    tokens: List[str] = []
+    for match in _TOKEN_PATTERN.finditer(text or ""):
+        token = match.group(0)
+        if "\u4e00" <= token[0] <= "\u9fff":
+            if len(token) == 1:
+                continue
+            for i in range(len(token) - 1):
+                bigram = token[i:i + 2]
+                if bigram not in CJK_STOPWORDS:
+                    tokens.append(bigram)
+        else:
+            token = token.lower()
+            if len(token) > 1 and token not in EN_STOPWORDS:
+                tokens.append(token)
+    return tokens
+
+def split_sentences(text: str, min_length: int = 6) -> List[str]:
+    """按中英文句末标点和换行切分句子，过滤过短的片段"""
+    sentences = []
+    for match in _SENTENCE_PATTERN.finditer(text or ""):
+        sentence = match.group(0).strip()
+        if len(sentence) >= min_length:
+            sentences.append(sentence)
+    return sentences
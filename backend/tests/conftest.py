@@ -0,0 +1,70 @@
+"""
+测试夹具：每个测试使用独立的 SQLite 数据库，模型网关视为未配置（不访问外部服务）
+"""
+
+import os
+import sys
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp(prefix="dataanalays-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ.pop("OPENAI_API_KEY", None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.document import router as document_router
+from app.api.knowledge import router as knowledge_router
+from app.models import knowledge_base  # noqa: F401  注册知识库模型
+from app.models.database import Base, SessionLocal, engine
+from app.models.user import User, UserRole
+from app.services.answer_cache_service import answer_cache
+from app.services.auth_service import (
+    get_current_active_user, get_current_registered_user, get_current_user_or_guest
+)
+
+@pytest.fixture
+def db():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    answer_cache.clear()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def user(db):
+    role = UserRole(name="user", display_name="普通用户", permissions="[]")
+    db.add(role)
+    db.commit()
+    user = User(username="tester", email="tester@example.com", hashed_password="x", role_id=role.id)
+    db.add(user)
+    db.commit()
+    return user
+
+@pytest.fixture
+def client(db, user, tmp_path, monkeypatch):
+    # 上传文件和分析结果写到临时目录
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "uploads").mkdir()
+    (tmp_path / "results").mkdir()
+    app = FastAPI()
+    app.include_router(document_router)
+    app.include_router(knowledge_router)
+    user_id = user.id
+
+    def current_user():
+        session = SessionLocal()
+        try:
+            return session.get(User, user_id)
+        finally:
+            session.close()
+
+    for dependency in (get_current_active_user, get_current_registered_user, get_current_user_or_guest):
+        app.dependency_overrides[dependency] = current_user
+    with TestClient(app) as test_client:
+        yield test_client
@@ -0,0 +1,29 @@
+import pytest
+
+from app.services.answer_cache_service import AnswerCache
+
+FINGERPRINT = "context"
+
+@pytest.mark.parametrize("cached_question, question", [
+    ("请介绍公司2023年第一季度的营业收入情况", "请介绍公司2023年第二季度的营业收入情况"),
+    ("华东地区的销售额是多少", "华南地区的销售额是多少"),
+    ("公司不允许员工远程办公吗", "公司允许员工远程办公吗"),
+])
+def test_similar_lookup_does_not_match_different_questions(cached_question, question):
+    cache = AnswerCache(max_entries=10, ttl=60, similarity=0.9)
+    cache.put(cached_question, FINGERPRINT, "answer", [1])
+
+    assert cache.get(question, FINGERPRINT) is None
+
+def test_similar_lookup_matches_rephrased_question():
+    cache = AnswerCache(max_entries=10, ttl=60, similarity=0.9)
+    cache.put("公司的主要业务是什么", FINGERPRINT, "answer", [1])
+
+    assert cache.get("公司主要业务有哪些？", FINGERPRINT).answer == "answer"
+
+def test_exact_lookup_only_when_similarity_disabled():
+    cache = AnswerCache(max_entries=10, ttl=60, similarity=0)
+    cache.put("公司的主要业务是什么", FINGERPRINT, "answer", [1])
+
+    assert cache.get("公司的主要业务是什么？", FINGERPRINT).answer == "answer"
+    assert cache.get("公司主要业务有哪些", FINGERPRINT) is None
@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+from app.models.knowledge_base import KnowledgeBase, KnowledgeQA
+from app.models.knowledge_schemas import KnowledgeBaseCreate
+from app.services.answer_cache_service import answer_cache
+from app.services.conversation_memory_service import conversation_memory
+from app.services.knowledge_service import KnowledgeService
+
+def stream_events(response):
+    return [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+
+def test_stream_reuses_ask_context_without_counting_views(client, db, user):
+    item = KnowledgeService.create_knowledge_item(
+        db, KnowledgeBaseCreate(title="差旅报销制度", content="差旅报销需要在三十天内提交发票。" * 10), user.id
+    )
+    question = "报销期限是多久"
+    # 按非流式问答的上下文写入缓存，流式问答应命中同一条缓存
+    context_items, knowledge_ids, _ = KnowledgeService.build_qa_context(db, question, [item.id])
+    context = "\n\n=== 分隔符 ===\n\n".join(context_items)
+    answer_cache.put(
+        question, KnowledgeService.qa_context_fingerprint(db, knowledge_ids, context), "三十天内", knowledge_ids
+    )
+
+    response = client.post("/api/knowledge/ask-stream", json={"question": question, "knowledge_ids": [item.id]})
+
+    assert response.status_code == 200
+    events = stream_events(response)
+    assert "".join(event["data"] for event in events if event["type"] == "content") == "三十天内"
+    assert events[-1]["type"] == "done"
+    db.expire_all()
+    assert db.get(KnowledgeBase, item.id).view_count == 0
+
+def test_streamed_turn_is_recorded_and_restored_after_eviction(client, db, user):
+    item = KnowledgeService.create_knowledge_item(
+        db, KnowledgeBaseCreate(title="差旅报销制度", content="差旅报销需要在三十天内提交发票。" * 10), user.id
+    )
+    question = "报销期限是多久"
+    context_items, knowledge_ids, _ = KnowledgeService.build_qa_context(db, question, [item.id])
+    context = "\n\n=== 分隔符 ===\n\n".join(context_items)
+    answer_cache.put(
+        question, KnowledgeService.qa_context_fingerprint(db, knowledge_ids, context), "三十天内", knowledge_ids
+    )
+
+    response = client.post("/api/knowledge/ask-stream", json={"question": question, "knowledge_ids": [item.id]})
+
+    session_id = stream_events(response)[0]["data"]
+    record = db.query(KnowledgeQA).filter(KnowledgeQA.session_id == session_id).one()
+    assert (record.answer, record.user_id, record.knowledge_id) == ("三十天内", user.id, item.id)
+    # 进程内会话被淘汰后从问答记录恢复
+    conversation_memory._sessions.clear()
+    history = asyncio.run(conversation_memory.history(db, user.id, session_id))
+    assert [message["content"] for message in history] == [question, "三十天内"]
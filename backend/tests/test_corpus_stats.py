@@ -0,0 +1,54 @@
+import time
+
+from app.models.knowledge_base import CONTENT_PREFIX_LENGTH, KnowledgeBase, KnowledgeTermStat
+from app.models.knowledge_schemas import KnowledgeBaseCreate
+from app.services.corpus_stats_service import DOCUMENT_COUNT_TERM, corpus_stats
+from app.services.knowledge_service import KnowledgeService
+
+DOCUMENTS = [
+    ("合同审批流程", "合同审批需要法务与财务会签。" * 10),
+    ("差旅报销制度", "差旅报销需要在三十天内提交发票。" * 10),
+    ("长篇制度汇编", "制度汇编。" * CONTENT_PREFIX_LENGTH + "档案销毁"),
+]
+
+def term_stats(db):
+    db.expire_all()
+    return {stat.term: stat.document_frequency for stat in db.query(KnowledgeTermStat).all()}
+
+def test_rebuild_in_batches_matches_incremental_stats(db, user):
+    ids = [
+        KnowledgeService.create_knowledge_item(db, KnowledgeBaseCreate(title=title, content=content), user.id).id
+        for title, content in DOCUMENTS
+    ]
+    incremental = term_stats(db)
+    db.query(KnowledgeTermStat).delete()
+    db.query(KnowledgeBase).update({KnowledgeBase.ai_keywords: None})
+    db.commit()
+
+    documents = corpus_stats.rebuild(db, batch_size=1)
+
+    assert documents == len(DOCUMENTS)
+    assert term_stats(db) == incremental
+    # 正文前缀之外的词项也计入统计
+    assert incremental["档案"] == 1
+    for item in db.query(KnowledgeBase).filter(KnowledgeBase.id.in_(ids)):
+        assert item.ai_keywords
+
+def test_rebuild_endpoint_runs_in_background(client, db, user):
+    for title, content in DOCUMENTS:
+        KnowledgeService.create_knowledge_item(db, KnowledgeBaseCreate(title=title, content=content), user.id)
+    user.is_superuser = True
+    db.commit()
+
+    response = client.post("/api/knowledge/corpus/rebuild")
+
+    assert response.status_code == 202, response.text
+    assert response.json()["rebuild"]["status"] == "running"
+    for _ in range(100):
+        rebuild = client.get("/api/knowledge/corpus/rebuild").json()["rebuild"]
+        if rebuild["status"] != "running":
+            break
+        time.sleep(0.05)
+    assert rebuild["status"] == "completed"
+    assert rebuild["documents"] == len(DOCUMENTS)
+    assert term_stats(db)[DOCUMENT_COUNT_TERM] == len(DOCUMENTS)
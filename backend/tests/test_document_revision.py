@@ -0,0 +1,79 @@
+import time
+
+from app.models.knowledge_base import KnowledgeBase, KnowledgeFingerprint, KnowledgeLSHBucket
+from app.models.knowledge_schemas import KnowledgeBaseCreate
+from app.services.knowledge_service import KnowledgeService
+from app.services.near_duplicate_service import near_duplicates
+
+PARAGRAPHS = [
+    "星辰科技有限公司成立于2015年，总部位于上海，主要从事企业级数据分析平台的研发与销售。",
+    "公司为制造业和零售业客户提供数据治理、报表分析和预测建模服务，拥有多项软件著作权。",
+    "公司在北京、深圳设有分支机构，研发人员占员工总数的六成以上，持续投入人工智能技术研究。",
+    "主要客户包括大型连锁零售企业和汽车零部件制造商，平台日处理数据量超过十亿条。",
+]
+ORIGINAL = "\n\n".join(PARAGRAPHS)
+REVISED = ORIGINAL + "\n\n2024年公司完成B轮融资，计划扩大华南地区的销售团队。"
+
+def upload(client, endpoint, filename, text, **params):
+    response = client.post(endpoint, params=params, files={"file": (filename, text.encode("utf-8"), "text/plain")})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_similar_upload_with_other_filename_does_not_overwrite(client, db):
+    first = upload(client, "/api/document/upload", "a.txt", ORIGINAL)
+    second = upload(client, "/api/document/upload-xml", "b.txt", REVISED)
+
+    assert second["knowledge_id"] != first["knowledge_id"]
+    original = db.get(KnowledgeBase, first["knowledge_id"])
+    assert original.title == "文档分析：a.txt"
+    assert original.content == ORIGINAL
+
+def test_same_file_or_revise_policy_revises_in_place(client, db):
+    first = upload(client, "/api/document/upload", "a.txt", ORIGINAL)
+    second = upload(client, "/api/document/upload", "a.txt", REVISED)
+    assert second["knowledge_id"] == first["knowledge_id"]
+
+    third = upload(client, "/api/document/upload-xml", "b.txt", ORIGINAL, duplicate_policy="revise")
+    assert third["knowledge_id"] == first["knowledge_id"]
+    knowledge = db.get(KnowledgeBase, first["knowledge_id"])
+    db.refresh(knowledge)
+    assert knowledge.title == "XML文档分析：b.txt"
+    assert knowledge.source_file == "b.txt"
+    assert knowledge.content == ORIGINAL
+
+def test_in_place_revision_does_not_reorder_version_chain(client, db):
+    first = upload(client, "/api/document/upload", "a.txt", ORIGINAL)
+    upload(client, "/api/document/upload", "a.txt", REVISED)
+    second = upload(client, "/api/document/upload", "b.txt", ORIGINAL)
+
+    revised = db.get(KnowledgeBase, first["knowledge_id"])
+    copy = db.get(KnowledgeBase, second["knowledge_id"])
+    assert (revised.version_number, revised.revision) == (1, 2)
+    assert (copy.version_of_id, copy.version_number, copy.revision) == (revised.id, 2, 1)
+
+    kept, merged = near_duplicates.collapse(db, [revised, copy])
+    assert [item.id for item in kept] == [copy.id]
+
+def test_backfill_endpoint_runs_in_background(client, db, user):
+    ids = [
+        KnowledgeService.create_knowledge_item(db, KnowledgeBaseCreate(title=f"公司简介{i}", content=text), user.id).id
+        for i, text in enumerate(PARAGRAPHS)
+    ]
+    db.query(KnowledgeLSHBucket).delete()
+    db.query(KnowledgeFingerprint).delete()
+    user.is_superuser = True
+    db.commit()
+
+    response = client.post("/api/knowledge/dedup/backfill")
+
+    assert response.status_code == 202, response.text
+    assert response.json()["backfill"]["status"] == "running"
+    for _ in range(100):
+        backfill = client.get("/api/knowledge/dedup/backfill").json()["backfill"]
+        if backfill["status"] != "running":
+            break
+        time.sleep(0.05)
+    assert backfill["status"] == "completed"
+    assert backfill["processed"] == len(ids)
+    db.expire_all()
+    assert {row.knowledge_id for row in db.query(KnowledgeFingerprint)} == set(ids)
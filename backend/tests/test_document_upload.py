@@ -0,0 +1,23 @@
+import pytest
+
+from app.models.knowledge_base import KnowledgeBase
+
+DOCUMENT = (
+    "星辰科技有限公司成立于2015年，总部位于上海，主要从事企业级数据分析平台的研发与销售。"
+    "公司为制造业和零售业客户提供数据治理、报表分析和预测建模服务，拥有多项软件著作权。"
+)
+
+@pytest.mark.parametrize("endpoint, params", [
+    ("/api/document/upload", {}),
+    ("/api/document/upload-xml", {"mode": "structured"}),
+    ("/api/document/upload-xml", {"mode": "xml"}),
+])
+def test_local_fallback_analysis_is_stored_as_local(client, db, endpoint, params):
+    response = client.post(
+        endpoint, params=params,
+        files={"file": ("company.txt", DOCUMENT.encode("utf-8"), "text/plain")}
+    )
+
+    assert response.status_code == 200, response.text
+    knowledge = db.get(KnowledgeBase, response.json()["knowledge_id"])
+    assert knowledge.ai_analysis["format"] == "local"
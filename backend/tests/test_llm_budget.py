@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+import pytest
+
+from app.config.anti_blocking_config import config
+from app.models.knowledge_base import KnowledgeBase
+from app.models.knowledge_schemas import KnowledgeBaseCreate
+from app.services.knowledge_service import KnowledgeService
+from app.services.llm_gateway import llm_gateway
+
+DOCUMENT = (
+    "星辰科技有限公司成立于2015年，总部位于上海，主要从事企业级数据分析平台的研发与销售。"
+    "公司为制造业和零售业客户提供数据治理、报表分析和预测建模服务，拥有多项软件著作权。"
+)
+
+@pytest.fixture
+def queued_gateway(monkeypatch):
+    # 模型网关已配置，但请求一直在调度器中排队
+    async def complete(*args, **kwargs):
+        await asyncio.sleep(30)
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(llm_gateway, "complete", complete)
+    monkeypatch.setattr(config, "REQUEST_LLM_BUDGET", 0.3)
+
+@pytest.mark.parametrize("endpoint, params", [
+    ("/api/document/upload", {}),
+    ("/api/document/upload-xml", {"mode": "structured"}),
+    ("/api/document/upload-xml", {"mode": "xml"}),
+])
+def test_upload_falls_back_locally_within_request_budget(client, db, queued_gateway, endpoint, params):
+    started = time.monotonic()
+    response = client.post(
+        endpoint, params=params,
+        files={"file": ("company.txt", DOCUMENT.encode("utf-8"), "text/plain")}
+    )
+
+    assert response.status_code == 200, response.text
+    assert time.monotonic() - started < 5
+    knowledge = db.get(KnowledgeBase, response.json()["knowledge_id"])
+    assert knowledge.ai_analysis["format"] == "local"
+
+def test_ask_answers_within_request_budget(client, db, user, queued_gateway):
+    KnowledgeService.create_knowledge_item(
+        db, KnowledgeBaseCreate(title="公司简介", content=DOCUMENT), user.id
+    )
+
+    started = time.monotonic()
+    response = client.post("/api/knowledge/ask", json={"question": "星辰科技"})
+
+    assert response.status_code == 200, response.text
+    assert time.monotonic() - started < 5
+    assert "超时" in response.json()["answer"]
@@ -0,0 +1,32 @@
+import time
+
+from app.models.knowledge_base import PresetQuestion
+from app.models.knowledge_schemas import KnowledgeBaseCreate
+from app.services.knowledge_service import KnowledgeService
+from app.services.preset_answer_service import preset_answers
+
+def test_precompute_runs_in_background(client, db, user, monkeypatch):
+    async def generate(question, context, context_count, **kwargs):
+        return f"{question}：见差旅报销制度"
+
+    monkeypatch.setattr(KnowledgeService, "_generate_answer_with_openai", generate)
+    monkeypatch.setattr(preset_answers, "_answers", {})
+    KnowledgeService.create_knowledge_item(
+        db, KnowledgeBaseCreate(title="差旅报销制度", content="差旅报销需要在三十天内提交发票。" * 10), user.id
+    )
+    db.add(PresetQuestion(question="差旅报销", is_active=True))
+    user.is_superuser = True
+    db.commit()
+
+    response = client.post("/api/knowledge/preset-questions/precompute")
+
+    assert response.status_code == 202, response.text
+    assert response.json()["refresh"]["status"] == "running"
+    for _ in range(100):
+        refresh = client.get("/api/knowledge/preset-questions/precompute").json()["manual_refresh"]
+        if refresh["status"] != "running":
+            break
+        time.sleep(0.05)
+    assert refresh["status"] == "completed"
+    assert refresh["regenerated"] == 1
+    assert preset_answers.lookup("差旅报销").answer == "差旅报销：见差旅报销制度"
@@ -0,0 +1,30 @@
+from app.models.knowledge_base import CONTENT_PREFIX_LENGTH
+from app.models.knowledge_schemas import KnowledgeBaseCreate
+from app.services.knowledge_service import KnowledgeService
+
+def create_long_item(db, user):
+    # 唯一的命中在正文前缀之后
+    filler = "本章介绍公司的组织架构与职责分工。" * 160
+    content = filler + "海外差旅的每日补贴按目的地城市分级发放。" + filler[:200]
+    assert content.index("每日补贴") > CONTENT_PREFIX_LENGTH
+    return KnowledgeService.create_knowledge_item(
+        db, KnowledgeBaseCreate(title="员工手册", content=content), user.id
+    )
+
+def test_search_matches_text_past_the_prefix(client, db, user):
+    item = create_long_item(db, user)
+
+    response = client.post("/api/knowledge/search", json={"query": "每日补贴"})
+
+    assert response.status_code == 200, response.text
+    assert [hit["id"] for hit in response.json()["knowledge_items"]] == [item.id]
+
+def test_snippets_cover_matches_past_the_prefix(client, db, user):
+    create_long_item(db, user)
+
+    response = client.post("/api/knowledge/search", json={"query": "每日补贴"})
+
+    snippets = response.json()["knowledge_items"][0]["snippets"]
+    assert snippets and snippets[0]["offset"] > CONTENT_PREFIX_LENGTH
+    start, end = snippets[0]["highlights"][0]
+    assert snippets[0]["text"][start:end] == "每日补贴"
@@ -0,0 +1,46 @@
+import pytest
+
+from app.models.knowledge_schemas import KnowledgeBaseCreate
+from app.services.knowledge_service import KnowledgeService
+
+def create_items(db, user, titles):
+    # 同一秒内创建，created_at 相同
+    return [
+        KnowledgeService.create_knowledge_item(
+            db, KnowledgeBaseCreate(title=title, content=f"{title}的说明文字。" * 10), user.id
+        ).id
+        for title in titles
+    ]
+
+def search_pages(client, **request):
+    ids, cursor = [], None
+    for _ in range(10):
+        response = client.post("/api/knowledge/search", json={**request, "cursor": cursor})
+        assert response.status_code == 200, response.text
+        body = response.json()
+        ids.extend(item["id"] for item in body["knowledge_items"])
+        cursor = body.get("next_cursor")
+        if not cursor:
+            return ids
+    raise AssertionError("分页没有结束")
+
+@pytest.mark.parametrize("sort", ["relevance", "recent"])
+def test_search_pages_do_not_repeat_or_skip(client, db, user, sort):
+    ids = create_items(db, user, ["报销制度", "差旅报销", "采购流程", "报销审批"])
+
+    pages = search_pages(client, query="报销", limit=2, sort=sort, collapse_duplicates=False)
+
+    assert sorted(pages) == sorted([ids[0], ids[1], ids[3]])
+
+def test_relevance_pages_are_stable_when_items_are_viewed(client, db, user):
+    ids = create_items(db, user, ["报销制度", "差旅报销", "报销审批"])
+    first = client.post("/api/knowledge/search", json={"query": "报销", "limit": 2}).json()
+    for _ in range(3):
+        client.get(f"/api/knowledge/items/{first['knowledge_items'][-1]['id']}")
+
+    second = client.post(
+        "/api/knowledge/search", json={"query": "报销", "limit": 2, "cursor": first["next_cursor"]}
+    ).json()
+
+    page_ids = [item["id"] for item in first["knowledge_items"] + second["knowledge_items"]]
+    assert sorted(page_ids) == sorted(ids)
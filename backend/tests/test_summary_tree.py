@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+from app.models.knowledge_base import KnowledgeQA
+from app.models.knowledge_schemas import KnowledgeBaseCreate
+from app.services.knowledge_service import KnowledgeService
+from app.services.summary_tree_service import summary_tree
+
+DOCUMENTS = [
+    ("合同审批流程", "合同审批需要法务与财务会签，金额超过十万元需要总经理批准。"),
+    ("差旅报销制度", "差旅报销需要在三十天内提交发票，住宿标准按城市分级。"),
+    ("信息安全规范", "密码每九十天更换一次，禁止共享账号，离职时回收权限。"),
+]
+
+def build_tree(db, user):
+    ids = [
+        KnowledgeService.create_knowledge_item(
+            db, KnowledgeBaseCreate(title=title, content=content * 10), user.id
+        ).id
+        for title, content in DOCUMENTS
+    ]
+    asyncio.run(summary_tree.build(db))
+    return ids
+
+def test_broad_tree_question_is_answered_and_recorded(client, db, user):
+    ids = build_tree(db, user)
+
+    response = client.post("/api/knowledge/ask", json={"question": "整体情况怎么样", "mode": "tree"})
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["knowledge_id"] in ids
+    record = db.get(KnowledgeQA, body["id"])
+    assert record is not None and record.knowledge_id in ids
+
+def test_broad_tree_context_lists_cluster_members(db, user):
+    ids = build_tree(db, user)
+
+    parts, knowledge_ids = summary_tree.build_context(db, "整体情况怎么样")
+
+    assert parts
+    assert knowledge_ids and set(knowledge_ids) <= set(ids)
+
+def test_manual_build_runs_in_background(client, db, user):
+    for title, content in DOCUMENTS:
+        KnowledgeService.create_knowledge_item(db, KnowledgeBaseCreate(title=title, content=content * 10), user.id)
+    user.is_superuser = True
+    db.commit()
+
+    response = client.post("/api/knowledge/summary-tree/build", params={"limit": 10})
+
+    assert response.status_code == 202, response.text
+    assert response.json()["build"]["status"] == "running"
+    for _ in range(100):
+        build = client.get("/api/knowledge/summary-tree").json()["manual_build"]
+        if build["status"] != "running":
+            break
+        time.sleep(0.05)
+    assert build["status"] == "completed"
+    assert build["documents_built"] == len(DOCUMENTS)
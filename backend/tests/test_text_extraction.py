@@ -0,0 +1,14 @@
+from app.services.document_service import extract_text_from_file
+
+def test_markdown_keeps_underscores_inside_words(tmp_path):
+    path = tmp_path / "notes.md"
+    path.write_text(
+        "# 配置说明\n调用 snake_case_name 和 MAX_RETRY_COUNT，这是 _重点_ 和 __加粗__ 以及 **星号**。\n",
+        encoding="utf-8"
+    )
+
+    text = extract_text_from_file(str(path), "notes.md")
+
+    assert "snake_case_name" in text
+    assert "MAX_RETRY_COUNT" in text
+    assert "这是 重点 和 加粗 以及 星号。" in text
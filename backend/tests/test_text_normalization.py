@@ -0,0 +1,27 @@
+from app.services.text_normalization_service import PAGE_BREAK, normalize_document_text
+
+def make_page(number):
+    return "\n".join([
+        "星辰科技 内部资料",
+        f"第{number}章 概况",
+        "项目\t金额\t备注",
+        "合计",
+        "120",
+        "以上数据未经审计",
+        "正文说明文字。",
+        "结论段落。",
+        str(number),
+    ])
+
+def test_only_page_edges_are_stripped():
+    text = PAGE_BREAK.join(make_page(number) for number in range(1, 5))
+
+    lines = normalize_document_text(text).text.split("\n")
+
+    assert "星辰科技 内部资料" not in lines
+    assert not any(line in {"1", "2", "3", "4"} for line in lines)
+    # 正文中的数值行和重复短句保留
+    assert lines.count("120") == 4
+    assert lines.count("以上数据未经审计") == 4
+    # 表格列之间的制表符保留
+    assert lines.count("项目\t金额\t备注") == 4
@@ -61,7 +61,7 @@ export default function Home() {
     const files = Array.from(e.dataTransfer.files)
     const validFiles = files.filter(file => {
       const extension = file.name.split('.').pop()?.toLowerCase()
-      return ['txt', 'pdf', 'docx', 'doc'].includes(extension || '')
+      return ['txt', 'pdf', 'docx', 'doc', 'xlsx', 'pptx', 'html', 'htm', 'md', 'markdown'].includes(extension || '')
     })
     setSelectedFiles(prev => [...prev, ...validFiles])
   }, [])
@@ -360,13 +360,13 @@ export default function Home() {
                 拖拽文件到此处或点击选择
               </h3>
               <p className="text-gray-500 dark:text-gray-400">
-                支持 TXT、PDF、DOCX、DOC 格式，最大 16MB
+                支持 TXT、PDF、DOCX、DOC、XLSX、PPTX、HTML、Markdown 格式，最大 16MB
               </p>
             </div>
             <input
               type="file"
               multiple
-              accept=".txt,.pdf,.docx,.doc"
+              accept=".txt,.pdf,.docx,.doc,.xlsx,.pptx,.html,.htm,.md,.markdown"
               onChange={handleFileSelect}
               className="mt-4 block w-full text-sm text-gray-500 dark:text-gray-400
                 file:mr-4 file:py-2 file:px-4